@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import faiss
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.utils.knn_graph import KnnGraph, build_knn_graph, update_knn_rows, save_knn_graph
+
+EMBEDDINGS_DIR = "embeddings"
+EMBEDDINGS_PATH = os.path.join(EMBEDDINGS_DIR, "user_embeddings.npy")
+
+
+def load_normalized_embeddings():
+    user_embeddings = np.load(EMBEDDINGS_PATH).astype(np.float32)
+    faiss.normalize_L2(user_embeddings)
+    return user_embeddings
+
+
+def build(k, block_size):
+    normalized_embeddings = load_normalized_embeddings()
+
+    start = time.time()
+    neighbor_ids, neighbor_scores = build_knn_graph(normalized_embeddings, k, block_size)
+    print(f"Built k-NN graph {neighbor_ids.shape} in {time.time() - start:.2f}s")
+
+    save_knn_graph(EMBEDDINGS_DIR, neighbor_ids, neighbor_scores, normalized_embeddings)
+    return neighbor_ids, neighbor_scores
+
+
+# Re-run after user_embeddings.npy changed for only a few rows
+def update(rows, block_size):
+    graph = KnnGraph.load(EMBEDDINGS_DIR)
+    if graph is None:
+        print("No k-NN graph found, run a full build first")
+        return
+
+    normalized_embeddings = load_normalized_embeddings()
+    if len(graph) != len(normalized_embeddings):
+        print(f"Graph has {len(graph)} rows but there are {len(normalized_embeddings)} embeddings, rebuilding")
+        build(graph.k, block_size)
+        return
+
+    neighbor_ids = np.array(graph.neighbor_ids)
+    neighbor_scores = np.array(graph.neighbor_scores)
+
+    start = time.time()
+    touched = update_knn_rows(neighbor_ids, neighbor_scores, normalized_embeddings, rows, block_size)
+    print(f"Updated {len(touched)} rows in {time.time() - start:.2f}s")
+
+    save_knn_graph(EMBEDDINGS_DIR, neighbor_ids, neighbor_scores, normalized_embeddings)
+
+
+def verify(neighbor_ids, neighbor_scores):
+    print(f"Any self loops? {(neighbor_ids == np.arange(len(neighbor_ids))[:, None]).any()}")
+    print(f"Rows sorted by score? {bool((np.diff(neighbor_scores.astype(np.float32), axis=1) <= 0).all())}")
+    print(f"Storage: {(neighbor_ids.nbytes + neighbor_scores.nbytes) / 1024:.1f} KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute each user's top-k matches")
+    parser.add_argument("--k", type=int, default=50, help="Neighbors stored per user")
+    parser.add_argument("--block-size", type=int, default=1024, help="Rows per matrix multiply")
+    parser.add_argument("--rows", type=str, default=None,
+                        help="Comma-separated embedding rows that changed; updates the graph in place")
+    args = parser.parse_args()
+
+    if args.rows:
+        update([int(row) for row in args.rows.split(",")], args.block_size)
+    else:
+        neighbor_ids, neighbor_scores = build(args.k, args.block_size)
+        verify(neighbor_ids, neighbor_scores)
+
+    print("k-NN graph done")
+
+if __name__ == "__main__":
+    main()
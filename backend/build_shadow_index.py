@@ -0,0 +1,108 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import faiss
+from sentence_transformers import SentenceTransformer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.utils.conversation_vectors import ConversationStore, collect_conversations, load_conversation_log
+from backend.utils.embedding_cache import EmbeddingCache, EmbeddingCacheSettings
+from backend.utils.dedup import load_collapsed_user_ids
+from backend.utils.snapshot import SNAPSHOT_FILE, write_snapshot
+from backend.services.shadow import SHADOW_USER_IDS_FILE
+from setup import get_user_text
+
+EMBEDDINGS_DIR = "embeddings"
+SHADOW_DIR = os.path.join(EMBEDDINGS_DIR, "shadow")
+USERS_PATH = "new_users_data.json"
+
+
+# Same users, in the same order, as the live build
+def load_users():
+    with open(USERS_PATH, "r") as f:
+        users = json.load(f)
+    collapsed = load_collapsed_user_ids(EMBEDDINGS_DIR)
+    return [user for user in users if user.get("id") not in collapsed]
+
+
+# Cache entries are keyed by model name, so the candidate never reads the live model's vectors
+def encode(model, model_name, cache, texts):
+    if cache is None:
+        return model.encode(texts, batch_size=64)
+    return cache.encode(model_name, texts, lambda missing: model.encode(missing, batch_size=64))
+
+
+# Profile text plus time-decayed conversations, exactly as setup.py blends them for the live index
+def embed_users(users, model_name):
+    model = SentenceTransformer(model_name)
+    cache = EmbeddingCache.from_settings(EmbeddingCacheSettings.from_env())
+
+    profile_embeddings = encode(model, model_name, cache, [get_user_text(user) for user in users])
+
+    log_entries = load_conversation_log(EMBEDDINGS_DIR)
+    texts, rows, days = collect_conversations(users, log_entries)
+
+    store = ConversationStore(profile_embeddings)
+    store.extend(encode(model, model_name, cache, texts), rows, days)
+    store.log_entries = len(log_entries)
+    return store
+
+
+def build_index(normalized_embeddings, index_type, hnsw_m, ivf_lists):
+    dimension = normalized_embeddings.shape[1]
+    if index_type == "flat":
+        index = faiss.IndexFlatIP(dimension)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+    else:
+        quantizer = faiss.IndexFlatIP(dimension)
+        index = faiss.IndexIVFFlat(quantizer, dimension, min(ivf_lists, len(normalized_embeddings)),
+                                   faiss.METRIC_INNER_PRODUCT)
+        index.train(normalized_embeddings)
+        # Stored rows are read back for negation and diversity re-ranking
+        index.make_direct_map()
+    index.add(normalized_embeddings)
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a candidate encoder/index for shadow comparison")
+    parser.add_argument("--model", type=str, required=True, help="SentenceTransformer model name")
+    parser.add_argument("--index-type", choices=["flat", "hnsw", "ivf"], default="flat")
+    parser.add_argument("--hnsw-m", type=int, default=32, help="HNSW neighbors per node")
+    parser.add_argument("--ivf-lists", type=int, default=64, help="IVF inverted lists")
+    parser.add_argument("--output", type=str, default=SHADOW_DIR)
+    args = parser.parse_args()
+
+    users = load_users()
+    os.makedirs(args.output, exist_ok=True)
+
+    start = time.time()
+    store = embed_users(users, args.model)
+    user_embeddings = store.user_vectors()
+    print(f"Embedded {len(users)} users with {args.model} {user_embeddings.shape} in {time.time() - start:.1f}s")
+
+    store.save(args.output)
+    np.save(os.path.join(args.output, "user_embeddings.npy"), user_embeddings)
+    np.save(os.path.join(args.output, SHADOW_USER_IDS_FILE), np.array([user["id"] for user in users], dtype=np.int64))
+
+    normalized_embeddings = user_embeddings.copy()
+    faiss.normalize_L2(normalized_embeddings)
+    index = build_index(normalized_embeddings, args.index_type, args.hnsw_m, args.ivf_lists)
+    faiss.write_index(index, os.path.join(args.output, "faiss_index.bin"))
+    print(f"Wrote {args.index_type} index with {index.ntotal} vectors")
+
+    # The service prefers a snapshot over the index file, so only a flat candidate gets one
+    snapshot_path = os.path.join(args.output, SNAPSHOT_FILE)
+    if args.index_type == "flat":
+        write_snapshot(snapshot_path, users, user_embeddings, args.model)
+    elif os.path.exists(snapshot_path):
+        os.remove(snapshot_path)
+
+    print(f"Shadow build done: run the API with FIGBOX_SHADOW_MODEL={args.model}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import faiss
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.utils.sharding import ShardedIndex, build_sharded_index
+from backend.utils.dedup import load_collapsed_user_ids
+
+EMBEDDINGS_DIR = "embeddings"
+EMBEDDINGS_PATH = os.path.join(EMBEDDINGS_DIR, "user_embeddings.npy")
+INDEX_PATH = os.path.join(EMBEDDINGS_DIR, "faiss_index.bin")
+SHARDS_DIR = os.path.join(EMBEDDINGS_DIR, "shards")
+USERS_PATH = "new_users_data.json"
+
+
+# Less the users a collapsing setup.py run left out of the embeddings
+def load_users():
+    with open(USERS_PATH, "r") as f:
+        users = json.load(f)
+    collapsed = load_collapsed_user_ids(EMBEDDINGS_DIR)
+    return [user for user in users if user.get("id") not in collapsed]
+
+
+def load_normalized_embeddings():
+    user_embeddings = np.load(EMBEDDINGS_PATH).astype(np.float32)
+    faiss.normalize_L2(user_embeddings)
+    return user_embeddings
+
+
+def build(strategy, num_shards, output_dir):
+    users = load_users()
+    normalized_embeddings = load_normalized_embeddings()
+    if len(users) != len(normalized_embeddings):
+        print(f"{len(users)} users but {len(normalized_embeddings)} embeddings, run setup.py first")
+        return None
+
+    start = time.time()
+    manifest = build_sharded_index(
+        normalized_embeddings,
+        [user.get("id") for user in users],
+        [user.get("location", "") for user in users],
+        output_dir,
+        strategy,
+        num_shards
+    )
+    print(f"Built {len(manifest['shards'])} shards ({strategy}) in {time.time() - start:.2f}s")
+    for entry in manifest["shards"]:
+        print(f"  {entry['name']}: {entry['ntotal']} users, ids {entry['min_user_id']}-{entry['max_user_id']}")
+
+    return manifest
+
+
+# Scatter-gather over the shards must return what the single index returns
+def verify(output_dir, k=10, queries=50):
+    if not os.path.exists(INDEX_PATH):
+        print("No single FAISS index to compare against")
+        return
+
+    normalized_embeddings = load_normalized_embeddings()
+    index = faiss.read_index(INDEX_PATH)
+    sharded_index = ShardedIndex.load(output_dir, shard_timeout_ms=5000)
+
+    query_embeddings = normalized_embeddings[:queries]
+    flat_distances, flat_indices = index.search(query_embeddings, k)
+    sharded_distances, sharded_indices, missing = sharded_index.search(query_embeddings, k)
+
+    print(f"Missing shards: {missing or 'none'}")
+    print(f"Same scores as single index? {bool(np.allclose(flat_distances, sharded_distances, atol=1e-5))}")
+    print(f"Same rows as single index? {bool((flat_indices == sharded_indices).all())}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split the FAISS index into shards for scatter-gather search")
+    parser.add_argument("--strategy", choices=["id_range", "region"], default="id_range",
+                        help="Shard by contiguous user-id range or by location region")
+    parser.add_argument("--num-shards", type=int, default=4, help="Number of id_range shards")
+    parser.add_argument("--output", type=str, default=SHARDS_DIR,
+                        help="Shard directory; the API uses embeddings/shards when it exists")
+    args = parser.parse_args()
+
+    if build(args.strategy, args.num_shards, args.output):
+        verify(args.output)
+
+    print("Shards done")
+
+if __name__ == "__main__":
+    main()
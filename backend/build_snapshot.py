@@ -0,0 +1,107 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import faiss
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.utils.snapshot import SNAPSHOT_FILE, Snapshot, write_snapshot
+from backend.utils.dedup import load_collapsed_user_ids
+
+EMBEDDINGS_DIR = "embeddings"
+EMBEDDINGS_PATH = os.path.join(EMBEDDINGS_DIR, "user_embeddings.npy")
+INDEX_PATH = os.path.join(EMBEDDINGS_DIR, "faiss_index.bin")
+SNAPSHOT_PATH = os.path.join(EMBEDDINGS_DIR, SNAPSHOT_FILE)
+USERS_PATH = "new_users_data.json"
+TENANTS_DIR = os.getenv("FIGBOX_TENANTS_DIR", "tenants")
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+
+def load_users(users_path):
+    with open(users_path, "r") as f:
+        users = json.load(f)
+    if users_path != USERS_PATH:
+        return users
+
+    # Less the users a collapsing setup.py run left out of the embeddings
+    collapsed = load_collapsed_user_ids(EMBEDDINGS_DIR)
+    return [user for user in users if user.get("id") not in collapsed]
+
+
+# The index must hold exactly the stored embeddings, row for row, or the snapshot would bake in a mismatch
+def check_index(user_embeddings, index_path):
+    if not index_path or not os.path.exists(index_path):
+        print("No FAISS index to cross-check, using the embeddings as is")
+        return True
+
+    index = faiss.read_index(index_path)
+    if index.ntotal != len(user_embeddings):
+        print(f"FAISS index has {index.ntotal} vectors but there are {len(user_embeddings)} embeddings")
+        return False
+
+    normalized_embeddings = user_embeddings.copy()
+    faiss.normalize_L2(normalized_embeddings)
+    index_vectors = index.reconstruct_n(0, index.ntotal)
+    if not np.allclose(index_vectors, normalized_embeddings, atol=1e-5):
+        print("FAISS index rows differ from user_embeddings.npy, run setup.py again")
+        return False
+
+    return True
+
+
+def build(output_path, users_path, embeddings_path, index_path):
+    users = load_users(users_path)
+    user_embeddings = np.load(embeddings_path).astype(np.float32)
+    if len(users) != len(user_embeddings):
+        print(f"{len(users)} users but {len(user_embeddings)} embeddings, run setup.py first")
+        return None
+
+    if not check_index(user_embeddings, index_path):
+        return None
+
+    start = time.time()
+    header = write_snapshot(output_path, users, user_embeddings, MODEL_NAME)
+    print(f"Wrote {output_path}: {header['num_rows']} rows in {time.time() - start:.2f}s")
+    return header
+
+
+# Full checksum pass plus a round trip of every profile
+def verify(output_path, users_path):
+    start = time.time()
+    snapshot = Snapshot.open(output_path, verify="full")
+    print(f"Opened with full verification in {(time.time() - start) * 1000:.1f}ms")
+
+    users = load_users(users_path)
+    print(f"Profiles match source data? {snapshot.profiles() == users}")
+    print(f"User ids in source order? {snapshot.user_ids.tolist() == [user['id'] for user in users]}")
+    print(f"Vectors unit length? {bool(np.allclose(np.linalg.norm(snapshot.vectors, axis=1), 1.0, atol=1e-4))}")
+    snapshot.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack profiles, columns and vectors into one memory-mappable file")
+    parser.add_argument("--output", type=str, default=None,
+                        help="Snapshot path; the API uses embeddings/snapshot.figbox when it exists")
+    parser.add_argument("--tenant", type=str, default=None,
+                        help="Write tenants/<tenant>/snapshot.figbox, served under /tenants/<tenant>/")
+    parser.add_argument("--users", type=str, default=USERS_PATH, help="Profiles JSON, in embedding row order")
+    parser.add_argument("--embeddings", type=str, default=EMBEDDINGS_PATH, help="Embeddings .npy, one row per profile")
+    args = parser.parse_args()
+
+    if args.tenant:
+        output_path = args.output or os.path.join(TENANTS_DIR, args.tenant, SNAPSHOT_FILE)
+        # Another community's embeddings have no FAISS index of their own to cross-check
+        index_path = None
+    else:
+        output_path = args.output or SNAPSHOT_PATH
+        index_path = INDEX_PATH
+
+    if build(output_path, args.users, args.embeddings, index_path):
+        verify(output_path, args.users)
+
+    print("Snapshot done")
+
+if __name__ == "__main__":
+    main()
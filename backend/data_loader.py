@@ -5,5 +5,15 @@ def get_users_data():
     file_path = os.path.join(os.path.dirname(__file__), 'new_users_data.json')
     with open(file_path, 'r') as f:
         return json.load(f)
-    
-users_data = get_users_data()
\ No newline at end of file
+
+_users_data = None
+
+# `from data_loader import users_data` parses the JSON on first use only, so a
+# server starting from a snapshot never reads it
+def __getattr__(name):
+    global _users_data
+    if name == 'users_data':
+        if _users_data is None:
+            _users_data = get_users_data()
+        return _users_data
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,23 +1,40 @@
 import os
 import sys
+import json
+import asyncio
 import logging
+import threading
 import time
-from typing import List, Optional, Dict
+from dataclasses import replace
+from datetime import datetime
+from typing import Any, List, Optional, Dict, Tuple
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, ValidationError, field_validator
 
 # Add project root to path for imports
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, project_root)
 
 
-from backend.models.user_model import UserProfile
-from backend.models.search_request import SearchRequest
+from backend.models.user_model import Conversation, UserProfile, parse_date
+from backend.models.search_request import SearchFilters, SearchRequest
 from backend.services.core_matching import CoreMatchingService
-from backend.services.results import ResultsService
-from data_loader import users_data
+from backend.services.results import ResultsService, decode_explanation_token
+from backend.services.user_listing import UserListingService
+from backend.services.suggestions import SuggestionService
+from backend.services.tenants import Tenant, TenantRegistry
+from backend.services.profiling import ProfilingService
+from backend.services.shadow import ShadowService
+from backend.utils.profiling import RequestProfile
+from backend.services.admission import AdmissionController, DeadlineExceeded, OverloadedError, RequestCoalescer
+from backend.services.scheduler import EventLoopMonitor
+from backend.utils.serialization import dumps
+from backend.utils.dedup import load_collapsed_user_map
+from backend.utils.conversation_vectors import load_conversation_log, with_logged_conversations
+import data_loader
 
 
 # Logger setup 
@@ -39,11 +56,31 @@ class SearchResponse(BaseModel):
     suggestions: Optional[List[str]] = []
     
     
+class SearchBatchResponse(BaseModel):
+    responses: List[SearchResponse]
+    total_queries: int
+    failed_queries: int
+    search_time_ms: float
+
+MAX_BATCH_QUERIES = 1000
+MAX_STREAM_RESULTS = 10000
+# Rows searched for a stream's first window; later windows double up to the max
+STREAM_FIRST_WINDOW = 100
+STREAM_MAX_WINDOW = 1000
+
 
 class AppState:
     def __init__(self):
         self.core_matching_service: Optional[CoreMatchingService] = None
         self.results_service: Optional[ResultsService] = None
+        self.user_listing_service = UserListingService()
+        self.suggestion_service = SuggestionService()
+        self.admission_controller: Optional[AdmissionController] = None
+        self.tenant_registry: Optional[TenantRegistry] = None
+        self.request_coalescer = RequestCoalescer()
+        self.profiling_service = ProfilingService()
+        self.shadow_service: Optional[ShadowService] = None
+        self.event_loop_monitor = EventLoopMonitor()
         
         self.user_profiles_cache: Dict[int, UserProfile] = {}
         self.cache_timestamp: Optional[float] = None
@@ -62,6 +99,19 @@ class SearchRequestAPI(BaseModel):
     k: int = Field(default=5, ge=1, le=20, description="Number of results to return")
     current_user_id: Optional[int] = Field(default=None, description="Current user ID (excluded from results)")
     min_similarity_threshold: float = Field(default=0.1, ge=0.0, le=1.0, description="Minimum similarity threshold")
+    include_conversations: bool = Field(default=True, description="Include conversation bodies in results")
+    include_explanation: bool = Field(default=False, description="Explain the top match inline instead of via /explanations")
+    near: Optional[str] = Field(default=None, description="Place name or 'lat,lon' to filter or boost by distance")
+    radius_km: Optional[float] = Field(default=None, gt=0, le=20000, description="Only users within this distance of `near`")
+    locations: Optional[List[str]] = Field(default=None, description="Only users in these locations")
+    remote_only: Optional[bool] = Field(default=None, description="Only remote users")
+    distance_boost: float = Field(default=0.0, ge=0.0, le=1.0, description="Score bonus for users at `near`")
+    distance_scale_km: float = Field(default=100.0, gt=0, le=20000, description="Distance at which the bonus falls to 37%")
+    experiment: Optional[str] = Field(default=None, description="Named feature weights from ranking_experiments.json")
+    feature_weights: Optional[Dict[str, float]] = Field(default=None, description="Per-feature weights, applied over the experiment's")
+    mutual_weight: float = Field(default=0.2, ge=0.0, le=1.0, description="With current_user_id, weight of how well you suit each candidate's intent")
+    negation_weight: float = Field(default=0.5, ge=0.0, le=2.0, description="Penalty weight for profiles close to a negated clause ('not technical')")
+    diversity: Optional[float] = Field(default=None, ge=0.0, le=1.0, description="MMR lambda: 1.0 ranks by score only, lower spreads results out")
 
     @field_validator('query') 
     @classmethod
@@ -72,13 +122,30 @@ class SearchRequestAPI(BaseModel):
         cleaned = ' '.join(v.strip().split())
         return cleaned
 
+class SearchStreamRequestAPI(SearchRequestAPI):
+    
+    k: int = Field(default=1000, ge=1, le=MAX_STREAM_RESULTS, description="Maximum number of results to stream")
+
+class ConversationRequestAPI(BaseModel):
+    
+    text: str = Field(..., min_length=1, max_length=5000, description="Conversation text")
+    timestamp: Optional[str] = Field(default=None, description="YYYY-MM-DD, defaults to today")
+
+class SearchBatchRequestAPI(BaseModel):
+    
+    # Queries are validated one by one so a bad entry fails inline instead of rejecting the batch
+    queries: List[Dict[str, Any]] = Field(..., min_length=1, max_length=MAX_BATCH_QUERIES, description="List of /search request bodies")
+
 @asynccontextmanager
 async def lifespan(api:FastAPI):
     logger.info("Starting Figbox Matcher API...")
     
+    app_state.event_loop_monitor.start()
+    
     try:
         await initialize_services()
         await load_user_cache()
+        await initialize_shadow()
         logger.info("Application startup complete")
     except Exception as e:
         logger.error(f"Startup failed: {str(e)}")
@@ -87,6 +154,13 @@ async def lifespan(api:FastAPI):
     yield
     
     logger.info("Shutting down Figbox Matcher API...")
+    app_state.event_loop_monitor.stop()
+    if app_state.tenant_registry:
+        app_state.tenant_registry.close()
+    if app_state.shadow_service:
+        app_state.shadow_service.shutdown()
+    if app_state.core_matching_service:
+        app_state.core_matching_service.shutdown()
 
 # Initialize FastAPI application
 app = FastAPI(
@@ -110,13 +184,18 @@ async def initialize_services() -> bool:
         logger.info("Initializing application services...")
 
         app_state.results_service = ResultsService()
+        app_state.admission_controller = AdmissionController()
         app_state.core_matching_service = CoreMatchingService()
         
         # Initialize semantic search engine
         index_path = "embeddings/faiss_index.bin"
-        success = await app_state.core_matching_service.initialize(index_path)
+        embeddings_path = "embeddings/user_embeddings.npy"
+        snapshot_path = "embeddings/snapshot.figbox"
+        success = await app_state.core_matching_service.initialize(index_path, embeddings_path, snapshot_path)
         
         if success:
+            # Other communities' snapshots load on first request, behind the same model
+            app_state.tenant_registry = TenantRegistry(app_state.core_matching_service)
             app_state.initialization_status["services_loaded"] = True
             logger.info("All services initialized successfully")
             return True
@@ -135,6 +214,25 @@ async def load_user_cache() -> bool:
         app_state.user_profiles_cache.clear()
         loaded_count = 0
         
+        # setup.py --collapse-duplicates indexed one user per near-duplicate cluster; the others
+        # keep their profiles and share their representative's row
+        collapsed = load_collapsed_user_map("embeddings")
+        
+        # Profiles come from the snapshot when one is loaded, so rows and users can't drift apart
+        snapshot = app_state.core_matching_service.snapshot if app_state.core_matching_service else None
+        if snapshot is not None:
+            indexed_users = snapshot.profiles()
+            users_data = indexed_users + [
+                user_data for user_data in data_loader.users_data if user_data.get('id') in collapsed
+            ]
+        else:
+            users_data = data_loader.users_data
+            indexed_users = [user_data for user_data in users_data if user_data.get('id') not in collapsed]
+        
+        # Conversations added through the API live in a log next to the index, not in the profile data
+        conversation_log = load_conversation_log("embeddings")
+        users_data = with_logged_conversations(users_data, conversation_log)
+        
         for i, user_data in enumerate(users_data):
             try:
                 user_profile = UserProfile.from_dict(user_data)
@@ -147,6 +245,19 @@ async def load_user_cache() -> bool:
         if loaded_count == 0:
             raise Exception("No users could be loaded")
         
+        if app_state.core_matching_service:
+            app_state.core_matching_service.set_row_mapping(
+                [user_data.get('id') for user_data in indexed_users], collapsed
+            )
+            app_state.core_matching_service.replay_conversation_log(conversation_log)
+            app_state.core_matching_service.build_geo_index(get_all_users())
+            app_state.core_matching_service.build_feature_columns(get_all_users())
+        
+        app_state.user_listing_service.load(get_all_users())
+        app_state.suggestion_service.load(get_all_users())
+        if app_state.results_service:
+            app_state.results_service.prepare_fragments(get_all_users())
+        
         app_state.cache_timestamp = time.time()
         app_state.initialization_status["cache_loaded"] = True
         
@@ -158,6 +269,28 @@ async def load_user_cache() -> bool:
         app_state.initialization_status["last_error"] = str(e)
         return False
 
+# A candidate model/index mirrored on sampled searches; off unless FIGBOX_SHADOW_MODEL is set
+async def initialize_shadow() -> bool:
+    if not app_state.results_service or not app_state.initialization_status["cache_loaded"]:
+        return False
+    
+    shadow_service = ShadowService()
+    if not shadow_service.settings.enabled:
+        return False
+    
+    try:
+        if not await shadow_service.initialize():
+            shadow_service.shutdown()
+            return False
+        shadow_service.load_users(get_all_users())
+        app_state.shadow_service = shadow_service
+        return True
+    except Exception as e:
+        # The live service runs the same with or without its shadow
+        logger.error(f"Shadow initialization failed: {str(e)}")
+        shadow_service.shutdown()
+        return False
+
 
 def get_all_users() -> List[UserProfile]:
     return list(app_state.user_profiles_cache.values())
@@ -173,6 +306,147 @@ def exclude_current_user(users: List[UserProfile], current_user_id: Optional[int
     
     return filtered_users
 
+# SearchRequest for an API body; locations are checked here so unknown places fail with 400
+def build_search_request(request: SearchRequestAPI, deadline: Optional[float] = None,
+                         profile: Optional[RequestProfile] = None) -> SearchRequest:
+    if request.radius_km and not request.near:
+        raise HTTPException(status_code=400, detail="radius_km needs a `near` location")
+    
+    if request.near and app_state.core_matching_service.resolve_location(request.near) is None:
+        raise HTTPException(status_code=400, detail=f"Unknown location: {request.near}")
+    
+    try:
+        feature_weights = app_state.core_matching_service.resolve_feature_weights(
+            request.experiment, request.feature_weights
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    filters = None
+    if request.radius_km or request.locations or request.remote_only:
+        filters = SearchFilters(
+            locations=request.locations,
+            remote_only=request.remote_only,
+            radius_km=request.radius_km
+        )
+    
+    return SearchRequest(
+        query=request.query,
+        k=request.k,
+        current_user_id=request.current_user_id,
+        min_similarity_threshold=request.min_similarity_threshold,
+        filters=filters,
+        include_conversations=request.include_conversations,
+        include_explanation=request.include_explanation,
+        deadline=deadline,
+        near=request.near,
+        distance_boost=request.distance_boost,
+        distance_scale_km=request.distance_scale_km,
+        feature_weights=feature_weights,
+        mutual_weight=request.mutual_weight,
+        negation_weight=request.negation_weight,
+        mmr_lambda=request.diversity,
+        profile=profile
+    )
+
+# Absolute deadline from the client's X-Request-Timeout-Ms header, capped by the server
+def request_deadline(http_request: Request) -> float:
+    settings = app_state.admission_controller.settings
+    timeout_ms = settings.default_timeout_ms
+    
+    header = http_request.headers.get("x-request-timeout-ms")
+    if header:
+        try:
+            timeout_ms = min(float(header), settings.max_timeout_ms)
+        except ValueError:
+            pass
+    
+    return time.monotonic() + timeout_ms / 1000
+
+def overloaded_exception(e: Exception) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+
+def deadline_exception(e: Exception) -> HTTPException:
+    return HTTPException(status_code=503, detail=f"Search timed out: {str(e)}")
+
+def json_response(body: bytes) -> Response:
+    return Response(content=body, media_type="application/json")
+
+# X-Figbox-Profile: 1 asks for a cProfile trace of this request's pipeline job
+def profile_requested(http_request: Request) -> bool:
+    return http_request.headers.get("x-figbox-profile", "").lower() in ("1", "true", "yes", "cprofile")
+
+# Stage timings on every response; a slow request is appended to the slow-query log off the event loop
+def finish_profile(response: Response, profile: RequestProfile, endpoint: str, payload: Dict[str, Any]) -> Response:
+    profiling_service = app_state.profiling_service
+    profile.finish()
+    profile_id = profiling_service.keep(profile, endpoint, payload)
+    
+    response.headers["Server-Timing"] = profile.server_timing()
+    if profile_id:
+        response.headers["X-Figbox-Profile-Id"] = profile_id
+    
+    if profiling_service.is_slow(profile.total_ms()):
+        def log_slow_query():
+            results = json.loads(response.body).get("results") or []
+            profiling_service.log_slow_query(
+                endpoint, payload, profile, [result.get("user_id") for result in results], profile_id
+            )
+        asyncio.get_event_loop().run_in_executor(None, log_slow_query)
+    
+    return response
+
+# Serialized SearchResponse; results are joined from pre-rendered per-user fragments
+def render_search_body(query: str, search_request: SearchRequest,
+                       scored_users: List, start_time: float,
+                       results_service: Optional[ResultsService] = None) -> bytes:
+    results_service = results_service or app_state.results_service
+
+    if not scored_users:
+        return SearchResponse(
+            query=query,
+            results=[],
+            total_found=0,
+            search_time_ms=(time.time() - start_time) * 1000,
+            error_message="No matches found",
+            suggestions=[
+                "Try using different keywords",
+                "Make your query more specific",
+                "Consider alternative terms for your requirements"
+            ]
+        ).model_dump_json().encode("utf-8")
+    
+    ranked_users = results_service.rank_users(scored_users, search_request)[:search_request.k]
+    
+    results_json, top_explanation = results_service.render_results_json(
+        ranked_users, search_request
+    )
+    
+    return (
+        '{"query":%s,"results":%s,"total_found":%d,"search_time_ms":%s,"top_match_explanation":%s,'
+        '"status":"success","error_message":null,"suggestions":[]}' % (
+            dumps(query),
+            results_json,
+            len(ranked_users),
+            dumps((time.time() - start_time) * 1000),
+            dumps(top_explanation)
+        )
+    ).encode("utf-8")
+
+def build_search_response(query: str, search_request: SearchRequest,
+                          scored_users: List, start_time: float) -> Response:
+    return json_response(render_search_body(query, search_request, scored_users, start_time))
+
+def batch_error_response(query: str, message: str, start_time: float) -> bytes:
+    return SearchResponse(
+        query=query,
+        results=[],
+        total_found=0,
+        search_time_ms=(time.time() - start_time) * 1000,
+        error_message=message,
+        status="error"
+    ).model_dump_json().encode("utf-8")
+
 
 @app.get("/health")
 async def health_check():
@@ -182,6 +456,8 @@ async def health_check():
             "timestamp": time.time(),
             "services_ready": app_state.initialization_status["services_loaded"],
             "users_loaded": len(app_state.user_profiles_cache),
+            "admission": app_state.admission_controller.get_status() if app_state.admission_controller else None,
+            "coalescing": app_state.request_coalescer.get_status(),
             "last_error": app_state.initialization_status.get("last_error")
         }
     except Exception as e:
@@ -192,45 +468,298 @@ async def health_check():
         }
 
 
+@app.get("/metrics")
+async def get_metrics():
+    core_matching_service = app_state.core_matching_service
+    return {
+        "timestamp": time.time(),
+        "event_loop_lag": app_state.event_loop_monitor.get_status(),
+        "scheduler": core_matching_service.scheduler.get_status() if core_matching_service else None,
+        "admission": app_state.admission_controller.get_status() if app_state.admission_controller else None,
+        "coalescing": app_state.request_coalescer.get_status(),
+        "shards": core_matching_service.get_shard_status() if core_matching_service else None,
+        "geo": core_matching_service.geo_index.get_status() if core_matching_service and core_matching_service.geo_index else None,
+        "embedding_cache": core_matching_service.embedding_manager.cache.get_status() if core_matching_service and core_matching_service.embedding_manager.cache else None,
+        "explanations": app_state.results_service.get_explanation_status() if app_state.results_service else None,
+        "suggestions": app_state.suggestion_service.get_status(),
+        "tenants": app_state.tenant_registry.get_status() if app_state.tenant_registry else None,
+        "profiling": app_state.profiling_service.get_status(),
+        "shadow": app_state.shadow_service.get_status() if app_state.shadow_service else None,
+        "snapshot": core_matching_service.snapshot.get_status() if core_matching_service and core_matching_service.snapshot else None,
+        "ranking": {
+            "experiments": sorted(core_matching_service.ranking_experiments),
+            "default_experiment": core_matching_service.default_experiment,
+            "features": core_matching_service.feature_columns.get_status() if core_matching_service.feature_columns else None
+        } if core_matching_service else None
+    }
+
+
+def split_param(value: Optional[str]) -> Optional[List[str]]:
+    if not value:
+        return None
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+# Without limit this returns every user, as the listing page expects
 @app.get("/users")
-async def get_users():
+async def get_users(
+    limit: Optional[int] = Query(default=None, ge=1, le=500, description="Page size"),
+    cursor: Optional[str] = Query(default=None, description="next_cursor from the previous page"),
+    fields: Optional[str] = Query(default=None, description="Comma-separated fields to return"),
+    role: Optional[str] = Query(default=None, description="Comma-separated current_role values"),
+    intent: Optional[str] = Query(default=None, description="Comma-separated networking_intent values"),
+    activity: Optional[str] = Query(default=None, description="Comma-separated activity_status values")
+):
     try:
-        users = get_all_users()
-        users_data = []
-        
-        for user in users:
-            user_dict = {
-                "id": user.id,
-                "name": user.name,
-                "bio": user.bio,
-                "location": user.location,
-                "domain_expertise": user.domain_expertise,
-                "current_role": user.current_role.value,
-                "experience_level": user.experience_level.value,
-                "networking_intent": user.networking_intent.value,
-                "activity_status": user.get_activity_status().value,
-                "conversation_count": len(user.conversations),
-                "conversations": [{"text": conv.text, "timestamp": conv.timestamp} for conv in user.conversations],
-                "remote_preference": user.remote_preference
-            }
-            users_data.append(user_dict)
-        
-        return {
-            "users": users_data,
-            "total": len(users_data),
-            "timestamp": time.time()
-        }
+        body = app_state.user_listing_service.get_page(
+            limit=limit,
+            cursor=cursor,
+            fields=UserListingService.parse_fields(fields),
+            roles=split_param(role),
+            intents=split_param(intent),
+            activities=split_param(activity)
+        )
+        return Response(content=body, media_type="application/json")
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f" Get users failed: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to retrieve users")
     
+
+# Live vs candidate model on mirrored searches: overlap, rank correlation, per-stage latency
+@app.get("/shadow")
+async def get_shadow_status(
+    recent: int = Query(default=0, ge=0, le=100, description="Latest comparisons to include")
+):
+    if app_state.shadow_service is None:
+        raise HTTPException(status_code=404, detail="No shadow model configured")
+    return app_state.shadow_service.get_status(recent)
+
+
+# cProfile traces captured for X-Figbox-Profile or sampled requests, newest first
+@app.get("/debug/profiles")
+async def list_profiles():
+    return {"profiles": app_state.profiling_service.list_profiles()}
+
+@app.get("/debug/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    format: str = Query(default="text", pattern="^(text|pstats)$", description="text summary or raw pstats file"),
+    sort: str = Query(default="cumulative", pattern="^(cumulative|tottime|calls)$"),
+    limit: int = Query(default=30, ge=1, le=200, description="Functions listed in the text summary")
+):
+    entry = app_state.profiling_service.get(profile_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    
+    profile = entry["profile"]
+    if format == "pstats":
+        return Response(
+            content=profile.pstats_bytes(),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f'attachment; filename="{profile_id}.pstats"'}
+        )
+    
+    return {
+        "profile_id": profile_id,
+        "endpoint": entry["endpoint"],
+        "payload": entry["payload"],
+        "captured_at": entry["captured_at"],
+        "total_ms": entry["total_ms"],
+        "stages_ms": profile.stages,
+        "top_functions": profile.top_functions(limit, sort)
+    }
+
+
+# Typeahead for the search box: skills, domains, roles, intents and popular past queries
+@app.get("/suggest")
+async def suggest(
+    q: str = Query(default="", max_length=100, description="What the user has typed so far"),
+    limit: int = Query(default=8, ge=1, le=20, description="Maximum number of suggestions"),
+    kinds: Optional[str] = Query(default=None, description="Comma-separated kinds: skill, domain, role, intent, query")
+):
+    start_time = time.time()
+    
+    kind_filter = split_param(kinds)
+    if kind_filter:
+        unknown = set(kind_filter) - {"skill", "domain", "role", "intent", "query"}
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown suggestion kinds: {', '.join(sorted(unknown))}")
+    
+    suggestions = app_state.suggestion_service.suggest(
+        q, limit=limit, kinds=set(kind_filter) if kind_filter else None
+    )
+    
+    return {
+        "query": q,
+        "suggestions": suggestions,
+        "took_ms": (time.time() - start_time) * 1000
+    }
+
+
+# Why a result matched, for the `explanation_token` of any search result; cached per token
+@app.get("/explanations/{token}")
+async def get_explanation(token: str):
+    if not app_state.initialization_status["cache_loaded"]:
+        raise HTTPException(
+            status_code=503, 
+            detail="User data is not loaded yet. Please try again later."
+        )
+    
+    try:
+        user_id, score, query = decode_explanation_token(token)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    user = app_state.user_profiles_cache.get(user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail=f"User {user_id} not found")
+    
+    return {
+        "user_id": user_id,
+        "query": query,
+        "similarity_score": score,
+        "explanation": app_state.results_service.get_explanation(user, score, query)
+    }
+
+
+# Find users similar to an existing user using their stored embedding
+@app.get("/users/{user_id}/similar", response_model=SearchResponse)
+async def get_similar_users(
+    user_id: int,
+    k: int = Query(default=5, ge=1, le=20),
+    min_similarity_threshold: float = Query(default=0.1, ge=0.0, le=1.0)
+):
+    start_time = time.time()
+    
+    if not app_state.initialization_status["services_loaded"]:
+        raise HTTPException(
+            status_code=503, 
+            detail="Search services are not ready. Please try again later."
+        )
+    
+    seed_user = app_state.user_profiles_cache.get(user_id)
+    if seed_user is None:
+        raise HTTPException(status_code=404, detail=f"User {user_id} not found")
+    
+    try:
+        scored_users = await app_state.core_matching_service.search_similar_users(
+            user_id, k, get_all_users(), min_similarity_threshold
+        )
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f" Similar users search failed: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to find similar users")
+    
+    # Profile keywords drive the explanation text; they are never encoded
+    keyword_query = " ".join(seed_user.domain_expertise + list(seed_user.skill_levels.keys()))
+    search_request = SearchRequest(
+        query=keyword_query,
+        k=k,
+        current_user_id=user_id,
+        min_similarity_threshold=min_similarity_threshold
+    )
+    
+    return build_search_response(f"Users similar to {seed_user.name}", search_request, scored_users, start_time)
+
+
+# People-you-should-meet feed served from the precomputed k-NN graph
+@app.get("/users/{user_id}/recommendations", response_model=SearchResponse)
+async def get_recommendations(user_id: int, k: int = Query(default=20, ge=1, le=50)):
+    start_time = time.time()
+    
+    if not app_state.initialization_status["services_loaded"]:
+        raise HTTPException(
+            status_code=503, 
+            detail="Search services are not ready. Please try again later."
+        )
+    
+    seed_user = app_state.user_profiles_cache.get(user_id)
+    if seed_user is None:
+        raise HTTPException(status_code=404, detail=f"User {user_id} not found")
+    
+    try:
+        scored_users = await app_state.core_matching_service.recommend(user_id, k, get_all_users())
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f" Recommendations failed: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to build recommendations")
+    
+    keyword_query = " ".join(seed_user.domain_expertise + list(seed_user.skill_levels.keys()))
+    search_request = SearchRequest(
+        query=keyword_query,
+        k=k,
+        current_user_id=user_id,
+        min_similarity_threshold=0.0
+    )
+    
+    return build_search_response(f"Recommended for {seed_user.name}", search_request, scored_users, start_time)
+
+
+# New conversation: embedded once, folded into the user's decayed vector, one index row replaced
+@app.post("/users/{user_id}/conversations")
+async def add_conversation(user_id: int, request: ConversationRequestAPI):
+    start_time = time.time()
+    
+    if not app_state.initialization_status["services_loaded"]:
+        raise HTTPException(
+            status_code=503, 
+            detail="Search services are not ready. Please try again later."
+        )
+    
+    user = app_state.user_profiles_cache.get(user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail=f"User {user_id} not found")
+    
+    parsed_timestamp = parse_date(request.timestamp) if request.timestamp else datetime.now()
+    if parsed_timestamp is None:
+        raise HTTPException(status_code=400, detail=f"Invalid timestamp: {request.timestamp}")
+    timestamp = parsed_timestamp.date().isoformat()
+    
+    text = ' '.join(request.text.strip().split())
+    if not text:
+        raise HTTPException(status_code=400, detail="Conversation text is empty")
+    
+    try:
+        result = await app_state.core_matching_service.add_conversation(user_id, text, timestamp)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f" Add conversation failed: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to add conversation")
+    
+    # Newest first, as in the profile data
+    user.conversations.append(Conversation(text=text, timestamp=timestamp))
+    user.conversations.sort(key=lambda conv: conv.timestamp, reverse=True)
+    if timestamp > user.last_active:
+        user.last_active = timestamp
+    
+    app_state.results_service.refresh_user(user)
+    app_state.user_listing_service.refresh_user(user)
+    app_state.suggestion_service.refresh_user(user)
+    if app_state.core_matching_service.feature_columns:
+        app_state.core_matching_service.feature_columns.update_user(user)
+    if app_state.shadow_service and app_state.shadow_service.matching.feature_columns:
+        app_state.shadow_service.matching.feature_columns.update_user(user)
+    
+    return {
+        "user_id": user_id,
+        "conversation_count": len(user.conversations),
+        "index_updated": result["index_updated"],
+        "update_time_ms": (time.time() - start_time) * 1000
+    }
+
     
 # Pilot
 @app.post("/search", response_model=SearchResponse)
-async def search_users(request: SearchRequestAPI):
+async def search_users(request: SearchRequestAPI, http_request: Request):
     
     start_time = time.time()
+    profile = app_state.profiling_service.new_profile(profile_requested(http_request))
     
     if not request.query or not request.query.strip():
         return SearchResponse(
@@ -240,6 +769,9 @@ async def search_users(request: SearchRequestAPI):
             search_time_ms=(time.time() - start_time) * 1000,
             error_message="Please enter a search query",
             suggestions=[
+                f"Try: '{suggestion['text']}'"
+                for suggestion in app_state.suggestion_service.suggest("", limit=3, kinds={"query"})
+            ] or [
                 "Try: 'AI developer'",
                 "Try: 'fintech expert'", 
                 "Try: 'need a co-founder'"
@@ -274,60 +806,312 @@ async def search_users(request: SearchRequestAPI):
             )
             
         
-        search_request = SearchRequest(
+        search_request = build_search_request(request, profile=profile)
+        
+        # Identical in-flight searches share one encode and search. The shared job has no
+        # deadline of its own: each waiter enforces its own, and once every waiter has given up
+        # the coalescer sets `cancelled`, which the job checks between stages. Every waiter
+        # reports the stage timings of the job that served it. A profiled request is never
+        # shared, so its cProfile trace is of its own job.
+        if profile.want_cprofile:
+            coalesce_key = f"profile:{id(profile)}"
+        else:
+            coalesce_key = request.model_dump_json()
+        
+        # Ranking and rendering run inside the same scheduler job as encode and search
+        def finalize(scored_users: List) -> bytes:
+            if scored_users:
+                app_state.suggestion_service.record_query(request.query, request.current_user_id)
+            return render_search_body(request.query, search_request, scored_users, start_time)
+        
+        async def run_search(cancelled: threading.Event) -> Tuple[bytes, Dict[str, float]]:
+            search_request.cancelled = cancelled
+            async with app_state.admission_controller.admit(cancelled=cancelled):
+                body = await app_state.core_matching_service.search_and_finalize(
+                    search_request, available_users, finalize
+                )
+            return body, profile.stages
+        
+        body, job_stages = await app_state.request_coalescer.run(
+            coalesce_key, run_search, request_deadline(http_request)
+        )
+        profile.adopt_stages(job_stages)
+        response = finish_profile(json_response(body), profile, "/search", request.model_dump())
+        
+        # The candidate model runs after the response is ready and never touches it
+        shadow_service = app_state.shadow_service
+        if shadow_service and shadow_service.should_mirror():
+            def render_shadow(shadow_request: SearchRequest, scored_users: List) -> bytes:
+                return render_search_body(request.query, shadow_request, scored_users, time.time())
+            shadow_service.mirror(search_request, available_users, body, job_stages, render_shadow)
+        return response
+        
+    except HTTPException:
+        raise
+    except OverloadedError as e:
+        raise overloaded_exception(e)
+    except DeadlineExceeded as e:
+        raise deadline_exception(e)
+    except Exception as e:
+        logger.error(f" Search failed: {str(e)}", exc_info=True)
+        return SearchResponse(
             query=request.query,
-            k=request.k,
-            current_user_id=request.current_user_id,
-            min_similarity_threshold=request.min_similarity_threshold
+            results=[],
+            total_found=0,
+            search_time_ms=(time.time() - start_time) * 1000,
+            error_message="Internal search error occurred",
+            suggestions=["Please try again with a different query"],
+            status="error"
+        )
+
+
+@app.post("/search/batch", response_model=SearchBatchResponse)
+async def search_users_batch(batch_request: SearchBatchRequestAPI, http_request: Request):
+    
+    start_time = time.time()
+    deadline = request_deadline(http_request)
+    
+    if not app_state.initialization_status["services_loaded"]:
+        raise HTTPException(
+            status_code=503, 
+            detail="Search services are not ready. Please try again later."
         )
-         
-        scored_users = await app_state.core_matching_service.search(search_request, available_users)
+    
+    all_users = get_all_users()
+    if not all_users:
+        raise HTTPException(status_code=503, detail="No user data available")
+    
+    logger.info(f" Batch search request: {len(batch_request.queries)} queries")
+    
+    responses: List[Optional[bytes]] = [None] * len(batch_request.queries)
+    failed_queries = 0
+    pending = []
+    
+    # Validate each query on its own so errors are reported in place
+    for position, raw_query in enumerate(batch_request.queries):
+        try:
+            request = SearchRequestAPI.model_validate(raw_query)
+        except ValidationError as e:
+            message = "; ".join(error["msg"] for error in e.errors())
+            responses[position] = batch_error_response(str(raw_query.get("query", "")), message, start_time)
+            failed_queries += 1
+            continue
         
-        if not scored_users:
-            return SearchResponse(
-                query=request.query,
-                results=[],
-                total_found=0,
-                search_time_ms=(time.time() - start_time) * 1000,
-                error_message="No matches found",
-                suggestions=[
-                    "Try using different keywords",
-                    "Make your query more specific",
-                    "Consider alternative terms for your requirements"
-                ]
-            )
+        if not request.query:
+            responses[position] = batch_error_response("", "Please enter a search query", start_time)
+            failed_queries += 1
+            continue
         
-        ranked_users = app_state.results_service.rank_users(scored_users, search_request)
+        try:
+            search_request = build_search_request(request, deadline)
+        except HTTPException as e:
+            responses[position] = batch_error_response(request.query, e.detail, start_time)
+            failed_queries += 1
+            continue
+        pending.append((position, request, search_request))
+    
+    # Runs on the scheduler worker, right after the batched search
+    def finalize(batch_results: List) -> List[Tuple[bytes, bool]]:
+        rendered = []
+        for (_, request, search_request), scored_users in zip(pending, batch_results):
+            if scored_users is None:
+                rendered.append((batch_error_response(request.query, "Internal search error occurred", start_time), True))
+                continue
+            
+            try:
+                if scored_users:
+                    app_state.suggestion_service.record_query(request.query, request.current_user_id)
+                rendered.append((render_search_body(request.query, search_request, scored_users, start_time), False))
+            except Exception as e:
+                logger.error(f" Batch result building failed: {str(e)}")
+                rendered.append((batch_error_response(request.query, "Internal search error occurred", start_time), True))
+        return rendered
+    
+    if pending:
+        try:
+            async with app_state.admission_controller.admit(deadline):
+                rendered = await app_state.core_matching_service.search_batch(
+                    [search_request for _, _, search_request in pending], all_users, finalize
+                )
+        except OverloadedError as e:
+            raise overloaded_exception(e)
+        except DeadlineExceeded as e:
+            raise deadline_exception(e)
         
-        results = app_state.results_service.create_simple_results(
-            ranked_users[:request.k], search_request
-        )
+        for (position, _, _), (body, failed) in zip(pending, rendered):
+            responses[position] = body
+            failed_queries += int(failed)
+    
+    return json_response(
+        b'{"responses":[' + b",".join(responses) + b"]," + (
+            '"total_queries":%d,"failed_queries":%d,"search_time_ms":%s}' % (
+                len(responses), failed_queries, dumps((time.time() - start_time) * 1000)
+            )
+        ).encode("utf-8")
+    )
 
-        search_time = (time.time() - start_time) * 1000
+# NDJSON export: one result per line, rendered and sent a chunk at a time, then a summary line
+@app.post("/search/stream")
+async def search_users_stream(request: SearchStreamRequestAPI, http_request: Request):
+    
+    start_time = time.time()
+    
+    if not request.query:
+        raise HTTPException(status_code=400, detail="Please enter a search query")
+    
+    if not app_state.initialization_status["services_loaded"]:
+        raise HTTPException(
+            status_code=503, 
+            detail="Search services are not ready. Please try again later."
+        )
+    
+    all_users = get_all_users()
+    if not all_users:
+        raise HTTPException(status_code=503, detail="No user data available")
+    
+    search_request = build_search_request(request, deadline=request_deadline(http_request))
+    unsupported = app_state.core_matching_service.stream_unsupported(search_request)
+    if unsupported:
+        raise HTTPException(status_code=400, detail=unsupported)
+    search_request.cancelled = threading.Event()
+    
+    # Each window is admitted like a /search, so a long export never holds a slot between windows
+    async def search_window(window_request: SearchRequest, start: int, size: int) -> Tuple[List, bool]:
+        async with app_state.admission_controller.admit(window_request.deadline, window_request.cancelled):
+            return await app_state.core_matching_service.search_stream_window(
+                window_request, all_users, start, start + size
+            )
+    
+    # The first window runs before the response starts, so overload and timeouts still get a status code
+    try:
+        first_window = await search_window(search_request, 0, STREAM_FIRST_WINDOW)
+    except OverloadedError as e:
+        raise overloaded_exception(e)
+    except DeadlineExceeded as e:
+        raise deadline_exception(e)
+    
+    # The deadline covers the first byte; later windows run for as long as the client reads
+    stream_request = replace(search_request, deadline=None)
+    
+    async def result_lines():
+        emitted = 0
+        error = None
+        window, exhausted = first_window
+        start, size = 0, STREAM_FIRST_WINDOW
+        
+        try:
+            while True:
+                ranked = app_state.results_service.rank_users(window[:request.k - emitted], search_request)
+                if ranked:
+                    lines = app_state.results_service.render_result_objects(ranked, search_request, emitted + 1)
+                    emitted += len(lines)
+                    yield ("\n".join(lines) + "\n").encode("utf-8")
+                
+                if exhausted or emitted >= request.k:
+                    break
+                
+                # Client went away: stop before searching the next window
+                if await http_request.is_disconnected():
+                    logger.info(f" Stream cancelled by client after {emitted} results")
+                    return
+                
+                start, size = start + size, min(size * 2, STREAM_MAX_WINDOW)
+                try:
+                    window, exhausted = await search_window(stream_request, start, size)
+                except Exception as e:
+                    logger.error(f" Stream window at row {start} failed: {str(e)}")
+                    error = "Search failed before the stream finished"
+                    break
+            
+            yield ('{"done":true,"query":%s,"total_found":%d,"search_time_ms":%s,"error":%s}\n' % (
+                dumps(request.query), emitted, dumps((time.time() - start_time) * 1000), dumps(error)
+            )).encode("utf-8")
+        finally:
+            # A window still queued or running stops at its next stage once the stream is gone
+            search_request.cancelled.set()
+    
+    return StreamingResponse(result_lines(), media_type="application/x-ndjson")
 
-        return SearchResponse(
-            query=request.query,
-            results=results,  
-            total_found=len(results),
-            search_time_ms=search_time,
-            top_match_explanation=results[0]["explanation"] if results else None,
-            status="success"
+# Loaded (or reloaded after eviction) on first use; 404 when the tenant has no snapshot
+async def get_tenant(tenant_id: str) -> Tenant:
+    if not app_state.initialization_status["services_loaded"] or not app_state.tenant_registry:
+        raise HTTPException(
+            status_code=503, 
+            detail="Search services are not ready. Please try again later."
         )
+    
+    try:
+        return await app_state.tenant_registry.get(tenant_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    except Exception as e:
+        logger.error(f" Loading tenant {tenant_id} failed: {str(e)}")
+        raise HTTPException(status_code=503, detail=f"Tenant {tenant_id} could not be loaded")
+
+# /search against another community's users and index
+@app.post("/tenants/{tenant_id}/search", response_model=SearchResponse)
+async def search_tenant_users(tenant_id: str, request: SearchRequestAPI, http_request: Request):
+    
+    start_time = time.time()
+    
+    if not request.query:
+        raise HTTPException(status_code=400, detail="Please enter a search query")
+    
+    tenant = await get_tenant(tenant_id)
+    available_users = exclude_current_user(tenant.get_users(), request.current_user_id)
+    search_request = build_search_request(request)
+    
+    def finalize(scored_users: List) -> bytes:
+        return render_search_body(request.query, search_request, scored_users, start_time, tenant.results)
+    
+    async def run_search(cancelled: threading.Event) -> bytes:
+        search_request.cancelled = cancelled
+        async with app_state.admission_controller.admit(cancelled=cancelled):
+            return await tenant.matching.search_and_finalize(search_request, available_users, finalize)
+    
+    try:
+        coalesce_key = f"{tenant_id}:{request.model_dump_json()}"
+        body = await app_state.request_coalescer.run(coalesce_key, run_search, request_deadline(http_request))
+        return json_response(body)
         
-    except HTTPException:
-        raise
+    except OverloadedError as e:
+        raise overloaded_exception(e)
+    except DeadlineExceeded as e:
+        raise deadline_exception(e)
     except Exception as e:
-        logger.error(f" Search failed: {str(e)}", exc_info=True)
+        logger.error(f" Tenant {tenant_id} search failed: {str(e)}", exc_info=True)
         return SearchResponse(
             query=request.query,
             results=[],
             total_found=0,
-            search_time_ms=search_time,
+            search_time_ms=(time.time() - start_time) * 1000,
             error_message="Internal search error occurred",
             suggestions=["Please try again with a different query"],
             status="error"
         )
 
+@app.get("/tenants/{tenant_id}/explanations/{token}")
+async def get_tenant_explanation(tenant_id: str, token: str):
+    tenant = await get_tenant(tenant_id)
+    
+    try:
+        user_id, score, query = decode_explanation_token(token)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    user = tenant.users_by_id.get(user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail=f"User {user_id} not found")
+    
+    return {
+        "user_id": user_id,
+        "query": query,
+        "similarity_score": score,
+        "explanation": tenant.results.get_explanation(user, score, query)
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
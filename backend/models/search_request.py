@@ -1,5 +1,8 @@
-from typing import List, Optional
-from dataclasses import dataclass
+import threading
+from typing import Dict, List, Optional
+from dataclasses import dataclass, fields, replace
+
+from backend.utils.profiling import RequestProfile
 
 #SEE
 @dataclass
@@ -10,10 +13,38 @@ class SearchFilters:
     experience_levels: Optional[List[str]] = None
     locations: Optional[List[str]] = None
     remote_only: Optional[bool] = None
+    radius_km: Optional[float] = None  # only users within this distance of SearchRequest.near
     networking_intents: Optional[List[str]] = None  
     exclude_new_users: Optional[bool] = None
     exclude_inactive: Optional[bool] = None
 
+@dataclass(frozen=True)
+class FeatureWeights:
+    """How much each signal contributes to the final score. The defaults reproduce plain
+    semantic ranking, so requests without weights rank exactly as before."""
+    semantic: float = 1.0
+    skill: float = 0.0        # share of the query's skills the user has, weighted by level
+    intent: float = 0.0       # user's networking intent is one the query asks for
+    role: float = 0.0         # user's role is one the query asks for
+    experience: float = 0.0   # closeness to the level the query asks for, else seniority
+    activity: float = 0.0     # 1.0 active today, halving every 14 days
+
+    @classmethod
+    def names(cls) -> List[str]:
+        return [field.name for field in fields(cls)]
+
+    # Unknown names raise ValueError so typos in experiments or requests don't pass silently
+    @classmethod
+    def from_dict(cls, data: Dict[str, float], base: Optional['FeatureWeights'] = None) -> 'FeatureWeights':
+        unknown = set(data) - set(cls.names())
+        if unknown:
+            raise ValueError(f"Unknown feature weights: {sorted(unknown)}; expected {cls.names()}")
+        return replace(base or cls(), **{name: float(value) for name, value in data.items()})
+
+    @property
+    def is_semantic_only(self) -> bool:
+        return self == FeatureWeights()
+
 @dataclass
 class SearchRequest:
     
@@ -22,3 +53,15 @@ class SearchRequest:
     min_similarity_threshold: float = 0.2
     filters: Optional[SearchFilters] = None
     current_user_id: Optional[int] = None 
+    include_conversations: bool = True
+    include_explanation: bool = False  # otherwise clients fetch explanations by token
+    deadline: Optional[float] = None  # time.monotonic() after which work is abandoned
+    near: Optional[str] = None  # place name or "lat,lon" for radius filtering and distance boosting
+    distance_boost: float = 0.0  # added to the score of someone at `near`, decaying with distance
+    distance_scale_km: float = 100.0
+    feature_weights: Optional[FeatureWeights] = None  # None ranks by semantic score alone
+    mutual_weight: float = 0.0  # with current_user_id: blend in how well the searcher suits each candidate
+    negation_weight: float = 0.5  # how strongly "not X" clauses push similar profiles down
+    mmr_lambda: Optional[float] = None  # diversify results: 1.0 is pure relevance, lower favours variety
+    profile: Optional[RequestProfile] = None  # per-stage timings (and cProfile) for this request
+    cancelled: Optional[threading.Event] = None  # set once nobody is waiting for the result
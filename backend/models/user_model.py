@@ -2,6 +2,7 @@ from enum import Enum
 from typing import List, Dict, Optional, Any
 from datetime import datetime, timedelta
 from dataclasses import dataclass
+from functools import lru_cache
 
 class ActivityStatus(Enum):
     ACTIVE = "active"           # < 7 days
@@ -92,6 +93,14 @@ class PivotStatus(Enum):
     DEEPENING_EXPERTISE = "deepening_expertise" 
     NEW_USER = "new_user"
 
+# Profiles share a few hundred distinct dates, so each string is parsed only once
+@lru_cache(maxsize=4096)
+def parse_date(value: str) -> Optional[datetime]:
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+
 @dataclass
 class Conversation:
     text: str
@@ -116,11 +125,10 @@ class UserProfile:
 
     
     def days_since_last_active(self) -> Optional[int]:
-        try:
-            last_active_date = datetime.strptime(self.last_active, "%Y-%m-%d")
-            return (datetime.now() - last_active_date).days
-        except Exception:
+        last_active_date = parse_date(self.last_active)
+        if last_active_date is None:
             return None
+        return (datetime.now() - last_active_date).days
     
     def get_activity_status(self) -> ActivityStatus:
         days = self.days_since_last_active()
@@ -183,12 +191,9 @@ class UserProfile:
             recent_convs = []
             
             for conv in self.conversations:
-                try:
-                    conv_date = datetime.strptime(conv.timestamp, "%Y-%m-%d")
-                    if conv_date >= cutoff_date:
-                        recent_convs.append(conv)
-                except ValueError:
-                    continue
+                conv_date = parse_date(conv.timestamp)
+                if conv_date is not None and conv_date >= cutoff_date:
+                    recent_convs.append(conv)
             
             # If no recent conversations, return the most recent ones anyway
             if not recent_convs and self.conversations:
@@ -0,0 +1,120 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import urllib.error
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.services.profiling import ProfilingSettings
+
+DEFAULT_URL = "http://localhost:8000"
+
+
+def load_entries(log_path, include_rotated):
+    paths = [f"{log_path}.1", log_path] if include_rotated else [log_path]
+    entries = []
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A crash mid-write can leave a partial last line
+                    print(f"Skipping unreadable line {line_number} of {path}")
+    return entries
+
+
+def replay_one(url, entry, profile):
+    headers = {"Content-Type": "application/json"}
+    if profile:
+        headers["X-Figbox-Profile"] = "1"
+
+    request = urllib.request.Request(
+        url + entry["endpoint"],
+        data=json.dumps(entry["payload"]).encode("utf-8"),
+        headers=headers,
+        method="POST"
+    )
+
+    start = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=120) as response:
+        body = json.loads(response.read())
+        took_ms = (time.perf_counter() - start) * 1000
+        return {
+            "took_ms": took_ms,
+            "server_timing": response.headers.get("Server-Timing"),
+            "profile_id": response.headers.get("X-Figbox-Profile-Id"),
+            "result_ids": [result.get("user_id") for result in body.get("results") or []]
+        }
+
+
+# Same results, faster? Each logged request is sent again to the running server, one at a time
+def replay(url, entries, slow_query_ms, profile):
+    rows = []
+    for entry in entries:
+        query = entry["payload"].get("query", "")
+        try:
+            result = replay_one(url, entry, profile)
+        except (urllib.error.URLError, OSError) as e:
+            print(f"  {query[:40]!r:44} failed: {e}")
+            continue
+
+        same_results = result["result_ids"] == entry.get("result_ids")
+        rows.append((entry["took_ms"], result["took_ms"], same_results))
+        status = "still slow" if result["took_ms"] >= slow_query_ms else "ok"
+        print(
+            f"  {query[:40]!r:44} {entry['took_ms']:9.1f}ms -> {result['took_ms']:9.1f}ms  "
+            f"{status:10} results {'same' if same_results else 'CHANGED'}"
+        )
+        if result["server_timing"]:
+            print(f"    {result['server_timing']}")
+        if result["profile_id"]:
+            print(f"    profile: {url}/debug/profiles/{result['profile_id']}")
+
+    if not rows:
+        return
+
+    before = [row[0] for row in rows]
+    after = [row[1] for row in rows]
+    print(f"\nReplayed {len(rows)} of {len(entries)} queries")
+    print(f"Median latency: {statistics.median(before):.1f}ms logged -> {statistics.median(after):.1f}ms now")
+    print(f"Still over {slow_query_ms:.0f}ms: {sum(1 for took in after if took >= slow_query_ms)}")
+    print(f"Results changed: {sum(1 for row in rows if not row[2])}")
+
+
+def main():
+    settings = ProfilingSettings.from_env()
+
+    parser = argparse.ArgumentParser(description="Re-run queries from the slow-query log against a running server")
+    parser.add_argument("--log", type=str, default=settings.slow_query_log, help="Slow-query log (JSON lines)")
+    parser.add_argument("--url", type=str, default=DEFAULT_URL, help="Server to replay against")
+    parser.add_argument("--limit", type=int, default=None, help="Replay only the most recent N entries")
+    parser.add_argument("--slowest", action="store_true", help="Replay the slowest entries first")
+    parser.add_argument("--include-rotated", action="store_true", help="Also read the rotated .1 log")
+    parser.add_argument("--profile", action="store_true", help="Ask the server for a cProfile trace of each replay")
+    parser.add_argument("--slow-ms", type=float, default=settings.slow_query_ms,
+                        help="Latency still counted as slow after replay")
+    args = parser.parse_args()
+
+    entries = load_entries(args.log, args.include_rotated)
+    if not entries:
+        print(f"No slow queries logged in {args.log}")
+        return
+
+    if args.slowest:
+        entries.sort(key=lambda entry: entry["took_ms"], reverse=True)
+    else:
+        entries.reverse()
+    if args.limit:
+        entries = entries[:args.limit]
+
+    print(f"Replaying {len(entries)} slow queries against {args.url}")
+    replay(args.url.rstrip("/"), entries, args.slow_ms, args.profile)
+
+if __name__ == "__main__":
+    main()
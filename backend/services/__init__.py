@@ -1,7 +1,9 @@
 from backend.services.core_matching import CoreMatchingService
 from backend.services.results import ResultsService
+from backend.services.user_listing import UserListingService
 
 __all__ = [
     'CoreMatchingService',
-    'ResultsService'
+    'ResultsService',
+    'UserListingService'
 ]
\ No newline at end of file
@@ -0,0 +1,189 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+# How often a queued search re-checks its cancel event while waiting for a slot
+CANCEL_POLL_SECONDS = 0.05
+
+
+class OverloadedError(Exception):
+    pass
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+# Deadlines are absolute time.monotonic() values; None means no deadline
+def remaining_time(deadline: Optional[float]) -> Optional[float]:
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check_deadline(deadline: Optional[float], stage: str = "") -> None:
+    remaining = remaining_time(deadline)
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded(f"Deadline passed before {stage or 'work'} started")
+
+
+# Set by the coalescer once every waiter has gone; worker-thread jobs poll it between stages
+def check_cancelled(cancelled: Optional[threading.Event], stage: str = "") -> None:
+    if cancelled is not None and cancelled.is_set():
+        raise DeadlineExceeded(f"Nobody waiting any more; stopped before {stage or 'work'}")
+
+
+@dataclass
+class AdmissionSettings:
+    max_concurrent: int = 8
+    max_queued: int = 64
+    default_timeout_ms: float = 10000
+    max_timeout_ms: float = 60000
+
+    @classmethod
+    def from_env(cls) -> 'AdmissionSettings':
+        return cls(
+            max_concurrent=max(1, int(os.getenv("FIGBOX_MAX_CONCURRENT_SEARCHES", 8))),
+            max_queued=max(0, int(os.getenv("FIGBOX_MAX_QUEUED_SEARCHES", 64))),
+            default_timeout_ms=float(os.getenv("FIGBOX_DEFAULT_TIMEOUT_MS", 10000)),
+            max_timeout_ms=float(os.getenv("FIGBOX_MAX_TIMEOUT_MS", 60000))
+        )
+
+
+class AdmissionController:
+    """Bounded concurrency with a bounded wait queue; anything beyond that is shed immediately."""
+
+    def __init__(self, settings: Optional[AdmissionSettings] = None):
+        self.settings = settings or AdmissionSettings.from_env()
+        self._semaphore = asyncio.Semaphore(self.settings.max_concurrent)
+        self._running = 0
+        self._waiting = 0
+        self.stats = {
+            "admitted": 0,
+            "rejected": 0,
+            "timed_out_in_queue": 0
+        }
+
+    # `cancelled` is the coalescer's event: a shared job stops queueing once all its waiters are gone
+    @asynccontextmanager
+    async def admit(self, deadline: Optional[float] = None,
+                    cancelled: Optional[threading.Event] = None) -> AsyncIterator[None]:
+        if self._semaphore.locked() and self._waiting >= self.settings.max_queued:
+            self.stats["rejected"] += 1
+            raise OverloadedError(f"Search queue full ({self._waiting} waiting)")
+
+        check_deadline(deadline, "queueing")
+
+        self._waiting += 1
+        try:
+            await self._acquire(deadline, cancelled)
+        finally:
+            self._waiting -= 1
+
+        self._running += 1
+        self.stats["admitted"] += 1
+        try:
+            yield
+        finally:
+            self._running -= 1
+            self._semaphore.release()
+
+    # Waits for a slot without losing its place in line, until the deadline or the cancel event
+    async def _acquire(self, deadline: Optional[float], cancelled: Optional[threading.Event]) -> None:
+        acquire = asyncio.ensure_future(self._semaphore.acquire())
+        try:
+            while True:
+                remaining = remaining_time(deadline)
+                if remaining is not None and remaining <= 0:
+                    self.stats["timed_out_in_queue"] += 1
+                    raise DeadlineExceeded("Deadline passed while queued")
+                check_cancelled(cancelled, "admission")
+
+                timeout = remaining
+                if cancelled is not None:
+                    timeout = CANCEL_POLL_SECONDS if remaining is None else min(remaining, CANCEL_POLL_SECONDS)
+
+                done, _ = await asyncio.wait({acquire}, timeout=timeout)
+                if done:
+                    acquire.result()
+                    return
+        except BaseException:
+            # A slot granted just as we gave up goes straight back
+            if acquire.done() and not acquire.cancelled() and acquire.exception() is None:
+                self._semaphore.release()
+            else:
+                acquire.cancel()
+            raise
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "running": self._running,
+            "waiting": self._waiting,
+            "max_concurrent": self.settings.max_concurrent,
+            "max_queued": self.settings.max_queued,
+            **self.stats
+        }
+
+
+class RequestCoalescer:
+    """Identical in-flight requests share one task; it is cancelled once every waiter has gone.
+
+    Cancelling the task only reaches code awaiting on the event loop. Work already running on a
+    scheduler thread sees it through the event handed to the factory, set at the same moment.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self._cancel_events: Dict[asyncio.Task, threading.Event] = {}
+        self.stats = {
+            "leaders": 0,
+            "coalesced": 0
+        }
+
+    async def run(self, key: Hashable, factory: Callable[[threading.Event], Awaitable[Any]],
+                  deadline: Optional[float] = None) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            cancelled = threading.Event()
+            task = asyncio.ensure_future(factory(cancelled))
+            self._inflight[key] = task
+            self._waiters[task] = 0
+            self._cancel_events[task] = cancelled
+            task.add_done_callback(lambda done_task, key=key: self._forget(key, done_task))
+            self.stats["leaders"] += 1
+        else:
+            self.stats["coalesced"] += 1
+
+        self._waiters[task] += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout=remaining_time(deadline))
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("Deadline passed while waiting for results")
+        finally:
+            if task in self._waiters:
+                self._waiters[task] -= 1
+                # Nobody is waiting any more, so stop the remaining stages
+                if self._waiters[task] <= 0 and not task.done():
+                    self._cancel_events[task].set()
+                    task.cancel()
+                    self._forget(key, task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        self._waiters.pop(task, None)
+        self._cancel_events.pop(task, None)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._inflight),
+            **self.stats
+        }
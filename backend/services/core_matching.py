@@ -1,52 +1,179 @@
+import os
+import copy
 import logging
-from typing import List, Tuple
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
 from backend.models.user_model import UserProfile
-from backend.models.search_request import SearchRequest
+from backend.models.search_request import FeatureWeights, SearchRequest
 from backend.utils.embeddings import EmbeddingManager
+from backend.utils.knn_graph import KnnGraph
+from backend.utils.geo import Gazetteer, GeoIndex
+from backend.utils.conversation_vectors import ConversationStore, append_conversation_log, timestamp_day
+from backend.utils.snapshot import Snapshot
+from backend.utils.sharding import MANIFEST_FILE
+from backend.utils.feature_scoring import FeatureColumns, load_experiments
+from backend.utils.diversity import mmr_select
+from backend.utils.query_parsing import parse_query
+from backend.services.execution import ExecutionSettings, InferenceExecutor, ScopedInference
+from backend.services.admission import DeadlineExceeded, check_cancelled, check_deadline
+from backend.services.scheduler import InferenceScheduler, Priority
 
 logger = logging.getLogger(__name__)
 
 class CoreMatchingService:
-    def __init__(self):
-        self.embedding_manager = EmbeddingManager()
+    def __init__(self, execution_settings: Optional[ExecutionSettings] = None, model_name: Optional[str] = None):
+        self.embedding_manager = EmbeddingManager(model_name) if model_name else EmbeddingManager()
         self.is_ready = False
+        self.knn_graph: Optional[KnnGraph] = None
+        self.snapshot: Optional[Snapshot] = None
         self.system_status = {
             "embedding_model": False,
             "faiss_index": False,
+            "knn_graph": False,
+            "snapshot": False,
             "last_error": None
         }
         self.executor = ThreadPoolExecutor(max_workers=4)
+        
+        # Model and FAISS calls go through here: threads in this process or worker processes
+        self.inference = InferenceExecutor(self.embedding_manager, execution_settings)
+        
+        # Search pipelines run as single jobs on these threads, by priority
+        self.scheduler = InferenceScheduler(workers=self.inference.settings.workers)
+        
+        # FAISS row -> user id, in the order users were embedded by setup.py
+        self.row_user_ids: List[int] = []
+        self.user_id_to_row: Dict[int, int] = {}
+        self.row_aliases: Dict[int, int] = {}  # collapsed duplicate id -> representative id
+        
+        # Extra FAISS candidates fetched per query so exclusion and tie-breaking have room
+        self.batch_candidate_multiplier = 4
+        
+        # Top-scored candidates that diversity re-ranking chooses k results from
+        self.diversity_shortlist = 200
+        
+        # Positive and negated query clauses -> embedding, so repeated clauses skip the model
+        self.clause_vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.max_cached_clauses = 4096
+        self._clause_lock = threading.Lock()
+        
+        # Per-conversation embeddings and each user's decayed aggregate, for live updates
+        self.conversation_store: Optional[ConversationStore] = None
+        self.embeddings_dir = "embeddings"
+        # Conversation log entries reflected in the store and index: the store's own, plus replays
+        self.applied_log_entries = 0
+        
+        # Profile locations resolved to coordinates once per user load
+        self.geo_index: Optional[GeoIndex] = None
+        try:
+            self.gazetteer: Optional[Gazetteer] = Gazetteer.load()
+        except Exception as e:
+            logger.warning(f"Gazetteer unavailable, location search disabled: {str(e)}")
+            self.gazetteer = None
+        
+        # Per-attribute columns weighted against the semantic score at query time
+        self.feature_columns: Optional[FeatureColumns] = None
+        try:
+            self.ranking_experiments: Dict[str, FeatureWeights] = load_experiments()
+        except Exception as e:
+            logger.warning(f"Ranking experiments unavailable: {str(e)}")
+            self.ranking_experiments = {}
+        self.default_experiment = os.getenv("FIGBOX_RANKING_EXPERIMENT") or None
 
-    async def initialize(self, index_path: str) -> bool:
+    async def initialize(self, index_path: str, embeddings_path: Optional[str] = None,
+                         snapshot_path: Optional[str] = None) -> bool:
         try:
+            self.snapshot = self._open_snapshot(snapshot_path)
+            self.inference.start(index_path, embeddings_path, self.snapshot.path if self.snapshot else None)
+            self.scheduler.start()
             
-            await asyncio.get_event_loop().run_in_executor(
-                self.executor, self.embedding_manager.load_model
-            )
+            # Worker processes load their own model; this process only needs the index
+            if self.inference.uses_processes:
+                worker_pids = await self.inference.warm_up()
+                logger.info(f"{len(worker_pids)} inference workers ready")
+            else:
+                await asyncio.get_event_loop().run_in_executor(
+                    self.executor, self.embedding_manager.load_model
+                )
+                self.embedding_manager.enable_cache()
             self.system_status["embedding_model"] = True
             
             try:
-                await asyncio.get_event_loop().run_in_executor(
-                    self.executor, self.embedding_manager.load_faiss_index, index_path
-                )
-                self.system_status["faiss_index"] = True
+                if self.snapshot is not None:
+                    # Vectors are searched straight from the mapping; nothing to build or copy
+                    self.embedding_manager.load_snapshot_vectors(self.snapshot.vectors, self.inference.uses_processes)
+                    self.system_status["snapshot"] = True
+                    
+                    shards_dir = os.path.join(os.path.dirname(index_path) or ".", "shards")
+                    if os.path.exists(os.path.join(shards_dir, MANIFEST_FILE)):
+                        logger.warning(
+                            f"Both {self.snapshot.path} and shards in {shards_dir} are present; the snapshot is "
+                            f"searched and the shards are not. Remove the snapshot to search the shards."
+                        )
+                else:
+                    await asyncio.get_event_loop().run_in_executor(
+                        self.executor, self.embedding_manager.load_search_index, index_path,
+                        self.inference.uses_processes
+                    )
+                    self.system_status["faiss_index"] = True
                 
             except Exception as e:
                 logger.warning(f"Faiss index failed, will use brute-force: {str(e)}")
                 self.system_status["faiss_index"] = False
+                
+                # Stored vectors still let similar-user lookups skip the model
+                if embeddings_path:
+                    try:
+                        await asyncio.get_event_loop().run_in_executor(
+                            self.executor, self.embedding_manager.load_user_embeddings, embeddings_path
+                        )
+                    except Exception as e:
+                        logger.warning(f"User embeddings unavailable: {str(e)}")
+            
+            self.embeddings_dir = os.path.dirname(index_path) or "."
+            try:
+                self.conversation_store = ConversationStore.load(self.embeddings_dir)
+            except Exception as e:
+                logger.warning(f"Conversation embeddings unavailable: {str(e)}")
+                self.conversation_store = None
+            if self.conversation_store is None:
+                logger.warning(f"No conversation embeddings in {self.embeddings_dir}; conversations added at "
+                               f"runtime won't update the index until setup.py rebuilds it")
+            else:
+                self.applied_log_entries = self.conversation_store.log_entries
+            
+            # Precomputed neighbors are optional; recommendations fall back to a live search
+            try:
+                self.knn_graph = KnnGraph.load(os.path.dirname(index_path) or ".")
+                if self.knn_graph is not None:
+                    mismatch = self.knn_graph.mismatch(
+                        self.embedding_manager.total_vectors(), self.embedding_manager.get_stored_embeddings
+                    )
+                    if mismatch:
+                        logger.warning(f"k-NN graph ignored, rebuild it with build_knn_graph.py: {mismatch}")
+                        self.knn_graph = None
+                self.system_status["knn_graph"] = self.knn_graph is not None
+            except Exception as e:
+                logger.warning(f"k-NN graph unavailable: {str(e)}")
+                self.knn_graph = None
             
             # Test embedding generation
-            test_embedding = await asyncio.get_event_loop().run_in_executor(
-                self.executor, self.embedding_manager.encode_text, "test query"
-            )
+            test_embedding = await self.inference.run("encode_text", "test query")
             
             if test_embedding is None or len(test_embedding) == 0:
                 raise Exception("Embedding generation test failed")
             
+            if self.snapshot is not None and self.snapshot.vectors.shape[1] != len(test_embedding[0]):
+                raise Exception(
+                    f"Snapshot vectors have dimension {self.snapshot.vectors.shape[1]}, "
+                    f"model produces {len(test_embedding[0])}"
+                )
+            
             self.is_ready = True
             logger.info("Core Matching Service initialized successfully")
             return True
@@ -57,6 +184,401 @@ class CoreMatchingService:
             return False
 
 
+    # A snapshot built with another model would silently return nonsense, so it is skipped
+    def _open_snapshot(self, snapshot_path: Optional[str]) -> Optional[Snapshot]:
+        if not snapshot_path or not os.path.exists(snapshot_path):
+            return None
+        
+        try:
+            # Copy-on-write in thread mode so live conversation updates can patch rows
+            snapshot = Snapshot.open(snapshot_path, writable=not self.inference.uses_processes)
+        except Exception as e:
+            logger.warning(f"Snapshot unavailable, loading separate files: {str(e)}")
+            return None
+        
+        if snapshot.model_name != self.embedding_manager.model_name:
+            logger.warning(
+                f"Snapshot was built with {snapshot.model_name}, service uses "
+                f"{self.embedding_manager.model_name}; loading separate files"
+            )
+            snapshot.close()
+            return None
+        
+        return snapshot
+
+    # Stored vectors searchable by row, from the FAISS index or a snapshot
+    def _has_vector_index(self) -> bool:
+        return self.system_status["faiss_index"] or self.system_status["snapshot"]
+
+    def shutdown(self) -> None:
+        self.scheduler.shutdown()
+        self.inference.shutdown()
+        self.executor.shutdown(wait=False)
+
+    # Another community's index behind the same model, scheduler, executors and clause cache.
+    # The view is read-only and owns nothing shared, so dropping it only releases the snapshot.
+    def for_snapshot(self, snapshot: Snapshot, users: List[UserProfile]) -> 'CoreMatchingService':
+        if snapshot.model_name != self.embedding_manager.model_name:
+            raise ValueError(
+                f"Snapshot was built with {snapshot.model_name}, service uses {self.embedding_manager.model_name}"
+            )
+        
+        service = copy.copy(self)
+        service.snapshot = snapshot
+        service.embedding_manager = self.embedding_manager.share_model()
+        service.embedding_manager.load_snapshot_vectors(snapshot.vectors, read_only=True)
+        service.inference = ScopedInference(self.inference, service.embedding_manager)
+        service.system_status = {
+            "embedding_model": self.system_status["embedding_model"],
+            "faiss_index": False,
+            "knn_graph": False,
+            "snapshot": True,
+            "last_error": None
+        }
+        service.knn_graph = None
+        service.conversation_store = None
+        service.embeddings_dir = os.path.dirname(snapshot.path) or "."
+        
+        service.set_row_mapping(snapshot.user_ids.tolist())
+        service.build_geo_index(users)
+        service.build_feature_columns(users)
+        return service
+
+    def build_geo_index(self, users: List[UserProfile]) -> None:
+        if self.gazetteer is None:
+            return
+        
+        self.geo_index = GeoIndex([user.id for user in users], [user.location for user in users], self.gazetteer)
+        logger.info(f"Geo index built: {self.geo_index.get_status()['located']} of {len(users)} users located")
+
+    def build_feature_columns(self, users: List[UserProfile]) -> None:
+        self.feature_columns = FeatureColumns(users)
+        logger.info(f"Feature columns built for {len(users)} users")
+
+    # Request weights layered over a named experiment (or the server default); None means semantic only
+    def resolve_feature_weights(self, experiment: Optional[str] = None,
+                                overrides: Optional[Dict[str, float]] = None) -> Optional[FeatureWeights]:
+        experiment = experiment or self.default_experiment
+        base = None
+        if experiment:
+            if experiment not in self.ranking_experiments:
+                raise ValueError(f"Unknown ranking experiment: {experiment}")
+            base = self.ranking_experiments[experiment]
+        
+        weights = FeatureWeights.from_dict(overrides or {}, base)
+        return None if weights.is_semantic_only else weights
+
+    # Coordinates for a search's `near` value, None when it can't be placed
+    def resolve_location(self, location: str) -> Optional[Tuple[float, float]]:
+        if self.gazetteer is None:
+            return None
+        return self.gazetteer.resolve(location)
+
+    # Ids passing the request's location filters, or None when it has none
+    def _location_allowed_ids(self, search_request: SearchRequest) -> Optional[Set[int]]:
+        filters = search_request.filters
+        if filters is None or not (filters.locations or filters.remote_only or filters.radius_km):
+            return None
+        
+        if self.geo_index is None:
+            raise ValueError("Location filters need the geo index")
+        
+        allowed = np.ones(len(self.geo_index), dtype=bool)
+        
+        if filters.locations:
+            matching = np.zeros(len(self.geo_index), dtype=bool)
+            matching[self.geo_index.matching_locations(filters.locations)] = True
+            allowed &= matching
+        
+        if filters.remote_only:
+            allowed &= self.geo_index.remote
+        
+        if filters.radius_km:
+            coordinates = self.resolve_location(search_request.near or "")
+            if coordinates is None:
+                raise ValueError(f"Unknown location: {search_request.near}")
+            
+            nearby = np.zeros(len(self.geo_index), dtype=bool)
+            nearby[self.geo_index.within_radius(*coordinates, filters.radius_km)] = True
+            allowed &= nearby
+        
+        return set(self.geo_index.user_ids[allowed].tolist())
+
+    def _location_candidates(self, search_request: SearchRequest, users: List[UserProfile]) -> List[UserProfile]:
+        allowed_ids = self._location_allowed_ids(search_request)
+        if allowed_ids is None:
+            return users
+        return [user for user in users if user.id in allowed_ids]
+
+    # Add distance_boost * exp(-km / scale) to each score; callers re-sort afterwards
+    def _apply_distance_boost(self, search_request: SearchRequest,
+                              scored_users: List[Tuple[UserProfile, float]]) -> List[Tuple[UserProfile, float]]:
+        if not search_request.distance_boost or not search_request.near or self.geo_index is None or not scored_users:
+            return scored_users
+        
+        coordinates = self.resolve_location(search_request.near)
+        if coordinates is None:
+            return scored_users
+        
+        proximity = self.geo_index.proximity(
+            *coordinates, [user.id for user, _ in scored_users], search_request.distance_scale_km
+        )
+        boosted_scores = np.array([score for _, score in scored_users]) + search_request.distance_boost * proximity
+        
+        return [(user, float(score)) for (user, _), score in zip(scored_users, boosted_scores)]
+
+    # Re-score a shortlist with the request's feature weights; callers re-sort afterwards
+    def _apply_feature_weights(self, search_request: SearchRequest,
+                               scored_users: List[Tuple[UserProfile, float]]) -> List[Tuple[UserProfile, float]]:
+        if search_request.feature_weights is None or self.feature_columns is None or not scored_users:
+            return scored_users
+        
+        scores = self.feature_columns.score(
+            parse_query(search_request.query).positive,
+            [user.id for user, _ in scored_users],
+            np.array([score for _, score in scored_users]),
+            search_request.feature_weights
+        )
+        return [(user, float(score)) for (user, _), score in zip(scored_users, scores)]
+
+    # Query text to encode for what the query asks for, plus its negated clauses.
+    # The positive side is None when the query only rules things out ("not technical").
+    def _query_clauses(self, query: str) -> Tuple[Optional[str], Tuple[str, ...]]:
+        parsed = parse_query(query)
+        if not parsed.has_negatives:
+            return self._preprocess_query(query), ()
+        
+        positive = self._preprocess_query(parsed.positive) if parsed.positive else None
+        return positive, tuple(clause.lower() for clause in parsed.negatives)
+
+    # Encode clauses in one model call, skipping any encoded before
+    def _encode_clauses(self, texts: List[str]) -> np.ndarray:
+        with self._clause_lock:
+            vectors = []
+            for text in texts:
+                vector = self.clause_vectors.get(text)
+                if vector is not None:
+                    self.clause_vectors.move_to_end(text)
+                vectors.append(vector)
+        
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            encoded = self.inference.call("encode_texts", missing)
+            by_text = dict(zip(missing, encoded))
+            
+            with self._clause_lock:
+                self.clause_vectors.update(by_text)
+                while len(self.clause_vectors) > self.max_cached_clauses:
+                    self.clause_vectors.popitem(last=False)
+            
+            vectors = [vector if vector is not None else by_text[text] for text, vector in zip(texts, vectors)]
+        
+        return np.vstack(vectors).astype(np.float32, copy=False)
+
+    # Positive embeddings (zeros where a query has none) and each query's negative embeddings,
+    # from a single encode call for the whole set of queries
+    def _encode_queries(self, search_requests: List[SearchRequest]) -> Tuple[np.ndarray, List[np.ndarray]]:
+        clauses = [self._query_clauses(request.query) for request in search_requests]
+        texts = list(dict.fromkeys(
+            text for positive, negatives in clauses for text in ((positive,) if positive else ()) + negatives
+        ))
+        vectors = dict(zip(texts, self._encode_clauses(texts)))
+        dimension = len(next(iter(vectors.values())))
+        
+        positive_embeddings = np.vstack([
+            vectors[positive] if positive else np.zeros(dimension, dtype=np.float32)
+            for positive, _ in clauses
+        ])
+        negative_embeddings = [
+            np.vstack([vectors[negative] for negative in negatives]) if negatives
+            else np.zeros((0, dimension), dtype=np.float32)
+            for _, negatives in clauses
+        ]
+        return positive_embeddings, negative_embeddings
+
+    # score = positive similarity - weight * closest negated clause, over the shortlist's stored rows.
+    # A query with only negations starts everyone at 1.0.
+    def _apply_negation(self, search_request: SearchRequest, scored_users: List[Tuple[UserProfile, float]],
+                        negative_embeddings: np.ndarray) -> List[Tuple[UserProfile, float]]:
+        if len(negative_embeddings) == 0 or not scored_users:
+            return scored_users
+        
+        scores = np.array([score for _, score in scored_users], dtype=np.float32)
+        if self._query_clauses(search_request.query)[0] is None:
+            scores = np.ones(len(scored_users), dtype=np.float32)
+        
+        rows = [self.user_id_to_row.get(user.id) for user, _ in scored_users]
+        if any(row is None for row in rows):
+            logger.warning("Negation skipped: some candidates have no stored embedding")
+            return scored_users
+        
+        try:
+            vectors = self.embedding_manager.normalize_embeddings(
+                np.ascontiguousarray(self.embedding_manager.get_stored_embeddings(np.array(rows)), dtype=np.float32)
+            )
+        except ValueError as e:
+            logger.warning(f"Negation skipped: {str(e)}")
+            return scored_users
+        
+        negatives = self.embedding_manager.normalize_embeddings(np.ascontiguousarray(negative_embeddings, dtype=np.float32))
+        
+        # Dissimilarity to a negated clause is no reason to rank anyone higher
+        penalty = np.maximum((vectors @ negatives.T).max(axis=1), 0.0)
+        scores = scores - search_request.negation_weight * penalty
+        
+        return [(user, float(score)) for (user, _), score in zip(scored_users, scores)]
+
+    # score = (1 - w) * forward score + w * reciprocal, where reciprocal averages how well the
+    # searcher suits the candidate's intent and role with the similarity of their stored vectors
+    def _apply_mutual_intent(self, search_request: SearchRequest,
+                             scored_users: List[Tuple[UserProfile, float]]) -> List[Tuple[UserProfile, float]]:
+        searcher_id = search_request.current_user_id
+        if searcher_id is None or not search_request.mutual_weight or self.feature_columns is None or not scored_users:
+            return scored_users
+        
+        user_ids = [user.id for user, _ in scored_users]
+        fit = self.feature_columns.reciprocal_fit(searcher_id, user_ids)
+        if fit is None:
+            return scored_users
+        
+        reciprocal = fit
+        rows = [self.user_id_to_row.get(user_id) for user_id in user_ids + [searcher_id]]
+        if all(row is not None for row in rows):
+            try:
+                vectors = self.embedding_manager.normalize_embeddings(np.ascontiguousarray(
+                    self.embedding_manager.get_stored_embeddings(np.array(rows)), dtype=np.float32
+                ))
+                similarity = np.maximum(vectors[:-1] @ vectors[-1], 0.0)
+                reciprocal = 0.5 * fit + 0.5 * similarity
+            except ValueError as e:
+                logger.warning(f"Mutual scoring without embeddings: {str(e)}")
+        
+        weight = search_request.mutual_weight
+        scores = (1 - weight) * np.array([score for _, score in scored_users], dtype=np.float32) + weight * reciprocal
+        return [(user, float(score)) for (user, _), score in zip(scored_users, scores)]
+
+    # Re-order the top of a sorted result list by maximal marginal relevance over stored vectors
+    def _apply_diversity(self, search_request: SearchRequest,
+                         ranked_users: List[Tuple[UserProfile, float]]) -> List[Tuple[UserProfile, float]]:
+        if search_request.mmr_lambda is None or len(ranked_users) <= 1:
+            return ranked_users
+        
+        shortlist = ranked_users[:self.diversity_shortlist]
+        rows = [self.user_id_to_row.get(user.id) for user, _ in shortlist]
+        if any(row is None for row in rows):
+            logger.warning("Diversity skipped: some candidates have no stored embedding")
+            return ranked_users
+        
+        try:
+            vectors = self.embedding_manager.get_stored_embeddings(np.array(rows))
+        except ValueError as e:
+            logger.warning(f"Diversity skipped: {str(e)}")
+            return ranked_users
+        
+        selected = mmr_select(
+            np.array([score for _, score in shortlist]), vectors, search_request.k, search_request.mmr_lambda
+        )
+        return [shortlist[position] for position in selected]
+
+    # The store must come from the same setup.py run as the index. Stored vectors already blend
+    # in the conversations they were built from, so they can't stand in for the profile part.
+    def _get_conversation_store(self) -> Optional[ConversationStore]:
+        if self.conversation_store is None:
+            return None
+        
+        stored_rows = self.embedding_manager.total_vectors() or len(self.row_user_ids)
+        if len(self.conversation_store.profile_vectors) != stored_rows:
+            logger.warning(f"Conversation embeddings have {len(self.conversation_store.profile_vectors)} rows, "
+                           f"the index {stored_rows}; rerun setup.py to rebuild both")
+            return None
+        return self.conversation_store
+
+    # Fold one conversation into the store and the row's stored vector; False when the index can't change
+    def _apply_conversation(self, store: ConversationStore, row: int, embedding: np.ndarray, day: int) -> bool:
+        user_vector = store.add(row, embedding, day)
+        try:
+            self.embedding_manager.update_stored_embedding(row, user_vector)
+        except ValueError as e:
+            # Process mode memory-maps the index read-only; the next rebuild picks the change up
+            logger.warning(f"Index row {row} not updated: {str(e)}")
+            return False
+        
+        if self.knn_graph is not None:
+            self.knn_graph.mark_stale(row)
+        return True
+
+    # Embed one new conversation, log it, and refresh only that user's index row
+    async def add_conversation(self, user_id: int, text: str, timestamp: str) -> Dict[str, Any]:
+        row = self.user_id_to_row.get(user_id)
+        if row is None:
+            raise KeyError(f"User {user_id} has no stored embedding")
+        
+        day = timestamp_day(timestamp)
+        if day is None:
+            raise ValueError(f"Invalid timestamp: {timestamp}")
+        
+        embedding = await self.inference.run("encode_text", text)
+        
+        # Logged before anything changes in memory, so a restart replays it; one line, no await in between
+        append_conversation_log(self.embeddings_dir, user_id, text, timestamp, embedding[0])
+        store = self._get_conversation_store()
+        if store is not None:
+            self.applied_log_entries += 1
+        
+        # The shared row belongs to the representative; a duplicate's conversation stays on their profile.
+        # Without a matching store it reaches the index at the next setup.py run, which reads the log.
+        if user_id in self.row_aliases or store is None:
+            return {"row": row, "index_updated": False, "stored_conversations": len(store) if store else 0}
+        
+        return {
+            "row": row,
+            "index_updated": self._apply_conversation(store, row, embedding[0], day),
+            "stored_conversations": len(store)
+        }
+
+    # Log entries newer than the store, re-applied in order after a restart. Call after set_row_mapping.
+    def replay_conversation_log(self, entries: List[Dict[str, Any]]) -> int:
+        store = self._get_conversation_store()
+        if store is None:
+            return 0
+        
+        replayed = 0
+        for entry in entries[self.applied_log_entries:]:
+            self.applied_log_entries += 1
+            row = self.user_id_to_row.get(entry["user_id"])
+            day = timestamp_day(entry["timestamp"])
+            if row is None or day is None or entry["user_id"] in self.row_aliases:
+                continue
+            self._apply_conversation(store, row, entry["embedding"], day)
+            replayed += 1
+        
+        if replayed:
+            logger.info(f"Replayed {replayed} logged conversations onto the index")
+        return replayed
+
+    # Per-shard search, timeout and error counts when the index is sharded
+    def get_shard_status(self) -> Optional[Dict[str, Any]]:
+        if self.embedding_manager.sharded_index is None:
+            return None
+        return self.embedding_manager.sharded_index.get_status()
+
+    # Aliases are users collapsed into a representative: they read its row (similar users,
+    # recommendations, mutual scoring) but never come back from a search as a separate hit
+    def set_row_mapping(self, user_ids: List[int], aliases: Optional[Dict[int, int]] = None) -> None:
+        stored_rows = self.embedding_manager.total_vectors()
+        if stored_rows and len(user_ids) != stored_rows:
+            raise ValueError(f"{len(user_ids)} users but {stored_rows} stored vectors; rebuild the index")
+        
+        self.row_user_ids = list(user_ids)
+        self.user_id_to_row = {user_id: row for row, user_id in enumerate(self.row_user_ids)}
+        self.row_aliases = {
+            user_id: representative for user_id, representative in (aliases or {}).items()
+            if representative in self.user_id_to_row and user_id not in self.user_id_to_row
+        }
+        for user_id, representative in self.row_aliases.items():
+            self.user_id_to_row[user_id] = self.user_id_to_row[representative]
+        logger.info(f"Row mapping set for {len(self.row_user_ids)} users, {len(self.row_aliases)} sharing a row")
+
     def _preprocess_query(self, query: str) -> str:
         cleaned_query = ' '.join(query.strip().split())
         
@@ -101,52 +623,112 @@ class CoreMatchingService:
         
         return enhanced_query
     
-    async def search(self, search_request: SearchRequest, users: List[UserProfile]) -> List[Tuple[UserProfile, float]]:
+    # Search plus a finishing step (ranking, rendering) as one scheduler job, one future
+    async def search_and_finalize(self, search_request: SearchRequest, users: List[UserProfile],
+                                  finalize: Callable[[List[Tuple[UserProfile, float]]], Any],
+                                  priority: Priority = Priority.INTERACTIVE) -> Any:
+        if not self.system_status["embedding_model"]:
+            raise RuntimeError("Embedding model not ready")
+        
+        return await self.scheduler.submit(
+            self._search_pipeline, search_request, users, finalize,
+            priority=priority, deadline=search_request.deadline
+        )
+
+    # preprocess -> encode -> search -> filter (-> finalize), run start to finish on a worker thread
+    def _search_pipeline(self, search_request: SearchRequest, users: List[UserProfile],
+                         finalize: Optional[Callable] = None) -> Any:
+        profile = search_request.profile
+        if profile is None:
+            return self._run_search_pipeline(search_request, users, finalize)
+        
+        # cProfile, when requested, hooks this worker thread for exactly this job
+        profile.start_job()
         try:
-            if not self.system_status["embedding_model"]:
-                logger.error("Embedding model not ready")
-                return []
-            
-            processed_query = self._preprocess_query(search_request.query)
+            return self._run_search_pipeline(search_request, users, finalize)
+        finally:
+            profile.stop_job()
+
+    @staticmethod
+    def _lap(search_request: SearchRequest, stage: str) -> None:
+        if search_request.profile is not None:
+            search_request.profile.lap(stage)
+
+    # A running job can't be interrupted, so it stops at the next stage boundary instead
+    @staticmethod
+    def _check_active(search_request: SearchRequest, stage: str) -> None:
+        check_deadline(search_request.deadline, stage)
+        check_cancelled(search_request.cancelled, stage)
+
+    def _run_search_pipeline(self, search_request: SearchRequest, users: List[UserProfile],
+                             finalize: Optional[Callable] = None) -> Any:
+        lap = self._lap
+        check_active = self._check_active
+        try:
+            # Location filters shrink the candidate set before any scoring
+            users = self._location_candidates(search_request, users)
+            lap(search_request, "location")
+            if not users:
+                check_active(search_request, "finalize")
+                return finalize([]) if finalize else []
             
-            # Generate embedding for the search query
-            query_embedding = await asyncio.get_event_loop().run_in_executor(
-                self.executor, self.embedding_manager.encode_text, processed_query
-            )
+            # Generate embeddings for the query's positive and negated clauses
+            check_active(search_request, "encode")
+            query_embeddings, negative_embeddings = self._encode_queries([search_request])
+            query_embedding = query_embeddings[:1]
+            lap(search_request, "encode")
             
-            if self.system_status["faiss_index"]:
-                scored_users = await self._faiss_search(query_embedding, users)
+            check_active(search_request, "search")
+            if self._has_vector_index():
+                scored_users = self._faiss_search(query_embedding, users)
             else:
-                scored_users = await self._brute_force_search(query_embedding, users)
+                scored_users = self._brute_force_search(query_embedding, users)
+            lap(search_request, "search")
             
+            # The threshold applies to what the query asks for; negations only push down
+            check_active(search_request, "negation")
+            has_positive = self._query_clauses(search_request.query)[0] is not None
             filtered_users = [
-            (user, score) for user, score in scored_users 
-            if score >= search_request.min_similarity_threshold
-        ]
+                (user, score) for user, score in scored_users 
+                if not has_positive or score >= search_request.min_similarity_threshold
+            ]
+            filtered_users = self._apply_negation(search_request, filtered_users, negative_embeddings[0])
+            lap(search_request, "negation")
+            check_active(search_request, "mutual")
+            filtered_users = self._apply_mutual_intent(search_request, filtered_users)
+            lap(search_request, "mutual")
+            check_active(search_request, "rescore")
+            filtered_users = self._apply_feature_weights(search_request, filtered_users)
+            filtered_users = self._apply_distance_boost(search_request, filtered_users)
             filtered_users.sort(key=lambda x: x[1], reverse=True)
+            lap(search_request, "rescore")
+            check_active(search_request, "diversity")
+            filtered_users = self._apply_diversity(search_request, filtered_users)
+            lap(search_request, "diversity")
             
-            return filtered_users
-            
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.error(f" Search failed: {str(e)}")
-            return []
-
+            filtered_users = []
+        
+        if not finalize:
+            return filtered_users
+        
+        check_active(search_request, "finalize")
+        result = finalize(filtered_users)
+        lap(search_request, "finalize")
+        return result
 
-    async def _faiss_search(self, query_embedding: np.ndarray, users: List[UserProfile]) -> List[Tuple[UserProfile, float]]:
+    def _faiss_search(self, query_embedding: np.ndarray, users: List[UserProfile]) -> List[Tuple[UserProfile, float]]:
         try:
-            distances, indices = await asyncio.get_event_loop().run_in_executor(
-                self.executor, 
-                self.embedding_manager.search_similar, 
-                query_embedding, 
-                len(users)
+            # Rows map to users by id, so a location-filtered user list only drops rows
+            distances, indices = self.inference.call(
+                "search_similar", query_embedding, self.embedding_manager.total_vectors()
             )
             
-            scored_users = []
-            for distance, idx in zip(distances[0], indices[0]):
-                if 0 <= idx < len(users):
-                    user = users[idx]
-                    similarity_score = float(distance) 
-                    scored_users.append((user, similarity_score))
+            users_by_id = {user.id: user for user in users}
+            scored_users = self._rows_to_users(distances[0], indices[0], users_by_id, users)
             
             logger.debug(f"Faiss search found {len(scored_users)} results")
             return scored_users
@@ -155,30 +737,274 @@ class CoreMatchingService:
             logger.error(f" Faiss search failed: {str(e)}")
             return []
 
-    async def _brute_force_search(self, query_embedding: np.ndarray, users: List[UserProfile]) -> List[Tuple[UserProfile, float]]:
+    # All user texts are encoded in one batched call instead of one call per user
+    def _brute_force_search(self, query_embedding: np.ndarray, users: List[UserProfile]) -> List[Tuple[UserProfile, float]]:
         try:
-            scored_users = []
+            user_texts = [user.get_combined_text_for_embedding() for user in users]
+            user_embeddings = self.inference.call("encode_texts", user_texts)
             
-            for user in users:
-                user_text = user.get_combined_text_for_embedding()
-                
-                # Generate user embedding
-                user_embedding = await asyncio.get_event_loop().run_in_executor(
-                    self.executor, self.embedding_manager.encode_text, user_text
-                )
-                
-                if user_embedding is None or len(user_embedding) == 0:
-                    continue
-
-                # Calculate cosine similarity
-                similarity_score = self.embedding_manager.calculate_cosine_similarity(
-                    query_embedding[0], user_embedding
-                )
-                
-                scored_users.append((user, similarity_score))
+            if user_embeddings is None or len(user_embeddings) == 0:
+                return []
             
-            return scored_users
+            # Calculate cosine similarity
+            normalized_users = self.embedding_manager.normalize_embeddings(user_embeddings)
+            normalized_query = self.embedding_manager.normalize_embeddings(query_embedding)
+            similarity_scores = (normalized_users @ normalized_query[0]).tolist()
+            
+            return list(zip(users, similarity_scores))
             
         except Exception as e:
             logger.error(f"Brute-force search failed: {str(e)}")
             return []
+
+    # Run many queries with one batched encode and one multi-row FAISS search, as a single
+    # batch-priority job. Returns one entry per request; None marks a query that failed on its own.
+    async def search_batch(self, search_requests: List[SearchRequest], users: List[UserProfile],
+                           finalize: Optional[Callable] = None) -> Any:
+        if not search_requests:
+            return finalize([]) if finalize else []
+        
+        if not self.system_status["embedding_model"]:
+            logger.error("Embedding model not ready")
+            results = [None] * len(search_requests)
+            return finalize(results) if finalize else results
+        
+        deadline = min(
+            (request.deadline for request in search_requests if request.deadline is not None),
+            default=None
+        )
+        
+        return await self.scheduler.submit(
+            self._search_batch_pipeline, search_requests, users, deadline, finalize,
+            priority=Priority.BATCH, deadline=deadline
+        )
+
+    def _search_batch_pipeline(self, search_requests: List[SearchRequest], users: List[UserProfile],
+                               deadline: Optional[float], finalize: Optional[Callable] = None) -> Any:
+        try:
+            check_deadline(deadline, "batch encode")
+            query_embeddings, negative_embeddings = self._encode_queries(search_requests)
+            
+            check_deadline(deadline, "batch search")
+            if self._has_vector_index():
+                candidates = self._faiss_search_batch(query_embeddings, search_requests, users)
+            else:
+                candidates = self._brute_force_search_batch(query_embeddings, search_requests, users)
+            
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logger.error(f" Batch search failed: {str(e)}")
+            candidates = [None] * len(search_requests)
+            negative_embeddings = [None] * len(search_requests)
+        
+        results = []
+        for search_request, scored_users, negatives in zip(search_requests, candidates, negative_embeddings):
+            if scored_users is None:
+                results.append(None)
+                continue
+            
+            try:
+                allowed_ids = self._location_allowed_ids(search_request)
+            except ValueError as e:
+                logger.error(f" Batch location filter failed: {str(e)}")
+                results.append(None)
+                continue
+            
+            has_positive = self._query_clauses(search_request.query)[0] is not None
+            filtered_users = [
+                (user, score) for user, score in scored_users
+                if (not has_positive or score >= search_request.min_similarity_threshold)
+                and user.id != search_request.current_user_id
+                and (allowed_ids is None or user.id in allowed_ids)
+            ]
+            filtered_users = self._apply_negation(search_request, filtered_users, negatives)
+            filtered_users = self._apply_mutual_intent(search_request, filtered_users)
+            filtered_users = self._apply_feature_weights(search_request, filtered_users)
+            filtered_users = self._apply_distance_boost(search_request, filtered_users)
+            filtered_users.sort(key=lambda x: x[1], reverse=True)
+            results.append(self._apply_diversity(search_request, filtered_users))
+        
+        return finalize(results) if finalize else results
+
+    def _faiss_search_batch(self, query_embeddings: np.ndarray, search_requests: List[SearchRequest], 
+                            users: List[UserProfile]) -> List[Optional[List[Tuple[UserProfile, float]]]]:
+        max_k = max(request.k for request in search_requests)
+        candidate_k = min(
+            self.embedding_manager.total_vectors(),
+            max_k * self.batch_candidate_multiplier + 1
+        )
+        
+        # Location filters, distance boosts, feature weights, negations and mutual scoring are
+        # applied after the shared search, so those queries need every row, not just the top few
+        if any(request.filters is not None or request.distance_boost or request.feature_weights
+               or parse_query(request.query).has_negatives
+               or (request.current_user_id is not None and request.mutual_weight)
+               for request in search_requests):
+            candidate_k = self.embedding_manager.total_vectors()
+        elif any(request.mmr_lambda is not None for request in search_requests):
+            candidate_k = min(self.embedding_manager.total_vectors(), max(candidate_k, self.diversity_shortlist + 1))
+        
+        distances, indices = self.inference.call("search_similar", query_embeddings, candidate_k)
+        
+        users_by_id = {user.id: user for user in users}
+        
+        results = []
+        for query_distances, query_indices in zip(distances, indices):
+            try:
+                results.append(self._rows_to_users(query_distances, query_indices, users_by_id, users))
+            except Exception as e:
+                logger.error(f" Faiss result mapping failed: {str(e)}")
+                results.append(None)
+        
+        return results
+
+    def _brute_force_search_batch(self, query_embeddings: np.ndarray, search_requests: List[SearchRequest], 
+                                  users: List[UserProfile]) -> List[Optional[List[Tuple[UserProfile, float]]]]:
+        user_texts = [user.get_combined_text_for_embedding() for user in users]
+        
+        user_embeddings = self.inference.call("encode_texts", user_texts)
+        
+        normalized_users = self.embedding_manager.normalize_embeddings(user_embeddings)
+        normalized_queries = self.embedding_manager.normalize_embeddings(query_embeddings)
+        similarity_matrix = normalized_queries @ normalized_users.T
+        
+        return [
+            [(user, float(score)) for user, score in zip(users, query_scores)]
+            for query_scores in similarity_matrix
+        ]
+
+    def _rows_to_users(self, distances: np.ndarray, indices: np.ndarray, users_by_id: Dict[int, UserProfile],
+                       users: List[UserProfile]) -> List[Tuple[UserProfile, float]]:
+        scored_users = []
+        for distance, idx in zip(distances, indices):
+            if idx < 0:
+                continue
+            
+            if self.row_user_ids:
+                if idx >= len(self.row_user_ids):
+                    continue
+                user = users_by_id.get(self.row_user_ids[idx])
+            else:
+                user = users[idx] if idx < len(users) else None
+            
+            if user is not None:
+                scored_users.append((user, float(distance)))
+        
+        return scored_users
+
+    # Exact search over stored vectors: the FAISS index, else the raw embeddings matrix
+    def _stored_search_method(self) -> Tuple[str, int]:
+        if self._has_vector_index():
+            return "search_similar", self.embedding_manager.total_vectors()
+        
+        if self.embedding_manager.user_embeddings is not None:
+            return "search_embeddings_matrix", len(self.embedding_manager.user_embeddings)
+        
+        raise ValueError("No stored embeddings available")
+
+    # "More like this user": search with the stored vector, no transformer call
+    async def search_similar_users(self, user_id: int, k: int, users: List[UserProfile],
+                                   min_similarity_threshold: float = 0.0) -> List[Tuple[UserProfile, float]]:
+        row = self.user_id_to_row.get(user_id)
+        if row is None:
+            raise KeyError(f"User {user_id} has no stored embedding")
+        
+        user_embedding = self.embedding_manager.get_stored_embedding(row)
+        search_method, total_rows = self._stored_search_method()
+        
+        candidate_k = min(total_rows, k * self.batch_candidate_multiplier + 1)
+        distances, indices = await self.inference.run(search_method, user_embedding, candidate_k)
+        
+        users_by_id = {user.id: user for user in users}
+        scored_users = [
+            (user, score) for user, score in self._rows_to_users(distances[0], indices[0], users_by_id, users)
+            if user.id != user_id and score >= min_similarity_threshold
+        ]
+        scored_users.sort(key=lambda x: x[1], reverse=True)
+        
+        return scored_users
+
+    # Serve recommendations from the precomputed k-NN graph in O(k)
+    async def recommend(self, user_id: int, k: int, users: List[UserProfile]) -> List[Tuple[UserProfile, float]]:
+        row = self.user_id_to_row.get(user_id)
+        if row is None:
+            raise KeyError(f"User {user_id} has no stored embedding")
+        
+        # A row changed by a live conversation update has no up-to-date precomputed neighbors
+        if (self.knn_graph is None or row >= len(self.knn_graph) or k > self.knn_graph.k
+                or self.knn_graph.is_stale(row)):
+            return await self.search_similar_users(user_id, k, users)
+        
+        neighbor_rows, neighbor_scores = self.knn_graph.neighbors(row, k)
+        users_by_id = {user.id: user for user in users}
+        
+        return [
+            (user, score) for user, score in self._rows_to_users(neighbor_scores, neighbor_rows, users_by_id, users)
+            if user.id != user_id
+        ]
+
+    # Settings a window-by-window stream can't apply, as a message for the caller; None when it can
+    def stream_unsupported(self, search_request: SearchRequest) -> Optional[str]:
+        if search_request.mmr_lambda is not None:
+            return "diversity re-ranks the whole result list and can't be streamed; use /search"
+        if self._query_clauses(search_request.query)[0] is None:
+            return "A streamed query needs something to search for, not only negations"
+        return None
+
+    # One window of /search/stream as a batch-priority scheduler job: rows [start, end) of the
+    # ranked search, scored like /search. Returns the window and whether the search is exhausted.
+    async def search_stream_window(self, search_request: SearchRequest, users: List[UserProfile],
+                                   start: int, end: int) -> Tuple[List[Tuple[UserProfile, float]], bool]:
+        if not self.system_status["embedding_model"]:
+            raise RuntimeError("Embedding model not ready")
+        
+        return await self.scheduler.submit(
+            self._stream_window, search_request, users, start, end,
+            priority=Priority.BATCH, deadline=search_request.deadline
+        )
+
+    # FAISS can't resume a search, so each window searches the top `end` rows again and keeps the
+    # rows past `start`. Negations and re-scoring apply within the window: a row never moves
+    # ahead of one already sent, and each window is sorted by its final score.
+    def _stream_window(self, search_request: SearchRequest, users: List[UserProfile],
+                       start: int, end: int) -> Tuple[List[Tuple[UserProfile, float]], bool]:
+        users = self._location_candidates(search_request, users)
+        if not users:
+            return [], True
+        
+        try:
+            search_method, total_rows = self._stored_search_method()
+        except ValueError:
+            # No stored vectors at all: the full pipeline scores everyone in one window
+            return self._run_search_pipeline(search_request, users), True
+        
+        self._check_active(search_request, "encode")
+        query_embeddings, negative_embeddings = self._encode_queries([search_request])
+        self._lap(search_request, "encode")
+        
+        self._check_active(search_request, "search")
+        end = min(end, total_rows)
+        distances, indices = self.inference.call(search_method, query_embeddings[:1], end)
+        distances, indices = distances[0][start:], indices[0][start:]
+        
+        # Scores come back sorted, so once one falls below the threshold no later row can pass
+        threshold = search_request.min_similarity_threshold
+        exhausted = end >= total_rows or len(distances) == 0 or distances[-1] < threshold
+        
+        users_by_id = {user.id: user for user in users}
+        window = [
+            (user, score) for user, score in self._rows_to_users(distances, indices, users_by_id, users)
+            if score >= threshold and user.id != search_request.current_user_id
+        ]
+        self._lap(search_request, "search")
+        
+        self._check_active(search_request, "rescore")
+        window = self._apply_negation(search_request, window, negative_embeddings[0])
+        window = self._apply_mutual_intent(search_request, window)
+        window = self._apply_feature_weights(search_request, window)
+        window = self._apply_distance_boost(search_request, window)
+        window.sort(key=lambda x: x[1], reverse=True)
+        self._lap(search_request, "rescore")
+        
+        return window, exhausted
@@ -0,0 +1,206 @@
+import os
+import time
+import asyncio
+import logging
+import multiprocessing
+from dataclasses import dataclass
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, List, Optional
+
+from backend.utils.embeddings import EmbeddingManager
+from backend.utils.snapshot import Snapshot
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ExecutionSettings:
+    mode: str = "thread"                       # "thread" or "process"
+    workers: int = 4
+    threads_per_worker: Optional[int] = None   # torch/OpenMP intra-op threads per worker
+    pin_cores: bool = True
+
+    @classmethod
+    def from_env(cls) -> 'ExecutionSettings':
+        cpu_count = os.cpu_count() or 1
+        mode = os.getenv("FIGBOX_EXECUTION_MODE", "thread").lower()
+        default_workers = cpu_count if mode == "process" else 4
+        workers = max(1, int(os.getenv("FIGBOX_WORKERS", default_workers)))
+
+        # Torch and OpenMP pools are process-wide in thread mode, so the split is the same:
+        # concurrent workers times intra-op threads should not exceed the cores
+        threads = os.getenv("FIGBOX_THREADS_PER_WORKER")
+        threads_per_worker = max(1, int(threads) if threads else cpu_count // workers)
+
+        return cls(
+            mode=mode,
+            workers=workers,
+            threads_per_worker=threads_per_worker,
+            pin_cores=os.getenv("FIGBOX_PIN_CORES", "1") != "0"
+        )
+
+
+# Cap torch and FAISS intra-op threads so they don't oversubscribe the cores
+def configure_threads(threads: Optional[int]) -> None:
+    if not threads:
+        return
+
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except Exception as e:
+        logger.warning(f"Could not set torch threads: {str(e)}")
+
+    try:
+        import faiss
+        faiss.omp_set_num_threads(threads)
+    except Exception as e:
+        logger.warning(f"Could not set FAISS threads: {str(e)}")
+
+
+# Each worker process owns one EmbeddingManager; the FAISS index is memory-mapped
+# so all workers share the same read-only pages.
+_worker_manager: Optional[EmbeddingManager] = None
+
+
+def _init_worker(model_name: str, index_path: str, embeddings_path: Optional[str],
+                 snapshot_path: Optional[str], threads: Optional[int], pin_cores: bool, slot_counter) -> None:
+    global _worker_manager
+
+    with slot_counter.get_lock():
+        slot = slot_counter.value
+        slot_counter.value += 1
+
+    if pin_cores and threads and hasattr(os, "sched_setaffinity"):
+        available = sorted(os.sched_getaffinity(0))
+        start = (slot * threads) % len(available)
+        cores = {available[(start + i) % len(available)] for i in range(threads)}
+        os.sched_setaffinity(0, cores)
+
+    configure_threads(threads)
+
+    manager = EmbeddingManager(model_name)
+    manager.load_model()
+    manager.enable_cache()
+    if snapshot_path:
+        # Every worker maps the same file read-only, so vector pages are shared
+        snapshot = Snapshot.open(snapshot_path)
+        manager.load_snapshot_vectors(snapshot.vectors, read_only=True)
+    else:
+        try:
+            manager.load_search_index(index_path, mmap=True)
+        except Exception as e:
+            logger.warning(f"Worker {slot} has no FAISS index: {str(e)}")
+            if embeddings_path:
+                manager.load_user_embeddings(embeddings_path)
+
+    _worker_manager = manager
+    logger.info(f"Inference worker {slot} ready (pid {os.getpid()}, {threads} threads)")
+
+
+def _call_worker(method: str, *args: Any) -> Any:
+    return getattr(_worker_manager, method)(*args)
+
+
+# Holding each warm-up task briefly forces the pool to start every worker
+def _worker_pid(hold_seconds: float = 0.0) -> int:
+    time.sleep(hold_seconds)
+    return os.getpid()
+
+
+class InferenceExecutor:
+    """Runs EmbeddingManager calls on threads in this process or on a pool of worker processes."""
+
+    def __init__(self, embedding_manager: EmbeddingManager, settings: Optional[ExecutionSettings] = None):
+        self.embedding_manager = embedding_manager
+        self.settings = settings or ExecutionSettings.from_env()
+        self.executor: Optional[Executor] = None
+
+    @property
+    def uses_processes(self) -> bool:
+        return self.settings.mode == "process"
+
+    def start(self, index_path: str, embeddings_path: Optional[str] = None,
+              snapshot_path: Optional[str] = None) -> None:
+        if self.uses_processes:
+            # spawn, not fork: torch and OpenMP state do not survive a fork safely
+            context = multiprocessing.get_context("spawn")
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.settings.workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(
+                    self.embedding_manager.model_name,
+                    index_path,
+                    embeddings_path,
+                    snapshot_path,
+                    self.settings.threads_per_worker,
+                    self.settings.pin_cores,
+                    context.Value("i", 0)
+                )
+            )
+        else:
+            configure_threads(self.settings.threads_per_worker)
+            self.executor = ThreadPoolExecutor(max_workers=self.settings.workers)
+
+        logger.info(f"Inference executor started: {self.settings}")
+
+    # Make every worker process load its model before traffic arrives
+    async def warm_up(self) -> List[int]:
+        if not self.uses_processes:
+            return [os.getpid()]
+
+        loop = asyncio.get_event_loop()
+        pids = await asyncio.gather(*[
+            loop.run_in_executor(self.executor, _worker_pid, 0.5) for _ in range(self.settings.workers)
+        ])
+        return sorted(set(pids))
+
+    async def run(self, method: str, *args: Any) -> Any:
+        loop = asyncio.get_event_loop()
+        if self.uses_processes:
+            return await loop.run_in_executor(self.executor, _call_worker, method, *args)
+        return await loop.run_in_executor(self.executor, getattr(self.embedding_manager, method), *args)
+
+    # Blocking variant for code already running on a scheduler worker thread
+    def call(self, method: str, *args: Any) -> Any:
+        if self.uses_processes:
+            return self.executor.submit(_call_worker, method, *args).result()
+        return getattr(self.embedding_manager, method)(*args)
+
+    def shutdown(self) -> None:
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+class ScopedInference:
+    """Model calls go to a shared InferenceExecutor; index calls run on another set of vectors
+    held in this process, so many indexes can sit behind one model."""
+
+    MODEL_METHODS = frozenset({"encode_text", "encode_texts"})
+
+    def __init__(self, shared: InferenceExecutor, embedding_manager: EmbeddingManager):
+        self.shared = shared
+        self.embedding_manager = embedding_manager
+
+    @property
+    def settings(self) -> ExecutionSettings:
+        return self.shared.settings
+
+    @property
+    def uses_processes(self) -> bool:
+        return self.shared.uses_processes
+
+    async def run(self, method: str, *args: Any) -> Any:
+        if method in self.MODEL_METHODS:
+            return await self.shared.run(method, *args)
+        return await asyncio.get_event_loop().run_in_executor(None, getattr(self.embedding_manager, method), *args)
+
+    def call(self, method: str, *args: Any) -> Any:
+        if method in self.MODEL_METHODS:
+            return self.shared.call(method, *args)
+        return getattr(self.embedding_manager, method)(*args)
@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import uuid
+import random
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from backend.utils.profiling import RequestProfile
+
+logger = logging.getLogger(__name__)
+
+
+# Append one JSON line; past max_bytes the file rotates to .1, so disk use stays under 2x
+def append_jsonl(path: str, entry: Dict[str, Any], max_bytes: float) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+    if os.path.getsize(path) > max_bytes:
+        os.replace(path, f"{path}.1")
+
+
+@dataclass
+class ProfilingSettings:
+    sample_rate: float = 0.0           # fraction of requests profiled without the header
+    max_profiles: int = 50             # captured cProfile traces kept in memory
+    slow_query_ms: float = 1000.0
+    slow_query_log: str = "logs/slow_queries.jsonl"
+    slow_query_log_mb: float = 10.0
+
+    @classmethod
+    def from_env(cls) -> 'ProfilingSettings':
+        return cls(
+            sample_rate=float(os.getenv("FIGBOX_PROFILE_SAMPLE_RATE", 0.0)),
+            max_profiles=int(os.getenv("FIGBOX_PROFILE_MAX_KEPT", 50)),
+            slow_query_ms=float(os.getenv("FIGBOX_SLOW_QUERY_MS", 1000)),
+            slow_query_log=os.getenv("FIGBOX_SLOW_QUERY_LOG", "logs/slow_queries.jsonl"),
+            slow_query_log_mb=float(os.getenv("FIGBOX_SLOW_QUERY_LOG_MB", 10))
+        )
+
+
+class ProfilingService:
+    """Opt-in request profiles (header or sampling) and the on-disk slow-query log."""
+
+    def __init__(self, settings: Optional[ProfilingSettings] = None):
+        self.settings = settings or ProfilingSettings.from_env()
+
+        self.profiles: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._profiles_lock = threading.Lock()
+
+        self._log_lock = threading.Lock()
+        self.stats = {"profiled": 0, "cprofile_skipped": 0, "slow_queries": 0, "slow_log_errors": 0}
+
+    # Every request gets stage timings; cProfile only when asked for or sampled
+    def new_profile(self, requested: bool = False) -> RequestProfile:
+        sampled = self.settings.sample_rate > 0 and random.random() < self.settings.sample_rate
+        return RequestProfile(cprofile=requested or sampled)
+
+    # Keep a finished cProfile trace for /debug/profiles; returns its id
+    def keep(self, profile: RequestProfile, endpoint: str, payload: Dict[str, Any]) -> Optional[str]:
+        if profile.cprofile_skipped:
+            self.stats["cprofile_skipped"] += 1
+        if not profile.has_cprofile:
+            return None
+
+        profile_id = uuid.uuid4().hex[:16]
+        with self._profiles_lock:
+            self.profiles[profile_id] = {
+                "profile": profile,
+                "endpoint": endpoint,
+                "payload": payload,
+                "captured_at": time.time(),
+                "total_ms": profile.total_ms()
+            }
+            while len(self.profiles) > self.settings.max_profiles:
+                self.profiles.popitem(last=False)
+        self.stats["profiled"] += 1
+        return profile_id
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        with self._profiles_lock:
+            return self.profiles.get(profile_id)
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        with self._profiles_lock:
+            return [
+                {
+                    "profile_id": profile_id,
+                    "endpoint": entry["endpoint"],
+                    "query": entry["payload"].get("query"),
+                    "captured_at": entry["captured_at"],
+                    "total_ms": round(entry["total_ms"], 2)
+                }
+                for profile_id, entry in reversed(self.profiles.items())
+            ]
+
+    def is_slow(self, took_ms: float) -> bool:
+        return took_ms >= self.settings.slow_query_ms
+
+    # One JSON line per slow request, with everything needed to replay it
+    def log_slow_query(self, endpoint: str, payload: Dict[str, Any], profile: RequestProfile,
+                       result_ids: List[int], profile_id: Optional[str] = None) -> None:
+        entry = {
+            "logged_at": time.time(),
+            "endpoint": endpoint,
+            "payload": payload,
+            "took_ms": round(profile.total_ms(), 2),
+            "stages_ms": {stage: round(duration, 2) for stage, duration in profile.stages.items()},
+            "profile_id": profile_id,
+            "result_ids": result_ids
+        }
+
+        try:
+            with self._log_lock:
+                append_jsonl(self.settings.slow_query_log, entry, self.settings.slow_query_log_mb * 1024 * 1024)
+            self.stats["slow_queries"] += 1
+        except Exception as e:
+            self.stats["slow_log_errors"] += 1
+            logger.warning(f"Slow query log write failed: {str(e)}")
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "sample_rate": self.settings.sample_rate,
+            "slow_query_ms": self.settings.slow_query_ms,
+            "slow_query_log": self.settings.slow_query_log,
+            "profiles_kept": len(self.profiles),
+            **self.stats
+        }
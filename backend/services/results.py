@@ -1,10 +1,80 @@
+import os
+import json
+import hmac
+import base64
+import hashlib
 import logging
-from typing import Dict, List, Set, Tuple
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Tuple
 from backend.models.user_model import UserProfile, ActivityStatus
 from backend.models.search_request import SearchRequest
+from backend.utils.serialization import dumps
 
 logger = logging.getLogger(__name__)
 
+MAX_CACHED_EXPLANATIONS = 4096
+
+# Signs explanation tokens; without FIGBOX_EXPLANATION_KEY a per-process key is used and
+# tokens stop verifying after a restart
+_TOKEN_KEY = os.getenv("FIGBOX_EXPLANATION_KEY", "").encode("utf-8") or os.urandom(32)
+_SIGNATURE_BYTES = 16
+
+
+# Normalized keyword data for one profile, built when profiles are (re)loaded
+@dataclass(frozen=True)
+class ExplanationProfile:
+    domains: FrozenSet[str]                 # domain_keywords names the user's expertise falls under
+    skills: Tuple[Tuple[str, str], ...]     # (lowercased skill, display label)
+
+
+# Keyword analysis of one query, shared by every explanation for it
+@dataclass(frozen=True)
+class QueryKeywords:
+    text: str
+    domains: Tuple[str, ...]
+    intents: FrozenSet[str]
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(payload: bytes) -> bytes:
+    return hmac.new(_TOKEN_KEY, payload, hashlib.sha256).digest()[:_SIGNATURE_BYTES]
+
+
+# Opaque, URL-safe handle for one (user, score, query) result; decoding needs no server state,
+# and the HMAC keeps clients from minting tokens with a score of their choosing
+def encode_explanation_token(user_id: int, score: float, query: str) -> str:
+    payload = dumps([user_id, round(float(score), 4), query]).encode("utf-8")
+    return f"{_b64encode(payload)}.{_b64encode(_sign(payload))}"
+
+
+def decode_explanation_token(token: str) -> Tuple[int, float, str]:
+    try:
+        encoded_payload, encoded_signature = token.split(".")
+        payload = _b64decode(encoded_payload)
+        signature = _b64decode(encoded_signature)
+    except Exception:
+        raise ValueError("Invalid explanation token")
+    
+    if not hmac.compare_digest(signature, _sign(payload)):
+        raise ValueError("Invalid explanation token")
+    
+    try:
+        user_id, score, query = json.loads(payload)
+        return int(user_id), float(score), str(query)
+    except Exception:
+        raise ValueError("Invalid explanation token")
+
 class ResultsService:
     def __init__(self):
         self.domain_keywords = {
@@ -22,12 +92,28 @@ class ResultsService:
             'funding': {'funding', 'investment', 'investor', 'capital', 'seed'},
             'collaboration': {'collaborate', 'partner', 'work together', 'team up'}
         }
+        
+        # Pre-serialized per-user result JSON, keyed by (user id, include_conversations)
+        self.fragment_cache: Dict[Tuple[int, bool], str] = {}
+        self.profile_version = 0
+        self._fragment_day: Optional[date] = None
+        
+        # Explanations are built on request, from keyword sets precomputed per profile
+        self.explanation_profiles: Dict[int, ExplanationProfile] = {}
+        self.explanation_cache: "OrderedDict[str, str]" = OrderedDict()
+        self.explanation_stats = {"hits": 0, "misses": 0}
+        self._explanation_lock = threading.Lock()
+        self._query_keywords = lru_cache(maxsize=1024)(self._analyze_query)
 
     def rank_users(self, scored_users: List[Tuple[UserProfile, float]], search_request: SearchRequest) -> List[Tuple[UserProfile, float]]:
         try:
             if not scored_users:
                 return []
             
+            # Diversity re-ranking already chose the order; sorting by score would undo it
+            if search_request.mmr_lambda is not None:
+                return scored_users
+            
             # Group users by similar scores
             score_groups = {}
             for user, score in scored_users:
@@ -76,64 +162,178 @@ class ResultsService:
         
         return sorted(tied_users, key=tie_score, reverse=True)
 
-    def create_simple_results(self, ranked_users: List[Tuple[UserProfile, float]], 
-                             search_request: SearchRequest) -> List[dict]:
-        try:
-            results = []
-            
-            top_explanation = None
-            if ranked_users:
-                top_user, top_score = ranked_users[0]
-                top_explanation = self._generate_smart_explanation(
-                    top_user, top_score, search_request.query
+    # Render every profile's result fragment once, when profiles are (re)loaded
+    def prepare_fragments(self, users: List[UserProfile]) -> None:
+        self.fragment_cache.clear()
+        self.profile_version += 1
+        self._fragment_day = date.today()
+        
+        self.explanation_profiles.clear()
+        self.explanation_cache.clear()
+        
+        for user in users:
+            for include_conversations in (True, False):
+                self.fragment_cache[(user.id, include_conversations)] = self._render_fragment(user, include_conversations)
+            self.explanation_profiles[user.id] = self._build_explanation_profile(user)
+        
+        logger.info(f"Prepared result fragments for {len(users)} users (version {self.profile_version})")
+
+    # One profile changed (e.g. a new conversation); re-render just its fragments
+    def refresh_user(self, user: UserProfile) -> None:
+        for include_conversations in (True, False):
+            self.fragment_cache[(user.id, include_conversations)] = self._render_fragment(user, include_conversations)
+        self.explanation_profiles[user.id] = self._build_explanation_profile(user)
+        
+        # Activity text may have changed; cached explanations aren't indexed by user
+        self.explanation_cache.clear()
+
+    # Static part of a result object, without the surrounding braces
+    def _render_fragment(self, user: UserProfile, include_conversations: bool) -> str:
+        fragment = {
+            "user_id": user.id,
+            "name": user.name,
+            "bio": user.bio,
+            "location": user.location,
+            "domain_expertise": user.domain_expertise,
+            "current_role": user.current_role.value,
+            "experience_level": user.experience_level.value,
+            "networking_intent": user.networking_intent.value,
+            "activity_status": user.get_activity_status().value,
+            "conversation_count": len(user.conversations)
+        }
+        if include_conversations:
+            fragment["conversations"] = [{"text": conv.text, "timestamp": conv.timestamp} for conv in user.conversations]
+        
+        return dumps(fragment)[1:-1]
+
+    def _get_fragment(self, user: UserProfile, include_conversations: bool) -> str:
+        # Activity status is date dependent, so fragments expire at midnight
+        if self._fragment_day != date.today():
+            self.fragment_cache.clear()
+            self.explanation_cache.clear()
+            self._fragment_day = date.today()
+        
+        key = (user.id, include_conversations)
+        fragment = self.fragment_cache.get(key)
+        if fragment is None:
+            fragment = self._render_fragment(user, include_conversations)
+            self.fragment_cache[key] = fragment
+        return fragment
+
+    # Search results as a JSON array, assembled from the cached per-profile fragments
+    def render_results_json(self, ranked_users: List[Tuple[UserProfile, float]], 
+                            search_request: SearchRequest) -> Tuple[str, Optional[str]]:
+        top_explanation = None
+        if ranked_users and search_request.include_explanation:
+            top_user, top_score = ranked_users[0]
+            top_explanation = self.get_explanation(top_user, top_score, search_request.query)
+        
+        parts = self.render_result_objects(ranked_users, search_request, 1, top_explanation)
+        return "[" + ",".join(parts) + "]", top_explanation
+
+    # One JSON object per result; ranks start at first_rank so chunks can be streamed
+    def render_result_objects(self, ranked_users: List[Tuple[UserProfile, float]], search_request: SearchRequest,
+                              first_rank: int = 1, top_explanation: Optional[str] = None) -> List[str]:
+        if first_rank == 1 and top_explanation is None and ranked_users and search_request.include_explanation:
+            top_user, top_score = ranked_users[0]
+            top_explanation = self.get_explanation(top_user, top_score, search_request.query)
+        
+        parts = []
+        for rank, (user, score) in enumerate(ranked_users, first_rank):
+            parts.append(
+                '{"similarity_score":%s,"similarity_percentage":%s,"rank":%d,"explanation":%s,"explanation_token":%s,%s}' % (
+                    dumps(float(score)),
+                    dumps(round(float(score) * 100, 1)),
+                    rank,
+                    dumps(top_explanation if rank == 1 else None),
+                    dumps(encode_explanation_token(user.id, score, search_request.query)),
+                    self._get_fragment(user, search_request.include_conversations)
                 )
-            
-            for rank, (user, score) in enumerate(ranked_users, 1):
-                result = {
-                    "user_id": user.id,
-                    "name": user.name,
-                    "bio": user.bio,
-                    "location": user.location,
-                    "similarity_score": score,
-                    "similarity_percentage": round(score * 100, 1),
-                    "rank": rank,
-                    "domain_expertise": user.domain_expertise,
-                    "current_role": user.current_role.value,
-                    "experience_level": user.experience_level.value,
-                    "networking_intent": user.networking_intent.value,
-                    "activity_status": user.get_activity_status().value,
-                    "conversation_count": len(user.conversations),
-                    "conversations": [{"text": conv.text, "timestamp": conv.timestamp} for conv in user.conversations],
-                    "explanation": top_explanation if rank == 1 else None
-                }
-                results.append(result)
-            
-            return results
-            
-        except Exception as e:
-            logger.error(f"Results creation failed: {str(e)}")
-            return []
+            )
+        
+        return parts
+
+    # Explanation for one result, memoized by its token; used by the explanations endpoint
+    def get_explanation(self, user: UserProfile, similarity_score: float, query: str) -> str:
+        if self._fragment_day != date.today():
+            self.explanation_cache.clear()
+            self._fragment_day = date.today()
+        
+        token = encode_explanation_token(user.id, similarity_score, query)
+        with self._explanation_lock:
+            explanation = self.explanation_cache.get(token)
+            if explanation is not None:
+                self.explanation_cache.move_to_end(token)
+                self.explanation_stats["hits"] += 1
+                return explanation
+            self.explanation_stats["misses"] += 1
+        
+        explanation = self._generate_smart_explanation(user, round(float(similarity_score), 4), query)
+        
+        with self._explanation_lock:
+            self.explanation_cache[token] = explanation
+            if len(self.explanation_cache) > MAX_CACHED_EXPLANATIONS:
+                self.explanation_cache.popitem(last=False)
+        return explanation
+
+    def get_explanation_status(self) -> Dict[str, int]:
+        return {
+            "cached": len(self.explanation_cache),
+            "profiles": len(self.explanation_profiles),
+            **self.explanation_stats
+        }
+
+    def _build_explanation_profile(self, user: UserProfile) -> ExplanationProfile:
+        user_domains_lower = [d.lower() for d in user.domain_expertise]
+        domains = frozenset(
+            domain_name for domain_name in self.domain_keywords
+            if any(domain_name in user_domain or user_domain in domain_name for user_domain in user_domains_lower)
+        )
+        
+        skills = []
+        for skill, level in user.skill_levels.items():
+            if level == 'expert':
+                skills.append((skill.lower(), f"{skill} (expert)"))
+            elif level == 'intermediate':
+                skills.append((skill.lower(), f"{skill} (intermediate)"))
+            else:
+                skills.append((skill.lower(), skill))
+        
+        return ExplanationProfile(domains=domains, skills=tuple(skills))
+
+    def _analyze_query(self, query: str) -> QueryKeywords:
+        query_lower = query.lower()
+        query_words = set(query_lower.split())
+        
+        return QueryKeywords(
+            text=query_lower,
+            domains=tuple(name for name, keywords in self.domain_keywords.items() if query_words & keywords),
+            intents=frozenset(
+                name for name, keywords in self.intent_keywords.items()
+                if any(word in query_lower for word in keywords)
+            )
+        )
 
     def _generate_smart_explanation(self, user: UserProfile, similarity_score: float, query: str) -> str:
         try:
-            query_lower = query.lower()
-            query_words = set(query_lower.split())
+            keywords = self._query_keywords(query)
+            profile = self.explanation_profiles.get(user.id) or self._build_explanation_profile(user)
             similarity_pct = round(similarity_score * 100, 1)
             
             match_reasons = []
             
             # domain expertise
-            domain_matches = self._find_domain_matches(query_words, user.domain_expertise)
+            domain_matches = [domain for domain in keywords.domains if domain in profile.domains][:3]
             if domain_matches:
                 match_reasons.append(f"deep expertise in {', '.join(domain_matches)}")
             
             # skill matching
-            skill_matches = self._find_skill_matches(query_lower, user.skill_levels)
+            skill_matches = [label for skill, label in profile.skills if skill in keywords.text][:3]
             if skill_matches:
                 match_reasons.append(f"the specific skills you're looking for: {', '.join(skill_matches)}")
             
             # intent matching
-            intent_match = self._find_intent_match(query_lower, user)
+            intent_match = self._find_intent_match(keywords.intents, user)
             if intent_match:
                 match_reasons.append(intent_match)
             
@@ -143,44 +343,17 @@ class ResultsService:
             logger.error(f"Smart explanation failed for {user.name}: {str(e)}")
             return f"{user.name} is a {round(similarity_score * 100, 1)}% match based on profile analysis."
 
-    def _find_domain_matches(self, query_words: Set[str], user_domains: List[str]) -> List[str]:
-        matches = []
-        user_domains_lower = [d.lower() for d in user_domains]
-        
-        for domain_name, keywords in self.domain_keywords.items():
-            if query_words & keywords:  
-                # Check if user has matching domain
-                if any(domain_name in user_domain or user_domain in domain_name 
-                       for user_domain in user_domains_lower):
-                    matches.append(domain_name)
-        
-        return matches[:3]  
-
-    def _find_skill_matches(self, query_lower: str, skill_levels: Dict[str, str]) -> List[str]:
-        matches = []
-        
-        for skill, level in skill_levels.items():
-            if skill.lower() in query_lower:
-                if level == 'expert':
-                    matches.append(f"{skill} (expert)")
-                elif level == 'intermediate':
-                    matches.append(f"{skill} (intermediate)")
-                else:
-                    matches.append(skill)
-        
-        return matches[:3]  
-
-    def _find_intent_match(self, query_lower: str, user: UserProfile) -> str:
+    def _find_intent_match(self, query_intents: FrozenSet[str], user: UserProfile) -> Optional[str]:
         
-        if any(word in query_lower for word in self.intent_keywords['hiring']):
+        if 'hiring' in query_intents:
             if user.networking_intent.value in ['actively_looking', 'open_to_opportunities']:
                 return "actively seeking new opportunities, perfectly aligning with what you're seeking"
         
-        if any(word in query_lower for word in self.intent_keywords['cofounder']):
+        if 'cofounder' in query_intents:
             if user.networking_intent.value == 'seeking_cofounder':
                 return "actively seeking co-founding opportunities, perfectly aligning with what you're seeking"
         
-        if any(word in query_lower for word in self.intent_keywords['funding']):
+        if 'funding' in query_intents:
             if user.current_role.value == 'investor':
                 return "actively investing in startups, perfectly aligning with what you're seeking"
         
@@ -0,0 +1,178 @@
+import time
+import queue
+import asyncio
+import logging
+import itertools
+import threading
+from enum import IntEnum
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+from backend.services.admission import DeadlineExceeded, remaining_time
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BATCH = 10
+
+
+class _Job:
+    __slots__ = ("fn", "args", "future", "loop", "deadline", "priority", "submitted_at")
+
+    def __init__(self, fn: Callable, args: tuple, future: asyncio.Future, loop: asyncio.AbstractEventLoop,
+                 deadline: Optional[float], priority: Priority):
+        self.fn = fn
+        self.args = args
+        self.future = future
+        self.loop = loop
+        self.deadline = deadline
+        self.priority = priority
+        self.submitted_at = time.monotonic()
+
+
+def _resolve(future: asyncio.Future, result: Any = None, error: Optional[BaseException] = None) -> None:
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class InferenceScheduler:
+    """Priority queue of whole pipeline jobs run on dedicated worker threads.
+
+    A job is one plain function (e.g. preprocess -> encode -> search -> rank); the event loop
+    only sees the single future it resolves, instead of one executor hop per stage.
+    """
+
+    def __init__(self, workers: int = 4):
+        self.workers = workers
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._threads: List[threading.Thread] = []
+        self._running = False
+        self._busy = 0
+        self._recent_queue_ms: Dict[Priority, deque] = {priority: deque(maxlen=512) for priority in Priority}
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "skipped": 0
+        }
+
+    def start(self) -> None:
+        if self._running:
+            return
+
+        self._running = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"inference-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        logger.info(f"Inference scheduler started with {self.workers} workers")
+
+    def shutdown(self) -> None:
+        self._running = False
+        for _ in self._threads:
+            self._queue.put((float("inf"), next(self._sequence), None))
+        self._threads = []
+
+    def submit(self, fn: Callable, *args: Any, priority: Priority = Priority.INTERACTIVE,
+               deadline: Optional[float] = None) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        job = _Job(fn, args, future, loop, deadline, priority)
+
+        self.stats["submitted"] += 1
+        self._queue.put((int(priority), next(self._sequence), job))
+        return future
+
+    def _worker_loop(self) -> None:
+        while True:
+            _, _, job = self._queue.get()
+            if job is None:
+                return
+
+            # The caller gave up (cancelled or timed out) while the job was queued
+            if job.future.cancelled():
+                self.stats["skipped"] += 1
+                continue
+
+            remaining = remaining_time(job.deadline)
+            if remaining is not None and remaining <= 0:
+                self.stats["skipped"] += 1
+                job.loop.call_soon_threadsafe(_resolve, job.future, None, DeadlineExceeded("Deadline passed while queued"))
+                continue
+
+            self._recent_queue_ms[job.priority].append((time.monotonic() - job.submitted_at) * 1000)
+            self._busy += 1
+            try:
+                result = job.fn(*job.args)
+                self.stats["completed"] += 1
+                job.loop.call_soon_threadsafe(_resolve, job.future, result)
+            except BaseException as e:
+                self.stats["failed"] += 1
+                job.loop.call_soon_threadsafe(_resolve, job.future, None, e)
+            finally:
+                self._busy -= 1
+
+    def get_status(self) -> Dict[str, Any]:
+        queue_wait = {}
+        for priority, samples in self._recent_queue_ms.items():
+            values = sorted(samples)
+            queue_wait[priority.name.lower()] = {
+                "samples": len(values),
+                "p50_ms": round(values[len(values) // 2], 3) if values else None,
+                "p99_ms": round(values[int(len(values) * 0.99)], 3) if values else None
+            }
+
+        return {
+            "workers": self.workers,
+            "busy": self._busy,
+            "queued": self._queue.qsize(),
+            "queue_wait": queue_wait,
+            **self.stats
+        }
+
+
+class EventLoopMonitor:
+    """Measures how late the event loop wakes up from a fixed sleep; that delay is the lag."""
+
+    def __init__(self, interval: float = 0.25, window: int = 240):
+        self.interval = interval
+        self._samples: deque = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+        self.max_lag_ms = 0.0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0.0, (loop.time() - expected) * 1000)
+            self._samples.append(lag_ms)
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+
+    def get_status(self) -> Dict[str, Any]:
+        values = sorted(self._samples)
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": len(values),
+            "last_ms": round(self._samples[-1], 3) if values else None,
+            "p50_ms": round(values[len(values) // 2], 3) if values else None,
+            "p99_ms": round(values[int(len(values) * 0.99)], 3) if values else None,
+            "max_ms": round(self.max_lag_ms, 3)
+        }
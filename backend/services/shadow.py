@@ -0,0 +1,257 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Set
+import numpy as np
+
+from backend.models.user_model import UserProfile
+from backend.models.search_request import SearchRequest
+from backend.services.core_matching import CoreMatchingService
+from backend.services.execution import ExecutionSettings
+from backend.services.profiling import append_jsonl
+from backend.services.scheduler import Priority
+from backend.utils.profiling import RequestProfile
+from backend.utils.snapshot import SNAPSHOT_FILE
+
+logger = logging.getLogger(__name__)
+
+# Row -> user id for a candidate index, written by build_shadow_index.py
+SHADOW_USER_IDS_FILE = "user_ids.npy"
+
+# Recent comparisons kept for percentiles and /shadow
+RECENT_COMPARISONS = 512
+
+
+@dataclass
+class ShadowSettings:
+    model_name: Optional[str] = None   # unset: no shadow
+    index_dir: str = "embeddings/shadow"
+    sample_rate: float = 0.1
+    max_in_flight: int = 2             # mirrored searches beyond this are dropped, never queued
+    workers: int = 1
+    comparison_log: str = "logs/shadow_comparisons.jsonl"
+    comparison_log_mb: float = 10.0
+
+    @classmethod
+    def from_env(cls) -> 'ShadowSettings':
+        return cls(
+            model_name=os.getenv("FIGBOX_SHADOW_MODEL") or None,
+            index_dir=os.getenv("FIGBOX_SHADOW_DIR", "embeddings/shadow"),
+            sample_rate=float(os.getenv("FIGBOX_SHADOW_SAMPLE_RATE", 0.1)),
+            max_in_flight=max(1, int(os.getenv("FIGBOX_SHADOW_MAX_IN_FLIGHT", 2))),
+            workers=max(1, int(os.getenv("FIGBOX_SHADOW_WORKERS", 1))),
+            comparison_log=os.getenv("FIGBOX_SHADOW_LOG", "logs/shadow_comparisons.jsonl"),
+            comparison_log_mb=float(os.getenv("FIGBOX_SHADOW_LOG_MB", 10))
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.model_name)
+
+
+# Share of the live top k that the candidate also returned
+def top_k_overlap(live_ids: Sequence[int], shadow_ids: Sequence[int]) -> float:
+    if not live_ids:
+        return 1.0 if not shadow_ids else 0.0
+    return len(set(live_ids) & set(shadow_ids)) / len(live_ids)
+
+
+# Spearman correlation over the union of both lists; an id missing from one list ranks just
+# past its end there. 1.0 is the same order, and lists sharing nothing come out negative.
+def rank_correlation(live_ids: Sequence[int], shadow_ids: Sequence[int]) -> Optional[float]:
+    union = list(dict.fromkeys(list(live_ids) + list(shadow_ids)))
+    if len(union) < 2:
+        return None
+
+    live_rank = {user_id: rank for rank, user_id in enumerate(live_ids)}
+    shadow_rank = {user_id: rank for rank, user_id in enumerate(shadow_ids)}
+    live = np.array([live_rank.get(user_id, len(live_ids)) for user_id in union], dtype=np.float64)
+    shadow = np.array([shadow_rank.get(user_id, len(shadow_ids)) for user_id in union], dtype=np.float64)
+    if live.std() == 0 or shadow.std() == 0:
+        return None
+    return float(np.corrcoef(live, shadow)[0, 1])
+
+
+def _result_ids(body: bytes) -> List[int]:
+    return [result.get("user_id") for result in json.loads(body).get("results") or []]
+
+
+# Queue time depends on each side's own scheduler load, so it is kept apart from the pipeline
+def _side(stages: Dict[str, float], result_ids: List[int]) -> Dict[str, Any]:
+    return {
+        "queue_ms": round(stages.get("queue", 0.0), 2),
+        "pipeline_ms": round(sum(duration for stage, duration in stages.items() if stage != "queue"), 2),
+        "stages_ms": {stage: round(duration, 2) for stage, duration in stages.items()},
+        "result_ids": result_ids
+    }
+
+
+def _percentiles(values: Sequence[float]) -> Optional[Dict[str, float]]:
+    if not values:
+        return None
+    p50, p95 = np.percentile(np.asarray(values), [50, 95])
+    return {"p50": round(float(p50), 2), "p95": round(float(p95), 2), "mean": round(float(np.mean(values)), 2)}
+
+
+class ShadowService:
+    """A candidate encoder and index served side by side with the live one.
+
+    A sample of live /search requests is re-run against the candidate after the live response
+    is ready, on the candidate's own scheduler and model, through the same pipeline stages and
+    the same rendering. Each comparison records top-k overlap, rank correlation and per-stage
+    timings for both sides; nothing from the candidate is ever returned to a client.
+    """
+
+    def __init__(self, settings: Optional[ShadowSettings] = None):
+        self.settings = settings or ShadowSettings.from_env()
+        self.matching: Optional[CoreMatchingService] = None
+        self.is_ready = False
+
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=RECENT_COMPARISONS)
+        self.stats = {"mirrored": 0, "compared": 0, "dropped": 0, "failed": 0}
+        self._in_flight = 0
+        self._tasks: Set[asyncio.Task] = set()
+        self._log_lock = threading.Lock()
+
+    async def initialize(self) -> bool:
+        if not self.settings.enabled:
+            return False
+
+        index_dir = self.settings.index_dir
+        user_ids_path = os.path.join(index_dir, SHADOW_USER_IDS_FILE)
+        if not os.path.exists(user_ids_path):
+            logger.warning(f"No shadow build in {index_dir}; run build_shadow_index.py first")
+            return False
+
+        # Its own model, index and threads: a slow candidate can't hold up live searches
+        self.matching = CoreMatchingService(
+            ExecutionSettings(mode="thread", workers=self.settings.workers),
+            model_name=self.settings.model_name
+        )
+        success = await self.matching.initialize(
+            os.path.join(index_dir, "faiss_index.bin"),
+            os.path.join(index_dir, "user_embeddings.npy"),
+            os.path.join(index_dir, SNAPSHOT_FILE)
+        )
+        if not success:
+            logger.warning(f"Shadow model {self.settings.model_name} failed to initialize")
+            self.matching.shutdown()
+            self.matching = None
+            return False
+
+        self.matching.set_row_mapping(np.load(user_ids_path).tolist())
+        self.is_ready = True
+        logger.info(f"Shadow {self.settings.model_name} ready, mirroring {self.settings.sample_rate:.0%} of searches")
+        return True
+
+    # Geo and feature columns come from the same profiles the live service uses
+    def load_users(self, users: List[UserProfile]) -> None:
+        if self.matching is None:
+            return
+        self.matching.build_geo_index(users)
+        self.matching.build_feature_columns(users)
+
+    def should_mirror(self) -> bool:
+        return self.is_ready and random.random() < self.settings.sample_rate
+
+    # Fire and forget, after the live response is built; dropped when the candidate is busy.
+    # live_stages come from the job that produced live_body (the leader's, when coalesced), and
+    # render is the live finalize step, so both sides time the same work.
+    def mirror(self, search_request: SearchRequest, users: List[UserProfile], live_body: bytes,
+               live_stages: Dict[str, float], render: Callable[[SearchRequest, List], bytes]) -> None:
+        if self._in_flight >= self.settings.max_in_flight:
+            self.stats["dropped"] += 1
+            return
+
+        self._in_flight += 1
+        self.stats["mirrored"] += 1
+        task = asyncio.get_event_loop().create_task(
+            self._compare(search_request, users, live_body, dict(live_stages), render)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _compare(self, search_request: SearchRequest, users: List[UserProfile], live_body: bytes,
+                       live_stages: Dict[str, float], render: Callable[[SearchRequest, List], bytes]) -> None:
+        try:
+            shadow_profile = RequestProfile()
+            shadow_request = replace(search_request, deadline=None, cancelled=None, profile=shadow_profile)
+
+            shadow_body = await self.matching.search_and_finalize(
+                shadow_request, users, lambda scored_users: render(shadow_request, scored_users),
+                priority=Priority.BATCH
+            )
+
+            await asyncio.get_event_loop().run_in_executor(
+                None, self._record, search_request, _side(live_stages, _result_ids(live_body)),
+                _side(shadow_profile.stages, _result_ids(shadow_body))
+            )
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.warning(f"Shadow comparison failed: {str(e)}")
+        finally:
+            self._in_flight -= 1
+
+    def _record(self, search_request: SearchRequest, live: Dict[str, Any], shadow: Dict[str, Any]) -> None:
+        correlation = rank_correlation(live["result_ids"], shadow["result_ids"])
+        entry = {
+            "logged_at": time.time(),
+            "query": search_request.query,
+            "k": search_request.k,
+            "overlap": round(top_k_overlap(live["result_ids"], shadow["result_ids"]), 4),
+            "rank_correlation": round(correlation, 4) if correlation is not None else None,
+            "live": live,
+            "shadow": shadow
+        }
+        self.recent.append(entry)
+        self.stats["compared"] += 1
+
+        try:
+            with self._log_lock:
+                append_jsonl(self.settings.comparison_log, entry, self.settings.comparison_log_mb * 1024 * 1024)
+        except Exception as e:
+            logger.warning(f"Shadow comparison log write failed: {str(e)}")
+
+    def _side_latency(self, entries: List[Dict[str, Any]], side: str) -> Dict[str, Any]:
+        stages: Dict[str, List[float]] = {}
+        for entry in entries:
+            for stage, duration in entry[side]["stages_ms"].items():
+                stages.setdefault(stage, []).append(duration)
+        return {
+            "pipeline_ms": _percentiles([entry[side]["pipeline_ms"] for entry in entries]),
+            "queue_ms": _percentiles([entry[side]["queue_ms"] for entry in entries]),
+            "stages_ms": {stage: _percentiles(durations) for stage, durations in stages.items()}
+        }
+
+    def get_status(self, recent: int = 0) -> Dict[str, Any]:
+        entries = list(self.recent)
+        correlations = [entry["rank_correlation"] for entry in entries if entry["rank_correlation"] is not None]
+        status = {
+            "enabled": self.settings.enabled,
+            "ready": self.is_ready,
+            "model_name": self.settings.model_name,
+            "index": self.matching.system_status if self.matching else None,
+            "sample_rate": self.settings.sample_rate,
+            "in_flight": self._in_flight,
+            **self.stats,
+            "window": len(entries),
+            "mean_overlap": round(float(np.mean([entry["overlap"] for entry in entries])), 4) if entries else None,
+            "mean_rank_correlation": round(float(np.mean(correlations)), 4) if correlations else None,
+            "live": self._side_latency(entries, "live") if entries else None,
+            "shadow": self._side_latency(entries, "shadow") if entries else None
+        }
+        if recent:
+            status["recent"] = entries[-recent:][::-1]
+        return status
+
+    def shutdown(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        if self.matching:
+            self.matching.shutdown()
@@ -0,0 +1,209 @@
+import time
+import bisect
+import heapq
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+from backend.models.user_model import CurrentRole, NetworkingIntent, UserProfile
+
+logger = logging.getLogger(__name__)
+
+# A query is only suggested once it has been searched this many times from distinct searchers
+# (anonymous searches each count); after that each search counts like one profile having a term
+MIN_QUERY_OCCURRENCES = 3
+MAX_TRACKED_QUERIES = 5000
+
+TermKey = Tuple[str, str]   # (kind, normalized text)
+
+
+@dataclass
+class Term:
+    text: str
+    kind: str    # skill, domain, role, intent or query
+    count: int = 0
+
+
+def normalize_term(text: str) -> str:
+    return ' '.join((text or '').lower().replace('_', ' ').split())
+
+
+class SuggestionService:
+    """Typeahead over skills, domains, roles, intents and popular queries.
+
+    Every term is indexed under its full text and under each later word ("machine learning"
+    is found by "mach" and by "lear"). Index keys sit in one sorted list, so a prefix is a
+    contiguous slice found with two binary searches; the slice's terms are ranked by count.
+    """
+
+    def __init__(self, max_tracked_queries: int = MAX_TRACKED_QUERIES,
+                 min_query_occurrences: int = MIN_QUERY_OCCURRENCES):
+        self.max_tracked_queries = max_tracked_queries
+        self.min_query_occurrences = max(1, min_query_occurrences)
+        self.terms: Dict[TermKey, Term] = {}
+
+        self._index_keys: List[str] = []
+        self._index_terms: Dict[str, Set[TermKey]] = {}
+        self._user_terms: Dict[int, Set[TermKey]] = {}
+        self._query_keys: Set[TermKey] = set()
+        # Queries not yet seen often enough to suggest: key -> (occurrences, searcher ids); never indexed
+        self._pending_queries: 'OrderedDict[TermKey, Tuple[int, Set[int]]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Enum values are always suggestible, even before any profile uses them
+        for role in CurrentRole:
+            self._add_term(("role", normalize_term(role.value)), role.value.replace('_', ' '), 0)
+        for intent in NetworkingIntent:
+            self._add_term(("intent", normalize_term(intent.value)), intent.value.replace('_', ' '), 0)
+
+    @staticmethod
+    def _profile_terms(user: UserProfile) -> Dict[TermKey, str]:
+        terms = {("skill", normalize_term(skill)): skill for skill in user.skill_levels}
+        terms.update({("domain", normalize_term(domain)): domain for domain in user.domain_expertise})
+        terms[("role", normalize_term(user.current_role.value))] = user.current_role.value.replace('_', ' ')
+        terms[("intent", normalize_term(user.networking_intent.value))] = user.networking_intent.value.replace('_', ' ')
+        return {key: text for key, text in terms.items() if key[1]}
+
+    # Full text plus every word-start suffix
+    @staticmethod
+    def _index_keys_for(normalized: str) -> List[str]:
+        words = normalized.split()
+        return [' '.join(words[start:]) for start in range(len(words))]
+
+    def _add_term(self, key: TermKey, text: str, count: int) -> None:
+        term = self.terms.get(key)
+        if term is None:
+            self.terms[key] = Term(text=text, kind=key[0], count=count)
+            if key[0] == "query":
+                self._query_keys.add(key)
+            for index_key in self._index_keys_for(key[1]):
+                terms = self._index_terms.get(index_key)
+                if terms is None:
+                    self._index_terms[index_key] = {key}
+                    bisect.insort(self._index_keys, index_key)
+                else:
+                    terms.add(key)
+        else:
+            term.count += count
+
+    # Profile terms disappear once nobody has them; enum values always stay
+    def _remove_count(self, key: TermKey, count: int) -> None:
+        term = self.terms.get(key)
+        if term is None:
+            return
+
+        term.count -= count
+        if term.count > 0 or key[0] in ("role", "intent"):
+            term.count = max(term.count, 0)
+            return
+
+        del self.terms[key]
+        self._query_keys.discard(key)
+        for index_key in self._index_keys_for(key[1]):
+            terms = self._index_terms.get(index_key)
+            if terms is None:
+                continue
+            terms.discard(key)
+            if not terms:
+                del self._index_terms[index_key]
+                position = bisect.bisect_left(self._index_keys, index_key)
+                if position < len(self._index_keys) and self._index_keys[position] == index_key:
+                    del self._index_keys[position]
+
+    # Rebuild profile terms from scratch; tracked queries survive a reload
+    def load(self, users: List[UserProfile]) -> None:
+        start = time.time()
+        with self._lock:
+            for terms in self._user_terms.values():
+                for key in terms:
+                    self._remove_count(key, 1)
+            self._user_terms.clear()
+
+            for user in users:
+                self._add_user(user)
+
+        logger.info(f"Suggestion index built: {len(self.terms)} terms, {len(self._index_keys)} keys "
+                    f"in {(time.time() - start) * 1000:.1f}ms")
+
+    def _add_user(self, user: UserProfile) -> None:
+        terms = self._profile_terms(user)
+        for key, text in terms.items():
+            self._add_term(key, text, 1)
+        self._user_terms[user.id] = set(terms)
+
+    # One profile changed: only the terms it gained or lost are touched
+    def refresh_user(self, user: UserProfile) -> None:
+        with self._lock:
+            old_terms = self._user_terms.get(user.id, set())
+            new_terms = self._profile_terms(user)
+
+            for key in old_terms - set(new_terms):
+                self._remove_count(key, 1)
+            for key in set(new_terms) - old_terms:
+                self._add_term(key, new_terms[key], 1)
+            self._user_terms[user.id] = set(new_terms)
+
+    # Count a query that returned results. One-off text stays out of the index until enough
+    # distinct searches have used it; a searcher repeating their own query counts once.
+    def record_query(self, query: str, searcher_id: Optional[int] = None) -> None:
+        normalized = normalize_term(query)
+        if not normalized or len(normalized) > 100:
+            return
+
+        key = ("query", normalized)
+        with self._lock:
+            if key in self.terms:
+                self._add_term(key, ' '.join(query.split()), 1)
+            else:
+                occurrences, searchers = self._pending_queries.pop(key, (0, set()))
+                if searcher_id is not None:
+                    if searcher_id in searchers:
+                        self._pending_queries[key] = (occurrences, searchers)
+                        return
+                    searchers.add(searcher_id)
+                occurrences += 1
+
+                if occurrences < self.min_query_occurrences:
+                    self._pending_queries[key] = (occurrences, searchers)
+                    # Forget the least recently seen candidates first
+                    while len(self._pending_queries) > self.max_tracked_queries:
+                        self._pending_queries.popitem(last=False)
+                    return
+                self._add_term(key, ' '.join(query.split()), occurrences)
+
+            # Keep the most popular queries once too many distinct ones pile up
+            if len(self._query_keys) > self.max_tracked_queries:
+                excess = len(self._query_keys) - self.max_tracked_queries
+                for key in heapq.nsmallest(excess, self._query_keys, key=lambda key: self.terms[key].count):
+                    self._remove_count(key, self.terms[key].count)
+
+    # Completions for a prefix, most frequent first; an empty prefix gives the most frequent overall
+    def suggest(self, prefix: str, limit: int = 8, kinds: Optional[Set[str]] = None) -> List[Dict]:
+        normalized = normalize_term(prefix)
+
+        with self._lock:
+            if normalized:
+                low = bisect.bisect_left(self._index_keys, normalized)
+                high = bisect.bisect_left(self._index_keys, normalized + '\uffff', lo=low)
+                keys = {key for index_key in self._index_keys[low:high] for key in self._index_terms[index_key]}
+            else:
+                keys = self.terms.keys()
+
+            candidates = [
+                self.terms[key] for key in keys
+                if (kinds is None or key[0] in kinds) and self.terms[key].count > 0
+            ]
+            best = heapq.nsmallest(limit, candidates, key=lambda term: (-term.count, len(term.text), term.text))
+
+        return [{"text": term.text.replace("_", " "), "kind": term.kind, "count": term.count} for term in best]
+
+    def get_status(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "terms": len(self.terms),
+                "index_keys": len(self._index_keys),
+                "queries": len(self._query_keys),
+                "pending_queries": len(self._pending_queries)
+            }
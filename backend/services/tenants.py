@@ -0,0 +1,188 @@
+import os
+import re
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from backend.models.user_model import UserProfile
+from backend.utils.snapshot import SNAPSHOT_FILE, Snapshot
+from backend.services.core_matching import CoreMatchingService
+from backend.services.results import ResultsService
+
+logger = logging.getLogger(__name__)
+
+# Tenant ids become directory names, so nothing that could walk out of the tenants directory
+TENANT_ID_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+
+# Parsed UserProfile objects, pre-rendered fragments and feature columns, relative to the
+# profiles' JSON size in the snapshot; a rough figure, but it keeps the budget honest
+PROFILE_MEMORY_FACTOR = 6
+
+
+@dataclass
+class TenantSettings:
+    tenants_dir: str = "tenants"
+    memory_budget_mb: float = 1024.0
+
+    @classmethod
+    def from_env(cls) -> 'TenantSettings':
+        return cls(
+            tenants_dir=os.getenv("FIGBOX_TENANTS_DIR", "tenants"),
+            memory_budget_mb=float(os.getenv("FIGBOX_TENANT_MEMORY_MB", 1024))
+        )
+
+
+class Tenant:
+    """One community: its snapshot, parsed profiles and a matching view over its vectors."""
+
+    def __init__(self, tenant_id: str, snapshot: Snapshot, users: List[UserProfile],
+                 matching: CoreMatchingService, results: ResultsService):
+        self.tenant_id = tenant_id
+        self.snapshot = snapshot
+        self.users_by_id: Dict[int, UserProfile] = {user.id: user for user in users}
+        self.matching = matching
+        self.results = results
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.requests = 0
+
+        profile_bytes = snapshot.header["sections"]["profiles/data"]["nbytes"]
+        self.memory_bytes = snapshot.get_status()["size_bytes"] + PROFILE_MEMORY_FACTOR * profile_bytes
+
+    def get_users(self) -> List[UserProfile]:
+        return list(self.users_by_id.values())
+
+    def close(self) -> None:
+        self.snapshot.close()
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "users": len(self.users_by_id),
+            "memory_mb": round(self.memory_bytes / (1024 * 1024), 2),
+            "requests": self.requests,
+            "loaded_at": self.loaded_at,
+            "idle_seconds": round(time.time() - self.last_used, 1)
+        }
+
+
+class TenantRegistry:
+    """Tenant id -> loaded Tenant, read from <tenants_dir>/<tenant_id>/snapshot.figbox on first use.
+
+    Every tenant shares the base service's model, scheduler and executors; only its snapshot,
+    profiles and per-user columns are its own. Once the loaded tenants' estimated memory goes
+    over the budget, the least recently used ones are dropped and reload on their next request.
+    """
+
+    def __init__(self, base_service: CoreMatchingService, settings: Optional[TenantSettings] = None):
+        self.base_service = base_service
+        self.settings = settings or TenantSettings.from_env()
+        self.tenants: "OrderedDict[str, Tenant]" = OrderedDict()
+
+        # One load per tenant at a time; concurrent first requests wait for the same load
+        self._loading: Dict[str, asyncio.Future] = {}
+        self.stats = {"loads": 0, "hits": 0, "evictions": 0, "failed_loads": 0}
+
+    def snapshot_path(self, tenant_id: str) -> str:
+        return os.path.join(self.settings.tenants_dir, tenant_id, SNAPSHOT_FILE)
+
+    # ValueError for a malformed id, KeyError for a tenant with no snapshot
+    async def get(self, tenant_id: str) -> Tenant:
+        if not TENANT_ID_PATTERN.match(tenant_id):
+            raise ValueError(f"Invalid tenant id: {tenant_id}")
+
+        tenant = self.tenants.get(tenant_id)
+        if tenant is not None:
+            self.tenants.move_to_end(tenant_id)
+            tenant.last_used = time.time()
+            tenant.requests += 1
+            self.stats["hits"] += 1
+            return tenant
+
+        pending = self._loading.get(tenant_id)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        if not os.path.exists(self.snapshot_path(tenant_id)):
+            raise KeyError(f"Unknown tenant: {tenant_id}")
+
+        future = asyncio.get_event_loop().create_future()
+        self._loading[tenant_id] = future
+        try:
+            tenant = await asyncio.get_event_loop().run_in_executor(
+                self.base_service.executor, self._load, tenant_id
+            )
+            self.tenants[tenant_id] = tenant
+            tenant.requests += 1
+            self.stats["loads"] += 1
+            self._evict_over_budget(keep=tenant_id)
+            future.set_result(tenant)
+            return tenant
+        except Exception as e:
+            self.stats["failed_loads"] += 1
+            future.set_exception(e)
+            # Waiters get the error; mark it retrieved so an unawaited future doesn't warn
+            future.exception()
+            raise
+        finally:
+            del self._loading[tenant_id]
+
+    # Blocking: map the snapshot, parse profiles and build the tenant's view and fragments
+    def _load(self, tenant_id: str) -> Tenant:
+        start = time.time()
+        snapshot = Snapshot.open(self.snapshot_path(tenant_id))
+        try:
+            users = [UserProfile.from_dict(user_data) for user_data in snapshot.profiles()]
+            matching = self.base_service.for_snapshot(snapshot, users)
+
+            results = ResultsService()
+            results.prepare_fragments(users)
+        except Exception:
+            snapshot.close()
+            raise
+
+        tenant = Tenant(tenant_id, snapshot, users, matching, results)
+        logger.info(
+            f"Loaded tenant {tenant_id}: {len(users)} users, ~{tenant.memory_bytes / (1024 * 1024):.1f} MB "
+            f"in {(time.time() - start) * 1000:.1f}ms"
+        )
+        return tenant
+
+    def memory_bytes(self) -> int:
+        return sum(tenant.memory_bytes for tenant in self.tenants.values())
+
+    # Least recently used first; the tenant just loaded stays even if it alone is over budget
+    def _evict_over_budget(self, keep: str) -> None:
+        budget = self.settings.memory_budget_mb * 1024 * 1024
+        for tenant_id in list(self.tenants):
+            if self.memory_bytes() <= budget:
+                break
+            if tenant_id != keep:
+                self.evict(tenant_id)
+
+    # In-flight requests keep their Tenant; the mapping is released when they drop it
+    def evict(self, tenant_id: str) -> bool:
+        tenant = self.tenants.pop(tenant_id, None)
+        if tenant is None:
+            return False
+
+        tenant.close()
+        self.stats["evictions"] += 1
+        logger.info(f"Evicted tenant {tenant_id} after {time.time() - tenant.last_used:.0f}s idle")
+        return True
+
+    def close(self) -> None:
+        for tenant_id in list(self.tenants):
+            self.evict(tenant_id)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "tenants_dir": self.settings.tenants_dir,
+            "loaded": len(self.tenants),
+            "memory_mb": round(self.memory_bytes() / (1024 * 1024), 2),
+            "memory_budget_mb": self.settings.memory_budget_mb,
+            **self.stats,
+            "tenants": {tenant_id: tenant.get_status() for tenant_id, tenant in self.tenants.items()}
+        }
@@ -0,0 +1,175 @@
+import time
+import base64
+import bisect
+import logging
+from datetime import date
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from backend.models.user_model import UserProfile
+from backend.utils.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+USER_FIELDS = (
+    "id",
+    "name",
+    "bio",
+    "location",
+    "domain_expertise",
+    "current_role",
+    "experience_level",
+    "networking_intent",
+    "activity_status",
+    "conversation_count",
+    "conversations",
+    "remote_preference",
+)
+
+
+class UserListingService:
+    def __init__(self, max_cached_pages: int = 256):
+        self.max_cached_pages = max_cached_pages
+        self.page_cache: "OrderedDict[Tuple, bytes]" = OrderedDict()
+        self.version = 0
+        self.loaded_at: Optional[float] = None
+
+        self._users: List[UserProfile] = []
+        self._rows: List[Dict] = []
+        self._rows_day: Optional[date] = None
+
+    # Called whenever the profile cache is (re)loaded; drops every cached page
+    def load(self, users: List[UserProfile]) -> None:
+        self._users = sorted(users, key=lambda user: user.id)
+        self._rows = []
+        self._rows_day = None
+        self.page_cache.clear()
+        self.version += 1
+        self.loaded_at = time.time()
+        logger.info(f"User listing loaded {len(self._users)} users (version {self.version})")
+
+    # One profile changed; rebuild its row and drop cached pages, which may contain it
+    def refresh_user(self, user: UserProfile) -> None:
+        if self._rows:
+            position = bisect.bisect_left(self._rows, user.id, key=lambda row: row["id"])
+            if position < len(self._rows) and self._rows[position]["id"] == user.id:
+                self._rows[position] = self._user_to_dict(user)
+        self.page_cache.clear()
+        self.version += 1
+
+    def _user_to_dict(self, user: UserProfile) -> Dict:
+        return {
+            "id": user.id,
+            "name": user.name,
+            "bio": user.bio,
+            "location": user.location,
+            "domain_expertise": user.domain_expertise,
+            "current_role": user.current_role.value,
+            "experience_level": user.experience_level.value,
+            "networking_intent": user.networking_intent.value,
+            "activity_status": user.get_activity_status().value,
+            "conversation_count": len(user.conversations),
+            "conversations": [{"text": conv.text, "timestamp": conv.timestamp} for conv in user.conversations],
+            "remote_preference": user.remote_preference
+        }
+
+    # Activity status depends on today's date, so rows are rebuilt at most once a day
+    def _get_rows(self) -> List[Dict]:
+        today = date.today()
+        if self._rows_day != today:
+            self._rows = [self._user_to_dict(user) for user in self._users]
+            self._rows_day = today
+            self.page_cache.clear()
+        return self._rows
+
+    @staticmethod
+    def encode_cursor(last_id: int) -> str:
+        return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> int:
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            return int(base64.urlsafe_b64decode(padded.encode()).decode())
+        except Exception:
+            raise ValueError("Invalid cursor")
+
+    @staticmethod
+    def parse_fields(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+        if not fields:
+            return None
+
+        requested = tuple(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+        unknown = [field for field in requested if field not in USER_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+        # The id is always returned so clients can page and look users up
+        if "id" not in requested:
+            requested = ("id",) + requested
+        return requested
+
+    # Serialized page of users. The page is cached; the response timestamp is the request time,
+    # so it is appended to the cached body on every call.
+    def get_page(self, limit: Optional[int] = None, cursor: Optional[str] = None,
+                 fields: Optional[Sequence[str]] = None, roles: Optional[Sequence[str]] = None,
+                 intents: Optional[Sequence[str]] = None, activities: Optional[Sequence[str]] = None) -> bytes:
+        body = self._page_body(limit, cursor, fields, roles, intents, activities)
+        return body[:-1] + (',"timestamp":%s}' % dumps(time.time())).encode("utf-8")
+
+    # Page body without the closing timestamp, served from cache when the same page was built before
+    def _page_body(self, limit: Optional[int], cursor: Optional[str], fields: Optional[Sequence[str]],
+                   roles: Optional[Sequence[str]], intents: Optional[Sequence[str]],
+                   activities: Optional[Sequence[str]]) -> bytes:
+        rows = self._get_rows()
+
+        after_id = self.decode_cursor(cursor) if cursor else None
+        cache_key = (
+            after_id,
+            limit,
+            tuple(fields) if fields else None,
+            tuple(sorted(roles)) if roles else None,
+            tuple(sorted(intents)) if intents else None,
+            tuple(sorted(activities)) if activities else None,
+        )
+
+        cached = self.page_cache.get(cache_key)
+        if cached is not None:
+            self.page_cache.move_to_end(cache_key)
+            return cached
+
+        role_set = set(roles) if roles else None
+        intent_set = set(intents) if intents else None
+        activity_set = set(activities) if activities else None
+
+        matching = [
+            row for row in rows
+            if (role_set is None or row["current_role"] in role_set)
+            and (intent_set is None or row["networking_intent"] in intent_set)
+            and (activity_set is None or row["activity_status"] in activity_set)
+        ]
+
+        start = 0
+        if after_id is not None:
+            start = next((i for i, row in enumerate(matching) if row["id"] > after_id), len(matching))
+
+        page = matching[start:start + limit] if limit else matching[start:]
+        has_more = limit is not None and start + len(page) < len(matching)
+
+        if fields:
+            page = [{field: row[field] for field in fields} for row in page]
+
+        body = dumps({
+            "users": page,
+            "total": len(matching),
+            "returned": len(page),
+            "next_cursor": self.encode_cursor(page[-1]["id"]) if has_more and page else None,
+            "version": self.version,
+            "loaded_at": self.loaded_at
+        }).encode("utf-8")
+
+        self.page_cache[cache_key] = body
+        if len(self.page_cache) > self.max_cached_pages:
+            self.page_cache.popitem(last=False)
+
+        return body
@@ -1,12 +1,23 @@
 import sys
 import os
+import shutil
+import argparse
 import numpy as np
 import faiss
 from sentence_transformers import SentenceTransformer
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from data_loader import users_data
+from backend.utils.conversation_vectors import ConversationStore, collect_conversations, load_conversation_log
+from backend.utils.embedding_cache import EmbeddingCache, EmbeddingCacheSettings
+from backend.utils.snapshot import write_snapshot
+from backend.utils.knn_graph import KnnGraph, build_knn_graph, save_knn_graph
+from backend.utils.dedup import DEFAULT_THRESHOLD, build_report, find_duplicate_clusters, representative_rows, save_report
 
+MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# Conversations are embedded separately and mixed in with a time decay (see ConversationStore)
 def get_user_text(user):
     bio_text = user.get('bio', '')
     
@@ -25,9 +36,6 @@ def get_user_text(user):
     experience_text = user.get('experience_level', '') * 2
     networking_text = user.get('networking_intent', '').replace('_', ' ') * 2
     
-    recent_conversations = user.get('conversations', [])[:2]
-    conversations_text = " ".join([conv['text'] for conv in recent_conversations])
-    
     location_text = user.get('location', '')
     last_active_text = f"Last active on {user.get('last_active', '')}" if user.get('last_active') else ""
 
@@ -38,7 +46,6 @@ def get_user_text(user):
         role_text,             
         experience_text,       
         networking_text,       
-        conversations_text,    
         location_text,
         last_active_text
     ])
@@ -49,18 +56,86 @@ def get_user_text(user):
 def get_all_user_texts():
     return [get_user_text(user) for user in users_data]
 
+# Profile conversations plus the ones the API logged since; the store records how many it covers
+def get_all_conversations(log_entries):
+    return collect_conversations(users_data, log_entries)
+
+# Texts encoded by an earlier run (or by the API) come from the on-disk cache
+def encode_cached(model, cache, texts):
+    if cache is None:
+        return model.encode(texts, batch_size=64)
+    return cache.encode(MODEL_NAME, texts, lambda missing: model.encode(missing, batch_size=64))
+
 def create_embeddings():
-    model = SentenceTransformer('all-MiniLM-L6-v2')
+    model = SentenceTransformer(MODEL_NAME)
+    cache = EmbeddingCache.from_settings(EmbeddingCacheSettings.from_env())
     user_texts = get_all_user_texts()
 
     # Create embeddings
-    user_embeddings = model.encode(user_texts)
+    profile_embeddings = encode_cached(model, cache, user_texts)
+    
+    # Every conversation is embedded once; the API adds new ones incrementally
+    log_entries = load_conversation_log("embeddings")
+    conversation_texts, conversation_rows, conversation_days = get_all_conversations(log_entries)
+    conversation_embeddings = encode_cached(model, cache, conversation_texts)
+    print(f" Conversation Embeddings Shape: {conversation_embeddings.shape}")
+    if cache is not None:
+        print(f" Embedding cache: {cache.get_status()}")
+    
+    store = ConversationStore(profile_embeddings)
+    store.extend(conversation_embeddings, conversation_rows, conversation_days)
+    store.log_entries = len(log_entries)
+    store.save("embeddings")
+    
+    user_embeddings = store.user_vectors()
     print(f" Embeddings Shape: {user_embeddings.shape}")
 
     embeddings_path = "embeddings/user_embeddings.npy"
     np.save(embeddings_path, user_embeddings)
     return user_embeddings
 
+# Templated profiles embed almost identically; report them, and optionally keep one per cluster
+def detect_duplicates(user_embeddings, threshold, collapse):
+    clusters, stats = find_duplicate_clusters(user_embeddings, threshold)
+    report = build_report(clusters, stats, users_data, threshold, collapse)
+    report_path = save_report("embeddings", report)
+
+    print(f" Near-duplicates: {len(clusters)} clusters, {report['duplicate_users']} extra users "
+          f"({stats['comparisons']} of {stats['all_pairs']} pairs compared), report in {report_path}")
+    for cluster in report["clusters"][:5]:
+        print(f"   {cluster['user_ids']} (min similarity {cluster['min_similarity']}): {cluster['bios'][0]}")
+
+    if not collapse or not clusters:
+        return user_embeddings
+    return collapse_duplicates(user_embeddings, representative_rows(len(users_data), clusters))
+
+# Everything built after this (index, snapshot, conversation rows) covers representatives only
+def collapse_duplicates(user_embeddings, kept_rows):
+    store = ConversationStore.load("embeddings").select_rows(kept_rows)
+    store.save("embeddings")
+
+    users_data[:] = [users_data[row] for row in kept_rows]
+    user_embeddings = user_embeddings[kept_rows]
+    np.save("embeddings/user_embeddings.npy", user_embeddings)
+
+    # Rows were renumbered, so anything stored by row is rebuilt or removed
+    graph = KnnGraph.load("embeddings")
+    if graph is not None:
+        k = graph.k
+        del graph
+        normalized_embeddings = user_embeddings.astype(np.float32)
+        faiss.normalize_L2(normalized_embeddings)
+        neighbor_ids, neighbor_scores = build_knn_graph(normalized_embeddings, k)
+        save_knn_graph("embeddings", neighbor_ids, neighbor_scores, normalized_embeddings)
+        print(f" Rebuilt k-NN graph {neighbor_ids.shape}")
+
+    if os.path.isdir("embeddings/shards"):
+        shutil.rmtree("embeddings/shards")
+        print(" Removed embeddings/shards; re-run build_shards.py")
+
+    print(f" Collapsed to {len(kept_rows)} users")
+    return user_embeddings
+
 def create_faiss_index(user_embeddings):
     
     dimension = user_embeddings.shape[1]  
@@ -77,6 +152,12 @@ def create_faiss_index(user_embeddings):
 
     return index
 
+# Profiles, columns and normalized vectors in one file; the API prefers it when present
+def create_snapshot(user_embeddings):
+    snapshot_path = "embeddings/snapshot.figbox"
+    header = write_snapshot(snapshot_path, users_data, user_embeddings, MODEL_NAME)
+    print(f" Snapshot: {header['num_rows']} rows, dimension {header['dimension']}")
+
 def verify_embeddings(user_embeddings):
     for i, user in enumerate(users_data):
         embedding = user_embeddings[i]
@@ -108,12 +189,21 @@ def test_index(index):
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Embed every profile and build the search index")
+    parser.add_argument("--duplicate-threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Cosine similarity at which two profiles count as near-duplicates")
+    parser.add_argument("--collapse-duplicates", action="store_true",
+                        help="Index one representative per near-duplicate cluster")
+    args = parser.parse_args()
+
     os.makedirs("embeddings", exist_ok=True)
     
 
     user_embeddings = create_embeddings()
+    user_embeddings = detect_duplicates(user_embeddings, args.duplicate_threshold, args.collapse_duplicates)
     verify_embeddings(user_embeddings)
     index = create_faiss_index(user_embeddings)
+    create_snapshot(user_embeddings)
     
     test_index(index)
     
@@ -0,0 +1,58 @@
+import pytest
+
+from backend.utils.query_parsing import parse_query
+
+
+@pytest.mark.parametrize("query, positive, negatives", [
+    ("business cofounder, not technical", "business cofounder", ("technical",)),
+    ("designer without coding experience", "designer", ("coding experience",)),
+    ("founder but not technical", "founder", ("technical",)),
+    ("fintech founder, not in crypto", "fintech founder", ("crypto",)),
+    ("non-technical cofounder", "cofounder", ("technical",)),
+    ("non technical cofounder", "cofounder", ("technical",)),
+    ("looking for investors and not agencies", "looking for investors", ("agencies",)),
+    ("not a developer", "", ("developer",)),
+])
+def test_negated_clauses_are_split_out(query, positive, negatives):
+    parsed = parse_query(query)
+    assert parsed.positive == positive
+    assert parsed.negatives == negatives
+
+
+@pytest.mark.parametrize("query", [
+    "non-profit founder",
+    "nonprofit founder",
+    "non-governmental organisation lead",
+    "remote is non-negotiable, designer",
+    "no-code builder",
+])
+def test_lexicalized_non_words_are_not_negations(query):
+    parsed = parse_query(query)
+    assert not parsed.has_negatives
+    assert parsed.positive == query
+
+
+@pytest.mark.parametrize("query, positive", [
+    ("not only engineers but designers", "engineers, designers"),
+    ("not only engineers but also designers", "engineers, designers"),
+    ("not just engineers", "engineers"),
+    ("not sure, maybe a PM", "maybe a PM"),
+    ("no preference on location, ML engineer", "ML engineer"),
+    ("no particular preference, growth marketer", "growth marketer"),
+])
+def test_idioms_rule_nothing_out(query, positive):
+    parsed = parse_query(query)
+    assert not parsed.has_negatives
+    assert parsed.positive == positive
+
+
+def test_leading_conjunction_is_stripped_from_positive_clause():
+    parsed = parse_query("engineer, not in crypto but fintech")
+    assert parsed.positive == "engineer, fintech"
+    assert parsed.negatives == ("crypto",)
+
+
+def test_plain_query_is_unchanged():
+    parsed = parse_query("AI developer")
+    assert parsed.positive == "AI developer"
+    assert not parsed.has_negatives
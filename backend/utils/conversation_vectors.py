@@ -0,0 +1,259 @@
+import os
+import json
+import base64
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+from backend.models.user_model import parse_date
+
+logger = logging.getLogger(__name__)
+
+PROFILE_EMBEDDINGS_FILE = "profile_embeddings.npy"
+CONVERSATIONS_FILE = "conversation_embeddings.npz"
+# Conversations added through the API, in arrival order, with their embeddings
+CONVERSATION_LOG_FILE = "conversation_log.jsonl"
+
+DEFAULT_HALF_LIFE_DAYS = 30.0
+DEFAULT_CONVERSATION_WEIGHT = 0.35
+
+
+# "2025-04-24" -> proleptic ordinal day; None when the timestamp can't be parsed
+def timestamp_day(timestamp: str) -> Optional[int]:
+    parsed = parse_date(timestamp)
+    return parsed.toordinal() if parsed is not None else None
+
+
+# One line per conversation, written before it is applied anywhere so a restart can replay it
+def append_conversation_log(directory: str, user_id: int, text: str, timestamp: str,
+                            embedding: np.ndarray) -> None:
+    entry = {
+        "user_id": user_id,
+        "text": text,
+        "timestamp": timestamp,
+        "embedding": base64.b64encode(np.asarray(embedding, dtype=np.float32).tobytes()).decode("ascii")
+    }
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, CONVERSATION_LOG_FILE), "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+# Every logged conversation, oldest first, with its embedding decoded; a torn last line is skipped
+def load_conversation_log(directory: str) -> List[Dict[str, Any]]:
+    path = os.path.join(directory, CONVERSATION_LOG_FILE)
+    if not os.path.exists(path):
+        return []
+
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                entry["embedding"] = np.frombuffer(base64.b64decode(entry["embedding"]), dtype=np.float32)
+            except (ValueError, KeyError) as e:
+                logger.warning(f"Skipping conversation log line {number}: {str(e)}")
+                continue
+            entries.append(entry)
+    return entries
+
+
+# Profile dicts with their logged conversations added, newest first; the originals are not modified
+def with_logged_conversations(users: List[Dict], entries: List[Dict[str, Any]]) -> List[Dict]:
+    by_user: Dict[Any, List[Dict[str, Any]]] = {}
+    for entry in entries:
+        by_user.setdefault(entry["user_id"], []).append(entry)
+    if not by_user:
+        return users
+
+    merged = []
+    for user in users:
+        logged = by_user.get(user.get("id"))
+        if not logged:
+            merged.append(user)
+            continue
+
+        user = dict(user)
+        conversations = list(user.get("conversations", [])) + [
+            {"text": entry["text"], "timestamp": entry["timestamp"]} for entry in logged
+        ]
+        user["conversations"] = sorted(conversations, key=lambda conv: conv.get("timestamp", ""), reverse=True)
+        newest = max(entry["timestamp"] for entry in logged)
+        if newest > user.get("last_active", ""):
+            user["last_active"] = newest
+        merged.append(user)
+    return merged
+
+
+# (texts, rows, days) for every dated conversation: each profile's own, then the logged ones
+def collect_conversations(users: List[Dict],
+                          entries: Sequence[Dict[str, Any]] = ()) -> Tuple[List[str], List[int], List[int]]:
+    texts, rows, days = [], [], []
+    row_of = {}
+    for row, user in enumerate(users):
+        row_of[user.get("id")] = row
+        for conv in user.get("conversations", []):
+            day = timestamp_day(conv.get("timestamp"))
+            if day is None:
+                continue
+            texts.append(conv["text"])
+            rows.append(row)
+            days.append(day)
+
+    for entry in entries:
+        row = row_of.get(entry["user_id"])
+        day = timestamp_day(entry["timestamp"])
+        if row is not None and day is not None:
+            texts.append(entry["text"])
+            rows.append(row)
+            days.append(day)
+    return texts, rows, days
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class ConversationStore:
+    """Every conversation embedding in one growable matrix, plus a time-decayed sum per user.
+
+    Each user's sum is kept relative to that user's newest conversation, so adding one
+    conversation is a rescale and an add, never a pass over the user's history:
+        aggregate = aggregate * 0.5 ** ((new_day - reference_day) / half_life) + embedding
+    The user's vector blends the profile-only embedding with the normalized aggregate.
+    log_entries counts the conversation log entries already folded in; later ones are replayed.
+    """
+
+    def __init__(self, profile_vectors: np.ndarray, half_life_days: float = DEFAULT_HALF_LIFE_DAYS,
+                 conversation_weight: float = DEFAULT_CONVERSATION_WEIGHT):
+        self.profile_vectors = _normalize_rows(np.asarray(profile_vectors, dtype=np.float32))
+        self.half_life_days = half_life_days
+        self.conversation_weight = conversation_weight
+        self.log_entries = 0
+
+        num_users, dimension = self.profile_vectors.shape
+        self.aggregates = np.zeros((num_users, dimension), dtype=np.float32)
+        self.reference_days = np.full(num_users, -1, dtype=np.int64)
+
+        self._embeddings = np.zeros((0, dimension), dtype=np.float32)
+        self._rows = np.zeros(0, dtype=np.int32)
+        self._days = np.zeros(0, dtype=np.int32)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        return self._embeddings[:self._size]
+
+    @property
+    def rows(self) -> np.ndarray:
+        return self._rows[:self._size]
+
+    @property
+    def days(self) -> np.ndarray:
+        return self._days[:self._size]
+
+    def _decay(self, elapsed_days: np.ndarray) -> np.ndarray:
+        return np.power(0.5, np.asarray(elapsed_days, dtype=np.float64) / self.half_life_days).astype(np.float32)
+
+    # Capacity doubles, so appends are amortized O(dimension)
+    def _append(self, embeddings: np.ndarray, rows: np.ndarray, days: np.ndarray) -> None:
+        needed = self._size + len(embeddings)
+        if needed > len(self._embeddings):
+            capacity = max(needed, 2 * len(self._embeddings), 64)
+            self._embeddings = np.resize(self._embeddings, (capacity, self._embeddings.shape[1]))
+            self._rows = np.resize(self._rows, capacity)
+            self._days = np.resize(self._days, capacity)
+
+        self._embeddings[self._size:needed] = embeddings
+        self._rows[self._size:needed] = rows
+        self._days[self._size:needed] = days
+        self._size = needed
+
+    # Bulk load: every user's aggregate computed at once, relative to their newest conversation
+    def extend(self, embeddings: np.ndarray, rows: Sequence[int], days: Sequence[int]) -> None:
+        embeddings = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        rows = np.asarray(rows, dtype=np.int32)
+        days = np.asarray(days, dtype=np.int32)
+        if len(embeddings) == 0:
+            return
+
+        self._append(embeddings, rows, days)
+
+        # Rescale existing sums to the new reference day before adding
+        new_reference = self.reference_days.copy()
+        np.maximum.at(new_reference, rows, days)
+        touched = np.unique(rows)
+        had_history = touched[self.reference_days[touched] >= 0]
+        self.aggregates[had_history] *= self._decay(
+            new_reference[had_history] - self.reference_days[had_history]
+        )[:, None]
+        self.reference_days = new_reference
+
+        weights = self._decay(self.reference_days[rows] - days)
+        np.add.at(self.aggregates, rows, embeddings * weights[:, None])
+
+    # One new conversation; returns the user's refreshed vector
+    def add(self, row: int, embedding: np.ndarray, day: int) -> np.ndarray:
+        self.extend(np.asarray(embedding, dtype=np.float32).reshape(1, -1), [row], [day])
+        return self.user_vector(row)
+
+    def user_vector(self, row: int) -> np.ndarray:
+        return self.user_vectors(np.array([row]))[0]
+
+    def user_vectors(self, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        if rows is None:
+            rows = np.arange(len(self.profile_vectors))
+
+        profile = self.profile_vectors[rows]
+        aggregate = self.aggregates[rows]
+        has_conversations = (np.linalg.norm(aggregate, axis=1) > 0)[:, None]
+
+        blended = (1 - self.conversation_weight) * profile + self.conversation_weight * _normalize_rows(aggregate)
+        return _normalize_rows(np.where(has_conversations, blended, profile)).astype(np.float32)
+
+    # Store for a subset of users, renumbered in the order given; their conversations come along
+    def select_rows(self, rows: Sequence[int]) -> 'ConversationStore':
+        rows = np.asarray(rows, dtype=np.int64)
+        new_rows = np.full(len(self.profile_vectors), -1, dtype=np.int64)
+        new_rows[rows] = np.arange(len(rows))
+
+        store = ConversationStore(self.profile_vectors[rows], self.half_life_days, self.conversation_weight)
+        kept = new_rows[self.rows] >= 0
+        store.extend(self.embeddings[kept], new_rows[self.rows[kept]], self.days[kept])
+        store.log_entries = self.log_entries
+        return store
+
+    def save(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, PROFILE_EMBEDDINGS_FILE), self.profile_vectors)
+        np.savez(
+            os.path.join(directory, CONVERSATIONS_FILE),
+            embeddings=self.embeddings, rows=self.rows, days=self.days,
+            half_life_days=self.half_life_days, conversation_weight=self.conversation_weight,
+            log_entries=self.log_entries
+        )
+
+    @classmethod
+    def load(cls, directory: str, half_life_days: Optional[float] = None,
+             conversation_weight: Optional[float] = None) -> Optional['ConversationStore']:
+        profile_path = os.path.join(directory, PROFILE_EMBEDDINGS_FILE)
+        conversations_path = os.path.join(directory, CONVERSATIONS_FILE)
+        if not os.path.exists(profile_path) or not os.path.exists(conversations_path):
+            return None
+
+        data = np.load(conversations_path)
+        store = cls(
+            np.load(profile_path),
+            half_life_days if half_life_days is not None else float(data["half_life_days"]),
+            conversation_weight if conversation_weight is not None else float(data["conversation_weight"])
+        )
+        store.extend(data["embeddings"], data["rows"], data["days"])
+        store.log_entries = int(data["log_entries"]) if "log_entries" in data.files else 0
+
+        logger.info(f"Loaded {len(store)} conversation embeddings for {len(store.profile_vectors)} users")
+        return store
@@ -0,0 +1,177 @@
+import os
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Sequence, Set, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DUPLICATES_FILE = "duplicates.json"
+
+DEFAULT_THRESHOLD = 0.95
+# Two vectors at cosine 0.95 agree on a random hyperplane ~90% of the time, so a 12-bit key
+# matches in ~28% of tables; 16 tables find such a pair with ~99.5% probability
+DEFAULT_NUM_TABLES = 16
+DEFAULT_NUM_BITS = 12
+
+
+@dataclass
+class DuplicateCluster:
+    rows: np.ndarray            # every member, representative included
+    representative: int         # medoid: highest mean similarity to the other members
+    min_similarity: float       # weakest verified link that joined the cluster
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+# One integer key per row and table: the signs of num_bits random projections
+def lsh_keys(normalized: np.ndarray, num_tables: int = DEFAULT_NUM_TABLES,
+             num_bits: int = DEFAULT_NUM_BITS, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    planes = rng.standard_normal((normalized.shape[1], num_tables * num_bits)).astype(np.float32)
+    bits = (normalized @ planes > 0).reshape(len(normalized), num_tables, num_bits)
+    weights = (1 << np.arange(num_bits, dtype=np.int64))
+    return (bits * weights).sum(axis=2)
+
+
+class _UnionFind:
+    def __init__(self, size: int):
+        self.parent = np.arange(size)
+
+    def find(self, row: int) -> int:
+        root = row
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[row] != root:
+            self.parent[row], row = root, self.parent[row]
+        return root
+
+    def union(self, a: int, b: int) -> None:
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+
+# Near-duplicate clusters in roughly O(n * tables) plus the cost of the colliding buckets:
+# rows sharing a bucket in any table are candidates, and only candidates get an exact cosine.
+# Pairs at or above the threshold are joined transitively into clusters.
+def find_duplicate_clusters(vectors: np.ndarray, threshold: float = DEFAULT_THRESHOLD,
+                            num_tables: int = DEFAULT_NUM_TABLES, num_bits: int = DEFAULT_NUM_BITS,
+                            seed: int = 0) -> Tuple[List[DuplicateCluster], Dict[str, int]]:
+    normalized = _normalize_rows(np.asarray(vectors, dtype=np.float32))
+    num_rows = len(normalized)
+    keys = lsh_keys(normalized, num_tables, num_bits, seed)
+
+    union_find = _UnionFind(num_rows)
+    link_similarity: Dict[Tuple[int, int], float] = {}
+    comparisons = 0
+
+    for table in range(num_tables):
+        order = np.argsort(keys[:, table], kind="stable")
+        sorted_keys = keys[order, table]
+        boundaries = np.flatnonzero(np.diff(sorted_keys)) + 1
+        for bucket in np.split(order, boundaries):
+            if len(bucket) < 2:
+                continue
+
+            # A pair sharing buckets in several tables is compared again; that is cheaper than
+            # remembering every compared pair, and only pairs over the threshold reach Python
+            similarity = normalized[bucket] @ normalized[bucket].T
+            first, second = np.triu_indices(len(bucket), k=1)
+            comparisons += len(first)
+            hits = np.flatnonzero(similarity[first, second] >= threshold)
+            for a, b in zip(bucket[first[hits]], bucket[second[hits]]):
+                pair = (int(min(a, b)), int(max(a, b)))
+                if pair not in link_similarity:
+                    union_find.union(*pair)
+                    link_similarity[pair] = float(normalized[pair[0]] @ normalized[pair[1]])
+
+    members: Dict[int, Set[int]] = {}
+    weakest_link: Dict[int, float] = {}
+    for pair, score in link_similarity.items():
+        root = union_find.find(pair[0])
+        members.setdefault(root, set()).update(pair)
+        weakest_link[root] = min(score, weakest_link.get(root, score))
+
+    clusters = []
+    for root, rows in members.items():
+        rows = np.array(sorted(rows))
+        similarity = normalized[rows] @ normalized[rows].T
+        representative = int(rows[np.argmax(similarity.sum(axis=1))])
+        clusters.append(DuplicateCluster(rows=rows, representative=representative, min_similarity=weakest_link[root]))
+    clusters.sort(key=lambda cluster: (-len(cluster.rows), cluster.representative))
+
+    stats = {
+        "rows": num_rows,
+        "comparisons": comparisons,
+        "all_pairs": num_rows * (num_rows - 1) // 2,
+        "duplicate_pairs": len(link_similarity)
+    }
+    return clusters, stats
+
+
+# Rows left once every cluster keeps only its representative, in original order
+def representative_rows(num_rows: int, clusters: Sequence[DuplicateCluster]) -> np.ndarray:
+    keep = np.ones(num_rows, dtype=bool)
+    for cluster in clusters:
+        keep[cluster.rows] = False
+        keep[cluster.representative] = True
+    return np.flatnonzero(keep)
+
+
+def build_report(clusters: Sequence[DuplicateCluster], stats: Dict[str, int], users: Sequence[Dict[str, Any]],
+                 threshold: float, collapsed: bool) -> Dict[str, Any]:
+    return {
+        "threshold": threshold,
+        **stats,
+        "clusters": [
+            {
+                "representative": users[cluster.representative]["id"],
+                "user_ids": [users[row]["id"] for row in cluster.rows],
+                "min_similarity": round(cluster.min_similarity, 4),
+                "bios": [users[row].get("bio", "") for row in cluster.rows[:5]]
+            }
+            for cluster in clusters
+        ],
+        "duplicate_users": sum(len(cluster.rows) - 1 for cluster in clusters),
+        "collapsed": collapsed,
+        "removed_user_ids": sorted(
+            users[row]["id"] for cluster in clusters for row in cluster.rows if row != cluster.representative
+        ) if collapsed else []
+    }
+
+
+def save_report(directory: str, report: Dict[str, Any]) -> str:
+    path = os.path.join(directory, DUPLICATES_FILE)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+# Users a collapsing build left out of the index; empty when the build kept everyone
+def load_collapsed_user_ids(directory: str) -> Set[int]:
+    return set(load_collapsed_user_map(directory))
+
+
+# Removed user id -> id of the representative whose index row stands in for them
+def load_collapsed_user_map(directory: str) -> Dict[int, int]:
+    path = os.path.join(directory, DUPLICATES_FILE)
+    if not os.path.exists(path):
+        return {}
+
+    with open(path, "r") as f:
+        report = json.load(f)
+    if not report.get("collapsed"):
+        return {}
+
+    removed = set(report.get("removed_user_ids", []))
+    return {
+        user_id: cluster["representative"]
+        for cluster in report.get("clusters", [])
+        for user_id in cluster["user_ids"]
+        if user_id in removed
+    }
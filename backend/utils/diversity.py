@@ -0,0 +1,39 @@
+import numpy as np
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+# Maximal marginal relevance: greedily pick the candidate with the best
+#     lambda * relevance - (1 - lambda) * max similarity to anything already picked
+# One candidate x candidate similarity matrix up front, then each pick is an O(n) update
+# of every candidate's closest-picked similarity. Returns positions into the shortlist.
+def mmr_select(relevance: np.ndarray, vectors: np.ndarray, k: int, mmr_lambda: float) -> np.ndarray:
+    relevance = np.asarray(relevance, dtype=np.float32)
+    num_candidates = len(relevance)
+    k = min(k, num_candidates)
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+
+    normalized = _normalize_rows(np.asarray(vectors, dtype=np.float32))
+    similarity = normalized @ normalized.T
+
+    selected = np.empty(k, dtype=np.int64)
+    closest_selected = np.full(num_candidates, -np.inf, dtype=np.float32)
+    available = np.ones(num_candidates, dtype=bool)
+
+    # Nothing picked yet, so the first pick is simply the most relevant
+    pick = int(np.argmax(relevance))
+    for position in range(k):
+        if position > 0:
+            mmr = mmr_lambda * relevance - (1 - mmr_lambda) * closest_selected
+            mmr[~available] = -np.inf
+            pick = int(np.argmax(mmr))
+
+        selected[position] = pick
+        available[pick] = False
+        np.maximum(closest_selected, similarity[pick], out=closest_selected)
+
+    return selected
@@ -0,0 +1,191 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# SQLite allows 999 bound variables per statement on older builds
+_LOOKUP_CHUNK = 500
+
+
+@dataclass
+class EmbeddingCacheSettings:
+    path: Optional[str] = "embeddings/embedding_cache.sqlite3"   # None disables the cache
+    max_entries: int = 200000
+    touch_interval_seconds: float = 3600   # last_used is refreshed at most this often per entry
+
+    @classmethod
+    def from_env(cls) -> 'EmbeddingCacheSettings':
+        path = os.getenv("FIGBOX_EMBEDDING_CACHE", "embeddings/embedding_cache.sqlite3")
+        return cls(
+            path=None if path.lower() in ("", "0", "off", "none") else path,
+            max_entries=max(1, int(os.getenv("FIGBOX_EMBEDDING_CACHE_MAX_ENTRIES", 200000)))
+        )
+
+
+# Whitespace differences never change what gets stored
+def normalize_text(text: str) -> str:
+    return ' '.join((text or '').split())
+
+
+def text_hash(text: str) -> bytes:
+    return hashlib.blake2b(normalize_text(text).encode('utf-8'), digest_size=16).digest()
+
+
+class EmbeddingCache:
+    """Persistent (model name, text hash) -> float32 vector store in one SQLite file.
+
+    Entries carry a last_used time; once the table passes max_entries the least recently
+    used tenth is deleted. Safe to share between threads and between worker processes.
+    """
+
+    def __init__(self, path: str, max_entries: int = 200000, touch_interval_seconds: float = 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.touch_interval_seconds = touch_interval_seconds
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " text_hash BLOB NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (model, text_hash)"
+            ") WITHOUT ROWID"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+
+        self._entries = self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "evicted": 0
+        }
+
+    @classmethod
+    def from_settings(cls, settings: EmbeddingCacheSettings) -> Optional['EmbeddingCache']:
+        if not settings.path:
+            return None
+        return cls(settings.path, settings.max_entries, settings.touch_interval_seconds)
+
+    # Cached vectors in input order; None where the text hasn't been encoded with this model
+    def get_many(self, model_name: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        hashes = [text_hash(text) for text in texts]
+        found: Dict[bytes, np.ndarray] = {}
+        now = time.time()
+
+        with self._lock:
+            for start in range(0, len(hashes), _LOOKUP_CHUNK):
+                chunk = list(set(hashes[start:start + _LOOKUP_CHUNK]))
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._connection.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model_name, *chunk]
+                ).fetchall()
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32)
+
+                # Recency only needs to be roughly right, so hot entries aren't rewritten on every read
+                hit_keys = [key for key, _ in rows]
+                if hit_keys:
+                    self._connection.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE model = ? AND last_used < ? "
+                        f"AND text_hash IN ({','.join('?' * len(hit_keys))})",
+                        [now, model_name, now - self.touch_interval_seconds, *hit_keys]
+                    )
+
+            results = [found.get(key) for key in hashes]
+            hits = sum(result is not None for result in results)
+            self.stats["hits"] += hits
+            self.stats["misses"] += len(results) - hits
+        return results
+
+    def put_many(self, model_name: str, texts: Sequence[str], vectors: np.ndarray) -> None:
+        now = time.time()
+        rows = [
+            (model_name, text_hash(text), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        if not rows:
+            return
+
+        with self._lock:
+            self._connection.execute("BEGIN")
+            try:
+                self._connection.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+
+            self._entries += len(rows)
+            self.stats["writes"] += len(rows)
+            if self._entries > self.max_entries:
+                self._compact()
+
+    # Drop least recently used entries down to 90% of the limit and hand the pages back
+    def _compact(self) -> None:
+        self._entries = self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = self._entries - int(self.max_entries * 0.9)
+        if self._entries <= self.max_entries or excess <= 0:
+            return
+
+        self._connection.execute(
+            "DELETE FROM embeddings WHERE (model, text_hash) IN "
+            "(SELECT model, text_hash FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,)
+        )
+        self._connection.execute("PRAGMA incremental_vacuum")
+        self._entries -= excess
+        self.stats["evicted"] += excess
+        logger.info(f"Embedding cache compacted: evicted {excess}, {self._entries} entries left")
+
+    # Encode only the texts that aren't cached yet; returns vectors in input order
+    def encode(self, model_name: str, texts: Sequence[str],
+               encode_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        cached = self.get_many(model_name, texts)
+        missing = [position for position, vector in enumerate(cached) if vector is None]
+
+        if missing:
+            # Duplicate texts in one call are encoded once
+            unique_texts = list(dict.fromkeys(normalize_text(texts[position]) for position in missing))
+            encoded = np.asarray(encode_fn(unique_texts), dtype=np.float32)
+            self.put_many(model_name, unique_texts, encoded)
+
+            by_text = dict(zip(unique_texts, encoded))
+            for position in missing:
+                cached[position] = by_text[normalize_text(texts[position])]
+
+        if not cached:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack(cached).astype(np.float32, copy=False)
+
+    def get_status(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "path": self.path,
+            "entries": self._entries,
+            "max_entries": self.max_entries,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else None,
+            **self.stats
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
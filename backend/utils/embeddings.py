@@ -2,8 +2,12 @@ import numpy as np
 import faiss
 from sentence_transformers import SentenceTransformer
 from typing import List, Tuple, Optional
+import os
 import logging
 
+from backend.utils.sharding import MANIFEST_FILE, ShardedIndex, shards_mismatch
+from backend.utils.embedding_cache import EmbeddingCache, EmbeddingCacheSettings
+
 logger = logging.getLogger(__name__)
 
 class EmbeddingManager:
@@ -11,6 +15,10 @@ class EmbeddingManager:
         self.model_name = model_name
         self.model: Optional[SentenceTransformer] = None
         self.index: Optional[faiss.Index] = None
+        self.user_embeddings: Optional[np.ndarray] = None
+        self.sharded_index: Optional[ShardedIndex] = None
+        self.index_read_only = False
+        self.cache: Optional[EmbeddingCache] = None
         self.dimension = 384  # default value for all-MiniLM-L6-v2
         
     def load_model(self) -> None:
@@ -20,46 +28,191 @@ class EmbeddingManager:
             logger.error(f"Failed to load SBERT model: {str(e)}")
             raise
     
-    def load_faiss_index(self, index_path: str) -> None:
+    # A manager for another set of vectors over the same loaded model and cache
+    def share_model(self) -> 'EmbeddingManager':
+        manager = EmbeddingManager(self.model_name)
+        manager.model = self.model
+        manager.cache = self.cache
+        return manager
+
+    # Persistent text -> vector cache; encoding still works without it
+    def enable_cache(self, settings: Optional[EmbeddingCacheSettings] = None) -> None:
         try:
-            self.index = faiss.read_index(index_path)
+            self.cache = EmbeddingCache.from_settings(settings or EmbeddingCacheSettings.from_env())
+        except Exception as e:
+            logger.warning(f"Embedding cache unavailable: {str(e)}")
+            self.cache = None
+    
+    # mmap shares the index pages between processes instead of copying them
+    def load_faiss_index(self, index_path: str, mmap: bool = False) -> None:
+        try:
+            if mmap:
+                io_flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+                self.index = faiss.read_index(index_path, io_flags)
+            else:
+                self.index = faiss.read_index(index_path)
+            self.index_read_only = mmap
         except Exception as e:
             logger.error(f"Failed to load FAISS index: {str(e)}")
             raise
     
+    # Shards written by build_shards.py; each one is a separate FAISS index
+    def load_sharded_index(self, shards_dir: str, mmap: bool = False) -> None:
+        try:
+            self.sharded_index = ShardedIndex.load(
+                shards_dir,
+                mmap=mmap,
+                rpc=os.getenv("FIGBOX_SHARD_RPC", "0") == "1",
+                shard_timeout_ms=float(os.getenv("FIGBOX_SHARD_TIMEOUT_MS", 200)),
+                concurrency=int(os.getenv("FIGBOX_SHARD_CONCURRENCY", 4))
+            )
+            self.index_read_only = mmap
+        except Exception as e:
+            logger.error(f"Failed to load sharded index: {str(e)}")
+            raise
+    
+    # Prefer a sharded layout next to the index file when it was built from the current embeddings;
+    # setup.py rewrites the index and embeddings but leaves old shards in place
+    def load_search_index(self, index_path: str, mmap: bool = False) -> None:
+        directory = os.path.dirname(index_path) or "."
+        shards_dir = os.path.join(directory, "shards")
+        if os.path.exists(os.path.join(shards_dir, MANIFEST_FILE)):
+            embeddings_path = os.path.join(directory, "user_embeddings.npy")
+            if os.path.exists(embeddings_path):
+                mismatch = shards_mismatch(shards_dir, np.load(embeddings_path, mmap_mode='r'))
+            else:
+                mismatch = f"no {embeddings_path} to check them against"
+            
+            if mismatch is None:
+                self.load_sharded_index(shards_dir, mmap)
+                return
+            logger.warning(f"Shards in {shards_dir} ignored, rebuild them with build_shards.py: {mismatch}")
+        
+        self.load_faiss_index(index_path, mmap)
+    
+    # Normalized vectors mapped from a snapshot file; searched as a matrix, no FAISS copy made
+    def load_snapshot_vectors(self, vectors: np.ndarray, read_only: bool = False) -> None:
+        self.user_embeddings = vectors
+        self.dimension = vectors.shape[1]
+        self.index_read_only = read_only or not vectors.flags.writeable
+    
+    # Number of vectors behind search_similar, whichever layout is loaded
+    def total_vectors(self) -> int:
+        if self.sharded_index is not None:
+            return self.sharded_index.ntotal
+        if self.index is not None:
+            return self.index.ntotal
+        if self.user_embeddings is not None:
+            return len(self.user_embeddings)
+        return 0
+    
+    # Raw user embeddings matrix, used when the FAISS index is unavailable
+    def load_user_embeddings(self, embeddings_path: str) -> None:
+        try:
+            self.user_embeddings = self.normalize_embeddings(
+                np.load(embeddings_path).astype(np.float32)
+            )
+        except Exception as e:
+            logger.error(f"Failed to load user embeddings: {str(e)}")
+            raise
+    
+    # Stored vector for one user row, no model call needed
+    def get_stored_embedding(self, row: int) -> np.ndarray:
+        if self.index is not None:
+            return self.index.reconstruct(int(row)).reshape(1, -1)
+        
+        if self.sharded_index is not None:
+            return self.sharded_index.reconstruct(int(row)).reshape(1, -1)
+        
+        if self.user_embeddings is not None:
+            return self.user_embeddings[row:row + 1].copy()
+        
+        raise ValueError("No stored embeddings loaded. Call load_search_index() or load_user_embeddings() first.")
+    
+    # Stored vectors for a handful of rows, gathered without copying the whole index
+    def get_stored_embeddings(self, rows: np.ndarray) -> np.ndarray:
+        rows = np.asarray(rows, dtype=np.int64)
+        
+        if self.index is not None and hasattr(self.index, "get_xb"):
+            vectors = faiss.rev_swig_ptr(self.index.get_xb(), self.index.ntotal * self.index.d)
+            return vectors.reshape(self.index.ntotal, self.index.d)[rows]
+        
+        if self.index is not None:
+            return np.vstack([self.index.reconstruct(int(row)) for row in rows])
+        
+        if self.sharded_index is not None:
+            return np.vstack([self.sharded_index.reconstruct(int(row)) for row in rows])
+        
+        if self.user_embeddings is not None:
+            return self.user_embeddings[rows]
+        
+        raise ValueError("No stored embeddings loaded. Call load_search_index() or load_user_embeddings() first.")
+    
+    # Every stored vector in row order
+    def get_all_stored_embeddings(self) -> np.ndarray:
+        if self.index is not None:
+            return self.index.reconstruct_n(0, self.index.ntotal)
+        
+        if self.sharded_index is not None:
+            return np.vstack([self.sharded_index.reconstruct(row) for row in range(self.sharded_index.ntotal)])
+        
+        if self.user_embeddings is not None:
+            return self.user_embeddings.copy()
+        
+        raise ValueError("No stored embeddings loaded. Call load_search_index() or load_user_embeddings() first.")
+    
+    # Overwrite one user's stored vector in place; nothing else in the index is touched
+    def update_stored_embedding(self, row: int, embedding: np.ndarray) -> None:
+        normalized = self.normalize_embeddings(np.asarray(embedding, dtype=np.float32).reshape(1, -1))[0]
+        
+        if self.index_read_only:
+            raise ValueError("Index is memory-mapped read-only; rebuild it to pick up new vectors")
+        
+        if self.index is not None:
+            # An IndexFlat keeps every vector in one contiguous array, so the row is a view into it
+            vectors = faiss.rev_swig_ptr(self.index.get_xb(), self.index.ntotal * self.index.d)
+            vectors.reshape(self.index.ntotal, self.index.d)[int(row)] = normalized
+        elif self.sharded_index is not None:
+            self.sharded_index.update(int(row), normalized)
+        
+        if self.user_embeddings is not None:
+            self.user_embeddings[int(row)] = normalized
+    
     # Convert text to embedding
     def encode_text(self, text: str) -> np.ndarray:
         if not self.model:
             raise ValueError("Model not loaded. Call load_model() first.")
         
         try:
+            if self.cache is not None:
+                return self.cache.encode(self.model_name, [text], self.model.encode)
+            
             embedding = self.model.encode([text])
             return embedding
         except Exception as e:
             logger.error(f"Failed to encode text: {str(e)}")
             raise
     
-    # def preprocess_negative_query(self, query: str) -> str:
-    #     
-    #     negative_patterns = {
-    #         "no technical background": "business background marketing sales expertise",
-    #         "not technical": "business focused non-technical marketing",
-    #         "no coding": "business development marketing sales",
-    #         "non-technical": "business strategy marketing sales operations",
-    #         "no programming": "business development marketing strategy",
-    #         "not a developer": "business marketing sales operations",
-    #         "no tech": "business operations marketing",
-    #         "not technical person": "business professional marketing sales"
-    #     }
-        
-    #     query_lower = query.lower()
-    #     for negative, positive in negative_patterns.items():
-    #         if negative in query_lower:
-    #             processed = query_lower.replace(negative, positive)
-    #             logger.info(f"Preprocessed negative query: '{query}' → '{processed}'")
-    #             return processed
-        
-    #     return query
+    # Convert a batch of texts to embeddings with a single model call
+    def encode_texts(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        if not self.model:
+            raise ValueError("Model not loaded. Call load_model() first.")
+        
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        
+        try:
+            # Only texts never encoded with this model reach the transformer
+            if self.cache is not None:
+                return self.cache.encode(
+                    self.model_name, texts, lambda missing: self.model.encode(missing, batch_size=batch_size)
+                )
+            
+            embeddings = self.model.encode(texts, batch_size=batch_size)
+            return np.asarray(embeddings, dtype=np.float32)
+        except Exception as e:
+            logger.error(f"Failed to encode {len(texts)} texts: {str(e)}")
+            raise
     
     # Normalize query embedding for cosine similarity
     def normalize_embeddings(self, embeddings: np.ndarray) -> np.ndarray:
@@ -70,20 +223,42 @@ class EmbeddingManager:
     
     # Search for similar embeddings in FAISS index
     def search_similar(self, query_embedding: np.ndarray, k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
-        if not self.index:
-            raise ValueError("FAISS index not loaded. Call load_faiss_index() first.")
+        if not self.index and self.sharded_index is None:
+            # Snapshot vectors (or the raw matrix) give the same exact inner-product results
+            if self.user_embeddings is not None:
+                return self.search_embeddings_matrix(query_embedding, k)
+            raise ValueError("FAISS index not loaded. Call load_search_index() first.")
         
         try:
             normalized_query = self.normalize_embeddings(query_embedding)
-            distances, indices = self.index.search(normalized_query, k)
+            if self.sharded_index is not None:
+                # Shards that time out are dropped; their slots come back as -1
+                distances, indices, _ = self.sharded_index.search(normalized_query, k)
+            else:
+                distances, indices = self.index.search(normalized_query, k)
             
-            logger.info(f"FAISS search completed - found {len(indices[0])} results")
+            logger.info(f"FAISS search completed - {len(indices)} queries, {indices.shape[1]} results each")
             return distances, indices
             
         except Exception as e:
             logger.error(f"FAISS search failed: {str(e)}")
             raise
     
+    # Exact search over the raw embeddings matrix, same output shape as FAISS
+    def search_embeddings_matrix(self, query_embedding: np.ndarray, k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        if self.user_embeddings is None:
+            raise ValueError("User embeddings not loaded. Call load_user_embeddings() first.")
+        
+        normalized_query = self.normalize_embeddings(query_embedding)
+        scores = normalized_query @ self.user_embeddings.T
+        k = min(k, scores.shape[1])
+        
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        
+        return np.take_along_axis(top_scores, order, axis=1), np.take_along_axis(top, order, axis=1)
+    
     # Calculate cosine similarity between two embeddings
     def calculate_cosine_similarity(self, embedding1: np.ndarray, embedding2: np.ndarray) -> float:
         try:
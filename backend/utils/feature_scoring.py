@@ -0,0 +1,285 @@
+import os
+import re
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Set
+import numpy as np
+
+from backend.models.user_model import CurrentRole, ExperienceLevel, NetworkingIntent, UserProfile, parse_date
+from backend.models.search_request import FeatureWeights
+
+logger = logging.getLogger(__name__)
+
+EXPERIMENTS_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'ranking_experiments.json')
+
+SKILL_LEVEL_WEIGHTS = {"expert": 1.0, "intermediate": 0.66}
+DEFAULT_SKILL_WEIGHT = 0.33
+EXPERIENCE_ORDER = [level.value for level in ExperienceLevel]
+ACTIVITY_HALF_LIFE_DAYS = 14.0
+
+# Query words that ask for a networking intent or role; role and intent values themselves
+# ("product manager", "hiring") match too
+INTENT_KEYWORDS = {
+    "hiring": ["hiring"],
+    "hire": ["hiring"],
+    "cofounder": ["seeking_cofounder"],
+    "co-founder": ["seeking_cofounder"],
+    "mentor": ["mentoring"],
+    "mentoring": ["mentoring"],
+    "freelance": ["freelance_available"],
+    "freelancer": ["freelance_available"],
+    "contract": ["freelance_available"],
+    "looking": ["actively_looking", "open_to_opportunities"],
+    "stealth": ["in_stealth_mode"],
+}
+ROLE_KEYWORDS = {
+    "founder": ["technical_founder", "business_founder", "entrepreneur"],
+    "investor": ["investor", "venture_capitalist", "private_equity"],
+    "vc": ["venture_capitalist", "investor"],
+    "developer": ["engineer", "software_engineer", "senior_engineer"],
+    "designer": ["designer", "product_designer", "ux_designer", "ui_designer"],
+    "researcher": ["researcher", "technical_researcher", "research_scientist", "ai_researcher"],
+    "marketer": ["marketer", "marketing_manager", "growth_manager"],
+    "consultant": ["consultant", "strategy_consultant"],
+}
+EXPERIENCE_KEYWORDS = {"junior": "junior", "mid": "mid", "senior": "senior", "expert": "expert"}
+
+FOUNDER_ROLES = ["technical_founder", "business_founder", "entrepreneur", "ceo", "cto"]
+INVESTOR_ROLES = ["investor", "venture_capitalist", "private_equity"]
+BUILDER_ROLES = [
+    "engineer", "software_engineer", "senior_engineer", "principal_engineer", "devops_engineer",
+    "data_engineer", "data_scientist", "machine_learning_engineer", "ai_researcher", "research_scientist",
+    "technical_specialist", "technical_junior", "designer", "product_designer", "ux_designer", "ui_designer",
+    "product_manager", "marketer", "marketing_manager", "growth_manager", "freelancer"
+]
+
+# How well a searcher suits what a candidate is after: candidate networking_intent -> searcher
+# intent or role -> fit in [0, 1]. Anything not listed is 0.
+RECIPROCAL_INTENT_RULES = {
+    "hiring": {
+        "intents": {"actively_looking": 1.0, "freelance_available": 0.8, "open_to_opportunities": 0.7},
+        "roles": {role: 0.5 for role in BUILDER_ROLES}
+    },
+    "actively_looking": {
+        "intents": {"hiring": 1.0, "seeking_cofounder": 0.6},
+        "roles": {role: 0.5 for role in FOUNDER_ROLES}
+    },
+    "open_to_opportunities": {
+        "intents": {"hiring": 0.8, "seeking_cofounder": 0.5},
+        "roles": {role: 0.4 for role in FOUNDER_ROLES}
+    },
+    "seeking_cofounder": {
+        "intents": {"seeking_cofounder": 1.0, "actively_looking": 0.5, "open_to_opportunities": 0.4},
+        "roles": {**{role: 0.6 for role in FOUNDER_ROLES}, **{role: 0.5 for role in INVESTOR_ROLES}}
+    },
+    "freelance_available": {
+        "intents": {"hiring": 0.8},
+        "roles": {role: 0.5 for role in FOUNDER_ROLES}
+    },
+    "mentoring": {
+        "intents": {"actively_looking": 0.4, "seeking_cofounder": 0.4},
+        "roles": {"technical_junior": 0.8, "entrepreneur": 0.6}
+    },
+    "in_stealth_mode": {
+        "intents": {"hiring": 0.3},
+        "roles": {role: 0.7 for role in INVESTOR_ROLES}
+    },
+}
+
+# Investors want founders whatever the stated intent, and founders want funding
+RECIPROCAL_ROLE_RULES = {
+    **{role: {founder: 0.8 for founder in FOUNDER_ROLES} for role in INVESTOR_ROLES},
+    **{role: {investor: 0.6 for investor in INVESTOR_ROLES} for role in FOUNDER_ROLES},
+}
+
+
+# Named weight sets, so a ranking experiment is a JSON edit rather than a re-embed
+def load_experiments(path: str = EXPERIMENTS_PATH) -> Dict[str, FeatureWeights]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        data = json.load(f)
+    return {name: FeatureWeights.from_dict(weights) for name, weights in data.items()}
+
+
+def _phrase_pattern(phrase: str) -> re.Pattern:
+    return re.compile(r'(?<![\w-])' + re.escape(phrase.lower()) + r'(?![\w-])')
+
+
+@dataclass
+class QueryTargets:
+    skills: List[int]
+    intents: Set[int]
+    roles: Set[int]
+    experience: Optional[int]
+
+
+class FeatureColumns:
+    """Per-user attributes as numpy columns, in user-id order. Scoring a shortlist is a
+    gather plus a few vector operations, whatever weights the request brings."""
+
+    def __init__(self, users: Sequence[UserProfile]):
+        self.user_ids = np.array([user.id for user in users], dtype=np.int64)
+
+        skill_names = sorted({skill.lower() for user in users for skill in user.skill_levels})
+        self.skill_codes = {skill: code for code, skill in enumerate(skill_names)}
+        self.skill_patterns = [(code, _phrase_pattern(skill)) for skill, code in self.skill_codes.items()]
+
+        # Level-weighted skill matrix: one row per user, one column per known skill
+        self.skills = np.zeros((len(users), len(skill_names)), dtype=np.float32)
+        for position, user in enumerate(users):
+            for skill, level in user.skill_levels.items():
+                self.skills[position, self.skill_codes[skill.lower()]] = SKILL_LEVEL_WEIGHTS.get(level, DEFAULT_SKILL_WEIGHT)
+
+        self.intent_codes = {intent.value: code for code, intent in enumerate(NetworkingIntent)}
+        self.role_codes = {role.value: code for code, role in enumerate(CurrentRole)}
+        self.intents = np.array([self.intent_codes[user.networking_intent.value] for user in users], dtype=np.int16)
+        self.roles = np.array([self.role_codes[user.current_role.value] for user in users], dtype=np.int16)
+        self.experience = np.array(
+            [EXPERIENCE_ORDER.index(user.experience_level.value) for user in users], dtype=np.int8
+        )
+        self.last_active_days = np.array([self._last_active_day(user) for user in users], dtype=np.int32)
+
+        self.intent_by_intent, self.intent_by_role, self.role_by_role = self._reciprocal_tables()
+
+        self.intent_patterns = self._keyword_patterns(INTENT_KEYWORDS, self.intent_codes)
+        self.role_patterns = self._keyword_patterns(ROLE_KEYWORDS, self.role_codes)
+
+        self._id_order = np.argsort(self.user_ids, kind='stable')
+        self._sorted_ids = self.user_ids[self._id_order]
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    @staticmethod
+    def _last_active_day(user: UserProfile) -> int:
+        parsed = parse_date(user.last_active)
+        return parsed.toordinal() if parsed is not None else -1
+
+    @staticmethod
+    def _keyword_patterns(keywords: Dict[str, List[str]], codes: Dict[str, int]) -> List[tuple]:
+        patterns = [(_phrase_pattern(value.replace('_', ' ')), [code]) for value, code in codes.items()]
+        patterns += [(_phrase_pattern(word), [codes[value] for value in values]) for word, values in keywords.items()]
+        return patterns
+
+    # Compatibility tables, indexed [candidate code, searcher code]
+    def _reciprocal_tables(self) -> tuple:
+        intent_by_intent = np.zeros((len(self.intent_codes), len(self.intent_codes)), dtype=np.float32)
+        intent_by_role = np.zeros((len(self.intent_codes), len(self.role_codes)), dtype=np.float32)
+        role_by_role = np.zeros((len(self.role_codes), len(self.role_codes)), dtype=np.float32)
+
+        for candidate_intent, rules in RECIPROCAL_INTENT_RULES.items():
+            for searcher_intent, fit in rules.get("intents", {}).items():
+                intent_by_intent[self.intent_codes[candidate_intent], self.intent_codes[searcher_intent]] = fit
+            for searcher_role, fit in rules.get("roles", {}).items():
+                intent_by_role[self.intent_codes[candidate_intent], self.role_codes[searcher_role]] = fit
+
+        for candidate_role, rules in RECIPROCAL_ROLE_RULES.items():
+            for searcher_role, fit in rules.items():
+                role_by_role[self.role_codes[candidate_role], self.role_codes[searcher_role]] = fit
+
+        return intent_by_intent, intent_by_role, role_by_role
+
+    # Positions for user ids; -1 where an id is unknown
+    def positions_of(self, user_ids: Sequence[int]) -> np.ndarray:
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        if len(self._sorted_ids) == 0:
+            return np.full(len(user_ids), -1, dtype=np.int64)
+
+        found = np.minimum(np.searchsorted(self._sorted_ids, user_ids), len(self._sorted_ids) - 1)
+        return np.where(self._sorted_ids[found] == user_ids, self._id_order[found], -1)
+
+    # Only activity changes after load (new conversations move last_active)
+    def update_user(self, user: UserProfile) -> None:
+        position = self.positions_of([user.id])[0]
+        if position >= 0:
+            self.last_active_days[position] = self._last_active_day(user)
+
+    # Skills, intents, roles and level the query text mentions
+    def query_targets(self, query: str) -> QueryTargets:
+        text = query.lower()
+        experience = next((EXPERIENCE_ORDER.index(level) for word, level in EXPERIENCE_KEYWORDS.items()
+                           if _phrase_pattern(word).search(text)), None)
+        return QueryTargets(
+            skills=[code for code, pattern in self.skill_patterns if pattern.search(text)],
+            intents={code for pattern, codes in self.intent_patterns if pattern.search(text) for code in codes},
+            roles={code for pattern, codes in self.role_patterns if pattern.search(text) for code in codes},
+            experience=experience
+        )
+
+    # One row per user id, one column per non-semantic feature, all in [0, 1]
+    def features(self, query: str, user_ids: Sequence[int], today: Optional[int] = None) -> Dict[str, np.ndarray]:
+        positions = self.positions_of(user_ids)
+        known = positions >= 0
+        safe_positions = np.maximum(positions, 0)
+        targets = self.query_targets(query)
+
+        if targets.skills:
+            skill = self.skills[np.ix_(safe_positions, targets.skills)].mean(axis=1)
+        else:
+            skill = np.zeros(len(positions), dtype=np.float32)
+
+        intent = np.isin(self.intents[safe_positions], list(targets.intents)).astype(np.float32)
+        role = np.isin(self.roles[safe_positions], list(targets.roles)).astype(np.float32)
+
+        levels = self.experience[safe_positions].astype(np.float32)
+        top_level = len(EXPERIENCE_ORDER) - 1
+        if targets.experience is not None:
+            experience = 1.0 - np.abs(levels - targets.experience) / top_level
+        else:
+            experience = levels / top_level
+
+        today = today if today is not None else datetime.now().toordinal()
+        last_active = self.last_active_days[safe_positions]
+        elapsed = np.maximum(today - last_active, 0).astype(np.float64)
+        activity = np.where(last_active >= 0, np.power(0.5, elapsed / ACTIVITY_HALF_LIFE_DAYS), 0.0)
+
+        columns = {
+            "skill": skill,
+            "intent": intent,
+            "role": role,
+            "experience": experience,
+            "activity": activity
+        }
+        return {name: np.where(known, values, 0.0).astype(np.float32) for name, values in columns.items()}
+
+    # semantic * w_semantic + sum(feature * weight), vectorized over the shortlist
+    def score(self, query: str, user_ids: Sequence[int], semantic_scores: np.ndarray,
+              weights: FeatureWeights, today: Optional[int] = None) -> np.ndarray:
+        scores = weights.semantic * np.asarray(semantic_scores, dtype=np.float32)
+        active = {name: getattr(weights, name) for name in FeatureWeights.names() if name != "semantic"}
+        if not any(active.values()):
+            return scores
+
+        for name, values in self.features(query, user_ids, today).items():
+            if active[name]:
+                scores = scores + active[name] * values
+        return scores
+
+    # How well the searcher suits each candidate's intent and role: three column gathers
+    # from the compatibility tables, best rule wins. None when the searcher is unknown.
+    def reciprocal_fit(self, searcher_id: int, user_ids: Sequence[int]) -> Optional[np.ndarray]:
+        searcher = self.positions_of([searcher_id])[0]
+        if searcher < 0:
+            return None
+
+        positions = self.positions_of(user_ids)
+        safe_positions = np.maximum(positions, 0)
+        searcher_intent, searcher_role = self.intents[searcher], self.roles[searcher]
+
+        candidate_intents = self.intents[safe_positions]
+        fit = np.maximum.reduce([
+            self.intent_by_intent[candidate_intents, searcher_intent],
+            self.intent_by_role[candidate_intents, searcher_role],
+            self.role_by_role[self.roles[safe_positions], searcher_role]
+        ])
+        return np.where(positions >= 0, fit, 0.0).astype(np.float32)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "users": len(self.user_ids),
+            "skills": len(self.skill_codes),
+            "features": [name for name in FeatureWeights.names() if name != "semantic"]
+        }
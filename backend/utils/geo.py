@@ -0,0 +1,218 @@
+import os
+import re
+import json
+import math
+import logging
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'gazetteer.json')
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+_COORDINATES_PATTERN = re.compile(r'^\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*$')
+
+
+# "  Miami ,FL " -> "miami, fl"
+def normalize_location(location: str) -> str:
+    parts = [' '.join(part.split()) for part in (location or '').lower().split(',')]
+    return ', '.join(part for part in parts if part)
+
+
+def is_remote_location(location: str) -> bool:
+    return normalize_location(location).startswith('remote')
+
+
+# Great-circle distance from one point to many, in km
+def haversine_km(latitude: float, longitude: float, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    lat1, lon1 = np.radians(latitude), np.radians(longitude)
+    lat2, lon2 = np.radians(latitudes), np.radians(longitudes)
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class Gazetteer:
+    """Offline lookup from normalized place names to coordinates; no network geocoding."""
+
+    def __init__(self, places: Dict[str, Sequence[float]], aliases: Optional[Dict[str, str]] = None):
+        self.places = {normalize_location(name): (float(lat), float(lon)) for name, (lat, lon) in places.items()}
+        self.aliases = {normalize_location(alias): normalize_location(name) for alias, name in (aliases or {}).items()}
+
+        # Bare city names ("miami") resolve when only one place has that city
+        city_places: Dict[str, List[str]] = {}
+        for name in self.places:
+            city_places.setdefault(name.split(',')[0], []).append(name)
+        self.cities = {city: names[0] for city, names in city_places.items() if len(names) == 1}
+
+        # Query-time lookups repeat a lot; profile locations are resolved once at load anyway
+        self.canonical = lru_cache(maxsize=4096)(self._canonical)
+
+    @classmethod
+    def load(cls, path: str = GAZETTEER_PATH) -> 'Gazetteer':
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return cls(data.get('places', {}), data.get('aliases', {}))
+
+    # Canonical gazetteer name for a location, or its normalized form when unknown
+    def _canonical(self, location: str) -> str:
+        key = normalize_location(location)
+        if key in self.places:
+            return key
+        if key in self.aliases:
+            return self.aliases[key]
+
+        city = key.split(',')[0]
+        return self.cities.get(city, key)
+
+    # Coordinates for a place name or a literal "lat,lon"; None for remote or unknown places
+    def resolve(self, location: str) -> Optional[Tuple[float, float]]:
+        match = _COORDINATES_PATTERN.match(location or '')
+        if match:
+            latitude, longitude = float(match.group(1)), float(match.group(2))
+            if -90 <= latitude <= 90 and -180 <= longitude <= 180:
+                return latitude, longitude
+            return None
+
+        return self.places.get(self.canonical(location))
+
+
+class GeoIndex:
+    """User coordinates in fixed-size lat/lon grid cells. A radius query only looks at the
+    cells overlapping the circle's bounding box, then checks exact distances with numpy."""
+
+    def __init__(self, user_ids: Sequence[int], locations: Sequence[str], gazetteer: Gazetteer,
+                 cell_degrees: float = 1.0):
+        self.gazetteer = gazetteer
+        self.cell_degrees = cell_degrees
+        self.columns = int(round(360 / cell_degrees))
+
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.latitudes = np.full(len(self.user_ids), np.nan)
+        self.longitudes = np.full(len(self.user_ids), np.nan)
+        self.remote = np.zeros(len(self.user_ids), dtype=bool)
+
+        # Each distinct location string is normalized once, not once per user
+        resolved: Dict[str, Tuple[str, Optional[Tuple[float, float]]]] = {}
+        location_positions: Dict[str, List[int]] = {}
+        self.unresolved: Set[str] = set()
+
+        for position, location in enumerate(locations):
+            if location not in resolved:
+                resolved[location] = (gazetteer.canonical(location), gazetteer.resolve(location))
+            canonical, coordinates = resolved[location]
+            location_positions.setdefault(canonical, []).append(position)
+
+            if coordinates is not None:
+                self.latitudes[position], self.longitudes[position] = coordinates
+            elif is_remote_location(location):
+                self.remote[position] = True
+            else:
+                self.unresolved.add(location)
+
+        self.location_positions = {
+            canonical: np.array(positions, dtype=np.int64) for canonical, positions in location_positions.items()
+        }
+
+        located = np.flatnonzero(~np.isnan(self.latitudes))
+        cell_positions: Dict[Tuple[int, int], List[int]] = {}
+        for position in located:
+            cell_positions.setdefault(self._cell(self.latitudes[position], self.longitudes[position]), []).append(position)
+        self.cells = {cell: np.array(positions, dtype=np.int64) for cell, positions in cell_positions.items()}
+
+        # Sorted ids let positions be found for any id list with one searchsorted
+        self._id_order = np.argsort(self.user_ids, kind='stable')
+        self._sorted_ids = self.user_ids[self._id_order]
+
+        if self.unresolved:
+            logger.warning(f"No coordinates for {len(self.unresolved)} locations: {sorted(self.unresolved)[:10]}")
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    def _cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return (
+            int(math.floor((latitude + 90) / self.cell_degrees)),
+            int(math.floor((longitude + 180) / self.cell_degrees)) % self.columns
+        )
+
+    # Index positions for user ids; -1 where an id is not in the index
+    def positions_of(self, user_ids: Sequence[int]) -> np.ndarray:
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        if len(self._sorted_ids) == 0:
+            return np.full(len(user_ids), -1, dtype=np.int64)
+
+        found = np.minimum(np.searchsorted(self._sorted_ids, user_ids), len(self._sorted_ids) - 1)
+        return np.where(self._sorted_ids[found] == user_ids, self._id_order[found], -1)
+
+    def _candidate_cells(self, latitude: float, longitude: float, radius_km: float) -> List[Tuple[int, int]]:
+        lat_span = radius_km / KM_PER_DEGREE
+        low_row = int(math.floor((max(latitude - lat_span, -90) + 90) / self.cell_degrees))
+        high_row = int(math.floor((min(latitude + lat_span, 90) + 90) / self.cell_degrees))
+
+        # Longitude degrees shrink towards the poles, so widen the box at the extreme latitude
+        extreme_latitude = min(90.0, abs(latitude) + lat_span)
+        cos_latitude = math.cos(math.radians(extreme_latitude))
+        if cos_latitude < 1e-6 or lat_span / cos_latitude >= 180:
+            columns = None
+        else:
+            lon_span = lat_span / cos_latitude
+            low_column = int(math.floor((longitude - lon_span + 180) / self.cell_degrees))
+            high_column = int(math.floor((longitude + lon_span + 180) / self.cell_degrees))
+            columns = {column % self.columns for column in range(low_column, high_column + 1)}
+
+        # Walk whichever is smaller: the box's cells or the occupied cells
+        rows = range(low_row, high_row + 1)
+        box_size = len(rows) * (len(columns) if columns is not None else self.columns)
+        if columns is not None and box_size <= len(self.cells):
+            return [(row, column) for row in rows for column in columns if (row, column) in self.cells]
+
+        return [
+            cell for cell in self.cells
+            if low_row <= cell[0] <= high_row and (columns is None or cell[1] in columns)
+        ]
+
+    # Positions of every user within radius_km of a point
+    def within_radius(self, latitude: float, longitude: float, radius_km: float) -> np.ndarray:
+        cells = self._candidate_cells(latitude, longitude, radius_km)
+        if not cells:
+            return np.zeros(0, dtype=np.int64)
+
+        candidates = np.concatenate([self.cells[cell] for cell in cells])
+        distances = haversine_km(latitude, longitude, self.latitudes[candidates], self.longitudes[candidates])
+        return candidates[distances <= radius_km]
+
+    # Positions whose location matches any of the given names, after normalization
+    def matching_locations(self, locations: Sequence[str]) -> np.ndarray:
+        matches = [
+            self.location_positions[canonical]
+            for canonical in {self.gazetteer.canonical(location) for location in locations}
+            if canonical in self.location_positions
+        ]
+        return np.concatenate(matches) if matches else np.zeros(0, dtype=np.int64)
+
+    # Distance in km for each user id; inf for remote, unknown or missing users
+    def distances_km(self, latitude: float, longitude: float, user_ids: Sequence[int]) -> np.ndarray:
+        positions = self.positions_of(user_ids)
+        safe_positions = np.maximum(positions, 0)
+
+        distances = haversine_km(latitude, longitude, self.latitudes[safe_positions], self.longitudes[safe_positions])
+        distances[(positions < 0) | np.isnan(distances)] = np.inf
+        return distances
+
+    # 1.0 at the point, decaying with distance; 0 for users without coordinates
+    def proximity(self, latitude: float, longitude: float, user_ids: Sequence[int], scale_km: float) -> np.ndarray:
+        return np.exp(-self.distances_km(latitude, longitude, user_ids) / scale_km)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "users": len(self.user_ids),
+            "located": int((~np.isnan(self.latitudes)).sum()),
+            "remote": int(self.remote.sum()),
+            "unresolved_locations": sorted(self.unresolved),
+            "cells": len(self.cells),
+            "cell_degrees": self.cell_degrees
+        }
@@ -0,0 +1,172 @@
+import os
+import logging
+from typing import Callable, Iterable, Optional, Set, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+NEIGHBORS_FILE = "knn_neighbors.npy"
+SCORES_FILE = "knn_scores.npy"
+FINGERPRINT_FILE = "knn_fingerprint.npy"
+
+# Evenly spaced rows whose vectors are saved with the graph, to tell which embeddings it was built from
+FINGERPRINT_ROWS = 32
+
+
+def fingerprint_rows(total: int) -> np.ndarray:
+    return np.unique(np.linspace(0, total - 1, min(total, FINGERPRINT_ROWS)).astype(np.int64))
+
+
+# Exact top-k neighbors for the given rows using blocked matrix multiplies.
+# The matmul runs on the BLAS thread pool, so every block uses all cores.
+def compute_knn_rows(normalized_embeddings: np.ndarray, rows: np.ndarray, k: int,
+                     block_size: int = 1024) -> Tuple[np.ndarray, np.ndarray]:
+    total = normalized_embeddings.shape[0]
+    k = min(k, total - 1)
+
+    neighbor_ids = np.empty((len(rows), k), dtype=np.int32)
+    neighbor_scores = np.empty((len(rows), k), dtype=np.float16)
+
+    for start in range(0, len(rows), block_size):
+        block_rows = rows[start:start + block_size]
+        scores = normalized_embeddings[block_rows] @ normalized_embeddings.T
+
+        # A user is never their own neighbor
+        scores[np.arange(len(block_rows)), block_rows] = -np.inf
+
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+
+        neighbor_ids[start:start + len(block_rows)] = np.take_along_axis(top, order, axis=1)
+        neighbor_scores[start:start + len(block_rows)] = np.take_along_axis(top_scores, order, axis=1)
+
+    return neighbor_ids, neighbor_scores
+
+
+def build_knn_graph(normalized_embeddings: np.ndarray, k: int = 50,
+                    block_size: int = 1024) -> Tuple[np.ndarray, np.ndarray]:
+    rows = np.arange(normalized_embeddings.shape[0])
+    return compute_knn_rows(normalized_embeddings, rows, k, block_size)
+
+
+# Refresh the graph after some users' embeddings changed, without rebuilding it.
+# Changed rows are recomputed; other rows only merge in the changed users, and a
+# row is recomputed in full only if it already listed a changed user.
+def update_knn_rows(neighbor_ids: np.ndarray, neighbor_scores: np.ndarray,
+                    normalized_embeddings: np.ndarray, changed_rows: Iterable[int],
+                    block_size: int = 1024) -> np.ndarray:
+    changed = np.unique(np.asarray(list(changed_rows), dtype=np.int64))
+    if len(changed) == 0:
+        return changed
+
+    k = neighbor_ids.shape[1]
+    ids, scores = compute_knn_rows(normalized_embeddings, changed, k, block_size)
+    neighbor_ids[changed] = ids
+    neighbor_scores[changed] = scores
+
+    is_changed = np.zeros(len(neighbor_ids), dtype=bool)
+    is_changed[changed] = True
+
+    cross_scores = normalized_embeddings @ normalized_embeddings[changed].T
+    cross_scores[changed, np.arange(len(changed))] = -np.inf
+
+    lists_changed_user = np.isin(neighbor_ids, changed).any(axis=1) & ~is_changed
+    kth_scores = neighbor_scores[:, -1].astype(np.float32)
+    beats_kth = (cross_scores > kth_scores[:, None]).any(axis=1) & ~is_changed & ~lists_changed_user
+
+    stale_rows = np.flatnonzero(lists_changed_user)
+    if len(stale_rows):
+        ids, scores = compute_knn_rows(normalized_embeddings, stale_rows, k, block_size)
+        neighbor_ids[stale_rows] = ids
+        neighbor_scores[stale_rows] = scores
+
+    merge_rows = np.flatnonzero(beats_kth)
+    for row in merge_rows:
+        merged_ids = np.concatenate([neighbor_ids[row], changed.astype(np.int32)])
+        merged_scores = np.concatenate([neighbor_scores[row].astype(np.float32), cross_scores[row]])
+        order = np.argsort(-merged_scores)[:k]
+        neighbor_ids[row] = merged_ids[order]
+        neighbor_scores[row] = merged_scores[order]
+
+    touched = np.concatenate([changed, stale_rows, merge_rows])
+    logger.info(f"k-NN graph updated: {len(changed)} changed, {len(stale_rows)} recomputed, {len(merge_rows)} merged")
+    return touched
+
+
+def save_knn_graph(directory: str, neighbor_ids: np.ndarray, neighbor_scores: np.ndarray,
+                   normalized_embeddings: np.ndarray) -> None:
+    np.save(os.path.join(directory, NEIGHBORS_FILE), neighbor_ids.astype(np.int32))
+    np.save(os.path.join(directory, SCORES_FILE), neighbor_scores.astype(np.float16))
+    fingerprint = normalized_embeddings[fingerprint_rows(len(normalized_embeddings))]
+    np.save(os.path.join(directory, FINGERPRINT_FILE), fingerprint.astype(np.float16))
+
+
+class KnnGraph:
+    def __init__(self, neighbor_ids: np.ndarray, neighbor_scores: np.ndarray,
+                 fingerprint: Optional[np.ndarray] = None):
+        self.neighbor_ids = neighbor_ids
+        self.neighbor_scores = neighbor_scores
+        self.fingerprint = fingerprint
+        # Rows whose vector changed after the graph was built (live conversation updates)
+        self.stale_rows: Set[int] = set()
+
+    @property
+    def k(self) -> int:
+        return self.neighbor_ids.shape[1]
+
+    def __len__(self) -> int:
+        return self.neighbor_ids.shape[0]
+
+    # Arrays are memory-mapped so loading costs nothing until rows are read
+    @classmethod
+    def load(cls, directory: str) -> Optional['KnnGraph']:
+        neighbors_path = os.path.join(directory, NEIGHBORS_FILE)
+        scores_path = os.path.join(directory, SCORES_FILE)
+
+        if not (os.path.exists(neighbors_path) and os.path.exists(scores_path)):
+            return None
+
+        try:
+            neighbor_ids = np.load(neighbors_path, mmap_mode='r')
+            neighbor_scores = np.load(scores_path, mmap_mode='r')
+        except Exception as e:
+            logger.error(f"Failed to load k-NN graph: {str(e)}")
+            raise
+
+        if neighbor_ids.shape != neighbor_scores.shape:
+            raise ValueError(f"k-NN graph arrays disagree: {neighbor_ids.shape} vs {neighbor_scores.shape}")
+
+        fingerprint_path = os.path.join(directory, FINGERPRINT_FILE)
+        fingerprint = np.load(fingerprint_path) if os.path.exists(fingerprint_path) else None
+        return cls(neighbor_ids, neighbor_scores, fingerprint)
+
+    # Why this graph can't be used with the loaded index, or None if it can. Rows are only
+    # meaningful against the embeddings the graph was built from: a re-embedded or re-ordered
+    # index keeps the row count but not the neighbors.
+    def mismatch(self, total_vectors: int, get_rows: Callable[[np.ndarray], np.ndarray]) -> Optional[str]:
+        if len(self) != total_vectors:
+            return f"graph has {len(self)} rows, index has {total_vectors}"
+
+        if self.fingerprint is None:
+            return "graph has no embeddings fingerprint"
+
+        rows = fingerprint_rows(total_vectors)
+        stored = np.asarray(get_rows(rows), dtype=np.float32)
+        # float16 storage is good to about 1e-3; a different embedding is off by far more
+        if stored.shape != self.fingerprint.shape or not np.allclose(stored, self.fingerprint, atol=1e-2):
+            return "graph was built from different embeddings"
+        return None
+
+    # The row's own neighbor list is recomputed live from now on. Other rows' lists keep the
+    # row's old score until build_knn_graph.py runs again.
+    def mark_stale(self, row: int) -> None:
+        self.stale_rows.add(int(row))
+
+    def is_stale(self, row: int) -> bool:
+        return row in self.stale_rows
+
+    # O(k) lookup of a row's precomputed neighbors
+    def neighbors(self, row: int, k: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        k = self.k if k is None else min(k, self.k)
+        return self.neighbor_ids[row, :k], self.neighbor_scores[row, :k].astype(np.float32)
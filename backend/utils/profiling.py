@@ -0,0 +1,102 @@
+import io
+import time
+import pstats
+import marshal
+import cProfile
+import threading
+from typing import Dict, Optional
+
+# cProfile hooks the thread it is enabled on; one profiled request at a time keeps traces
+# readable and bounds the overhead when sampling
+_cprofile_lock = threading.Lock()
+
+
+class RequestProfile:
+    """Per-stage wall time for one request; optionally a cProfile of its pipeline job.
+
+    Stages are laps: each `lap(name)` charges the time since the previous lap to `name`,
+    so the pipeline only marks where a stage ends.
+    """
+
+    def __init__(self, cprofile: bool = False):
+        self.want_cprofile = cprofile
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.stages: Dict[str, float] = {}
+        self._last_lap = self.started
+
+        self._profiler: Optional[cProfile.Profile] = None
+        self._stats: Optional[dict] = None
+        self.cprofile_skipped = False
+
+    def lap(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + (now - self._last_lap) * 1000
+        self._last_lap = now
+
+    # A coalesced request didn't run its own job; it reports the stages of the one that served it
+    def adopt_stages(self, stages: Dict[str, float]) -> None:
+        if stages is not self.stages:
+            self.stages = dict(stages)
+
+    # Freezes the total once the response is ready
+    def finish(self) -> None:
+        self.finished = time.perf_counter()
+
+    def total_ms(self) -> float:
+        return ((self.finished or time.perf_counter()) - self.started) * 1000
+
+    # Called on the worker thread that runs the job; the time until now was spent queued
+    def start_job(self) -> None:
+        self.lap("queue")
+        if not self.want_cprofile:
+            return
+
+        if not _cprofile_lock.acquire(blocking=False):
+            self.cprofile_skipped = True
+            return
+
+        self._profiler = cProfile.Profile()
+        self._profiler.enable()
+
+    def stop_job(self) -> None:
+        if self._profiler is None:
+            return
+
+        self._profiler.disable()
+        self._profiler.create_stats()
+        self._stats = self._profiler.stats
+        self._profiler = None
+        _cprofile_lock.release()
+
+    @property
+    def has_cprofile(self) -> bool:
+        return self._stats is not None
+
+    # Standard Server-Timing header, shown per request in browser dev tools
+    def server_timing(self) -> str:
+        timings = [f"{stage};dur={duration:.2f}" for stage, duration in self.stages.items()]
+        timings.append(f"total;dur={self.total_ms():.2f}")
+        return ", ".join(timings)
+
+    def top_functions(self, limit: int = 30, sort: str = "cumulative") -> str:
+        if self._stats is None:
+            return ""
+
+        output = io.StringIO()
+        stats = pstats.Stats(_StatsSource(self._stats), stream=output)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+    # Same format as `cProfile -o`: open with pstats, snakeviz or similar
+    def pstats_bytes(self) -> bytes:
+        return marshal.dumps(self._stats or {})
+
+
+# pstats.Stats loads from anything with a `stats` dict and a `create_stats` method
+class _StatsSource:
+    def __init__(self, stats: dict):
+        self.stats = stats
+
+    def create_stats(self) -> None:
+        pass
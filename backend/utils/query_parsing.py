@@ -0,0 +1,84 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Tuple
+
+# "not", "no", "without", ... followed by the clause they negate, up to the next
+# punctuation or conjunction: "founder, not technical" / "designer without coding experience"
+_NEGATION_PATTERN = re.compile(
+    r"\b(?:not(?!\s+(?:only|just)\b)|no|without|excluding|except|never|avoid|isn't|aren't|don't want|do not want)\b"
+    r"(?:\s+(?:a|an|any|the|very|really|too))*\s+"
+    r"(?P<clause>[^,;.!?]+?)"
+    r"(?=\s*(?:[,;.!?]|\bbut\b|\band\b|\bor\b|\bwho\b|\bwith\b|$))",
+    re.IGNORECASE
+)
+
+# "non-technical" / "non technical", but not words where "non-" is part of the meaning
+_NON_PREFIX_PATTERN = re.compile(
+    r"\bnon[-\s](?!(?:profits?|governmental|fiction|stop|negotiable)\b)(?P<clause>\w+)",
+    re.IGNORECASE
+)
+
+# Hedges that read like negations but rule nothing out: "not sure", "no preference on location"
+_HEDGE_PATTERN = re.compile(
+    r"\b(?:not\s+(?:sure|certain)|no\s+(?:particular\s+|strong\s+)?preference(?:\s+(?:on|for|about)\s+[^,;.!?]+)?"
+    r"|(?:it\s+)?doesn't\s+matter)\b",
+    re.IGNORECASE
+)
+
+# "not only engineers but (also) designers" asks for both
+_NOT_ONLY_PATTERN = re.compile(
+    r"\bnot\s+(?:only|just)\s+(?P<first>[^,;.!?]+?)\s+but(?:\s+also)?\s+", re.IGNORECASE
+)
+_NOT_ONLY_ALONE_PATTERN = re.compile(r"\bnot\s+(?:only|just)\s+", re.IGNORECASE)
+
+# Connectives left dangling once a negated clause is cut out
+_DANGLING_PATTERN = re.compile(r"(?:\b(?:but|and|or|with|who is|who are|that is|is|are)\s*)+$", re.IGNORECASE)
+
+# Connectives left leading a clause: "engineer, not in crypto but fintech" keeps "fintech"
+_LEADING_CONNECTIVE_PATTERN = re.compile(r"^(?:(?:but|and|or|also|so)\b\s*)+", re.IGNORECASE)
+
+# "not in crypto" rules out "crypto"
+_LEADING_PREPOSITION_PATTERN = re.compile(r"^(?:in|into|from|for|doing|working in|working on)\s+", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class ParsedQuery:
+    positive: str
+    negatives: Tuple[str, ...] = ()
+
+    @property
+    def has_negatives(self) -> bool:
+        return bool(self.negatives)
+
+
+def _clean(text: str) -> str:
+    text = ' '.join(text.replace(' ,', ',').split())
+    text = _DANGLING_PATTERN.sub('', text.strip(' ,;.')).strip(' ,;.')
+    text = _LEADING_CONNECTIVE_PATTERN.sub('', text)
+    return ' '.join(text.split())
+
+
+# Split a query into what it asks for and what it rules out
+@lru_cache(maxsize=4096)
+def parse_query(query: str) -> ParsedQuery:
+    negatives = []
+
+    def cut(match: re.Match) -> str:
+        clause = _clean(_LEADING_PREPOSITION_PATTERN.sub('', match.group("clause").strip()))
+        if clause and clause.lower() not in (negative.lower() for negative in negatives):
+            negatives.append(clause)
+        return ' '
+
+    positive = _HEDGE_PATTERN.sub(' ', query)
+    positive = _NOT_ONLY_PATTERN.sub(lambda match: match.group("first") + ', ', positive)
+    positive = _NOT_ONLY_ALONE_PATTERN.sub('', positive)
+    positive = _NON_PREFIX_PATTERN.sub(cut, positive)
+    positive = _NEGATION_PATTERN.sub(cut, positive)
+
+    # "founder, not technical, fintech" leaves "founder, , fintech"
+    parts = [_clean(part) for part in re.split(r"[,;]", positive)]
+    return ParsedQuery(
+        positive=', '.join(part for part in parts if part),
+        negatives=tuple(negatives)
+    )
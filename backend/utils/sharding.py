@@ -0,0 +1,345 @@
+import os
+import json
+import pickle
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import faiss
+
+from backend.utils.knn_graph import fingerprint_rows
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+# Normalized vectors of evenly spaced rows, to tell which embeddings the shards were built from
+FINGERPRINT_FILE = "fingerprint.npy"
+
+US_STATES = {
+    'AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'FL', 'GA', 'HI', 'ID', 'IL', 'IN', 'IA', 'KS', 'KY',
+    'LA', 'ME', 'MD', 'MA', 'MI', 'MN', 'MS', 'MO', 'MT', 'NE', 'NV', 'NH', 'NJ', 'NM', 'NY', 'NC', 'ND',
+    'OH', 'OK', 'OR', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA', 'WV', 'WI', 'WY', 'DC'
+}
+
+COUNTRY_REGIONS = {
+    'canada': 'americas',
+    'uk': 'europe', 'germany': 'europe', 'france': 'europe', 'netherlands': 'europe', 'sweden': 'europe',
+    'switzerland': 'europe', 'ireland': 'europe', 'israel': 'europe', 'eu': 'europe',
+    'japan': 'apac', 'south korea': 'apac', 'singapore': 'apac', 'australia': 'apac',
+}
+
+
+# Coarse region for a free-text location like "Miami, FL" or "Remote (EU)"
+def location_region(location: str) -> str:
+    text = (location or '').strip()
+    lowered = text.lower()
+
+    if lowered.startswith('remote'):
+        inner = lowered[lowered.find('(') + 1:lowered.find(')')] if '(' in lowered else ''
+        if inner == 'us':
+            return 'americas'
+        return COUNTRY_REGIONS.get(inner, 'remote')
+
+    if lowered in COUNTRY_REGIONS:
+        return COUNTRY_REGIONS[lowered]
+
+    suffix = text.rsplit(',', 1)[-1].strip()
+    if suffix.upper() in US_STATES:
+        return 'americas'
+
+    return COUNTRY_REGIONS.get(suffix.lower(), 'other')
+
+
+class IndexShard:
+    """One FAISS index holding a subset of rows; local results are mapped back to global rows."""
+
+    def __init__(self, name: str, index: faiss.Index, global_rows: np.ndarray):
+        self.name = name
+        self.index = index
+        self.global_rows = np.asarray(global_rows, dtype=np.int64)
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+
+    def search(self, normalized_queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        k = min(k, self.index.ntotal)
+        if k <= 0:
+            empty = np.zeros((len(normalized_queries), 0))
+            return empty.astype(np.float32), empty.astype(np.int64)
+
+        distances, local_rows = self.index.search(normalized_queries, k)
+        global_rows = np.where(local_rows >= 0, self.global_rows[np.maximum(local_rows, 0)], -1)
+        return distances, global_rows
+
+    # global_rows is kept sorted, so the local row is a binary search away
+    def reconstruct_global(self, global_row: int) -> Optional[np.ndarray]:
+        local = int(np.searchsorted(self.global_rows, global_row))
+        if local >= len(self.global_rows) or self.global_rows[local] != global_row:
+            return None
+        return self.index.reconstruct(local)
+
+    # Overwrite a stored vector in place; False when the row lives in another shard
+    def replace_global(self, global_row: int, vector: np.ndarray) -> bool:
+        local = int(np.searchsorted(self.global_rows, global_row))
+        if local >= len(self.global_rows) or self.global_rows[local] != global_row:
+            return False
+
+        vectors = faiss.rev_swig_ptr(self.index.get_xb(), self.index.ntotal * self.index.d)
+        vectors.reshape(self.index.ntotal, self.index.d)[local] = vector
+        return True
+
+
+class RpcShardClient:
+    """Stand-in for a shard served by another process: every call is pickled both ways,
+    so the fan-out pays realistic serialization costs. Swap the transport for a real RPC."""
+
+    def __init__(self, shard: IndexShard, transport: Optional[Callable[[bytes], bytes]] = None):
+        self.shard = shard
+        self.name = shard.name
+        self.transport = transport or self._loopback
+
+    @property
+    def ntotal(self) -> int:
+        return self.shard.ntotal
+
+    def _loopback(self, payload: bytes) -> bytes:
+        method, args = pickle.loads(payload)
+        return pickle.dumps(getattr(self.shard, method)(*args))
+
+    def search(self, normalized_queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        return pickle.loads(self.transport(pickle.dumps(("search", (normalized_queries, k)))))
+
+    def reconstruct_global(self, global_row: int) -> Optional[np.ndarray]:
+        return pickle.loads(self.transport(pickle.dumps(("reconstruct_global", (global_row,)))))
+
+    def replace_global(self, global_row: int, vector: np.ndarray) -> bool:
+        return pickle.loads(self.transport(pickle.dumps(("replace_global", (global_row, vector)))))
+
+
+# Each query's top k over every shard's sorted list: one concatenate and argpartition for the whole
+# batch instead of a Python merge per query. Short rows are padded with -inf / -1.
+def merge_top_k(shard_results: List[Tuple[np.ndarray, np.ndarray]], num_queries: int,
+                k: int) -> Tuple[np.ndarray, np.ndarray]:
+    distances = np.full((num_queries, k), -np.inf, dtype=np.float32)
+    indices = np.full((num_queries, k), -1, dtype=np.int64)
+    if not shard_results or k <= 0:
+        return distances, indices
+
+    all_distances = np.concatenate([shard_distances for shard_distances, _ in shard_results], axis=1)
+    all_rows = np.concatenate([shard_rows for _, shard_rows in shard_results], axis=1)
+    # Padding from a shard (row -1) must never outrank a real row
+    all_distances = np.where(all_rows >= 0, all_distances, -np.inf).astype(np.float32, copy=False)
+
+    width = min(k, all_distances.shape[1])
+    if width == 0:
+        return distances, indices
+    if width < all_distances.shape[1]:
+        top = np.argpartition(-all_distances, width - 1, axis=1)[:, :width]
+    else:
+        top = np.broadcast_to(np.arange(width), (num_queries, width))
+    top_distances = np.take_along_axis(all_distances, top, axis=1)
+    order = np.argsort(-top_distances, axis=1, kind="stable")
+
+    distances[:, :width] = np.take_along_axis(top_distances, order, axis=1)
+    indices[:, :width] = np.take_along_axis(np.take_along_axis(all_rows, top, axis=1), order, axis=1)
+    return distances, indices
+
+
+# Why shards built into directory can't serve the given embeddings (as saved by setup.py, possibly
+# memory-mapped), or None if they can. Row counts first, then the fingerprint rows.
+def shards_mismatch(directory: str, embeddings: np.ndarray) -> Optional[str]:
+    with open(os.path.join(directory, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+
+    if manifest.get("total_rows") != len(embeddings):
+        return f"shards have {manifest.get('total_rows')} rows, embeddings have {len(embeddings)}"
+
+    fingerprint_path = os.path.join(directory, manifest.get("fingerprint_file", FINGERPRINT_FILE))
+    if not os.path.exists(fingerprint_path):
+        return "shards have no embeddings fingerprint"
+
+    fingerprint = np.load(fingerprint_path).astype(np.float32)
+    stored = np.array(embeddings[fingerprint_rows(len(embeddings))], dtype=np.float32)
+    faiss.normalize_L2(stored)
+    # float16 storage is good to about 1e-3; a different embedding is off by far more
+    if stored.shape != fingerprint.shape or not np.allclose(stored, fingerprint, atol=1e-2):
+        return "shards were built from different embeddings"
+    return None
+
+
+class ShardedIndex:
+    """Scatter a search to every shard at once, gather each shard's top k and merge them.
+    Shards that miss the timeout are left out, so callers get partial results instead of errors.
+
+    A FAISS search can't be interrupted: a shard that times out keeps searching until it finishes.
+    Each shard has its own `concurrency` slots, so a slow shard only holds up its own searches,
+    and once all its slots are held it is skipped (counted as busy) instead of queued behind them.
+    """
+
+    def __init__(self, shards: Sequence[Any], shard_timeout_ms: float = 200, concurrency: int = 4):
+        self.shards = list(shards)
+        self.shard_timeout_ms = shard_timeout_ms
+        self.concurrency = max(1, concurrency)
+        self.executors = {
+            shard.name: ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=f"shard-{shard.name}")
+            for shard in self.shards
+        }
+        self._in_flight = {shard.name: 0 for shard in self.shards}
+        # Searches arrive from several scheduler threads; done callbacks may run inline, hence RLock
+        self._lock = threading.RLock()
+        self.stats = {shard.name: {"searches": 0, "timeouts": 0, "errors": 0, "busy": 0} for shard in self.shards}
+
+    @property
+    def ntotal(self) -> int:
+        return sum(shard.ntotal for shard in self.shards)
+
+    def _release(self, name: str) -> None:
+        with self._lock:
+            self._in_flight[name] -= 1
+
+    def search(self, normalized_queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+        missing = []
+        futures = {}
+        with self._lock:
+            for shard in self.shards:
+                self.stats[shard.name]["searches"] += 1
+                if self._in_flight[shard.name] >= self.concurrency:
+                    self.stats[shard.name]["busy"] += 1
+                    missing.append(shard.name)
+                    continue
+
+                self._in_flight[shard.name] += 1
+                future = self.executors[shard.name].submit(shard.search, normalized_queries, k)
+                future.add_done_callback(lambda _, name=shard.name: self._release(name))
+                futures[future] = shard
+
+        done, not_done = wait(futures, timeout=self.shard_timeout_ms / 1000)
+
+        shard_results = []
+        for future, shard in futures.items():
+            if future in not_done:
+                # Only stops a search that hasn't started; a running one finishes and frees its slot
+                future.cancel()
+                with self._lock:
+                    self.stats[shard.name]["timeouts"] += 1
+                missing.append(shard.name)
+                continue
+            try:
+                shard_results.append(future.result())
+            except Exception as e:
+                logger.error(f"Shard {shard.name} search failed: {str(e)}")
+                with self._lock:
+                    self.stats[shard.name]["errors"] += 1
+                missing.append(shard.name)
+
+        if missing:
+            logger.warning(f"Partial search results, missing shards: {', '.join(missing)}")
+
+        distances, indices = merge_top_k(shard_results, len(normalized_queries), k)
+        return distances, indices, missing
+
+    def reconstruct(self, global_row: int) -> np.ndarray:
+        for shard in self.shards:
+            vector = shard.reconstruct_global(global_row)
+            if vector is not None:
+                return vector
+        raise KeyError(f"Row {global_row} is not in any shard")
+
+    def update(self, global_row: int, vector: np.ndarray) -> None:
+        for shard in self.shards:
+            if shard.replace_global(global_row, vector):
+                return
+        raise KeyError(f"Row {global_row} is not in any shard")
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "shards": {
+                    shard.name: {"ntotal": shard.ntotal, "in_flight": self._in_flight[shard.name], **self.stats[shard.name]}
+                    for shard in self.shards
+                },
+                "shard_timeout_ms": self.shard_timeout_ms,
+                "concurrency": self.concurrency
+            }
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = False, rpc: bool = False,
+             shard_timeout_ms: float = 200, concurrency: int = 4) -> 'ShardedIndex':
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+
+        io_flags = 0
+        if mmap:
+            io_flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+        shards = []
+        for entry in manifest["shards"]:
+            index = faiss.read_index(os.path.join(directory, entry["index_file"]), io_flags)
+            global_rows = np.load(os.path.join(directory, entry["rows_file"]))
+            shard = IndexShard(entry["name"], index, global_rows)
+            shards.append(RpcShardClient(shard) if rpc else shard)
+
+        logger.info(f"Loaded {len(shards)} shards ({manifest['strategy']}) from {directory}")
+        return cls(shards, shard_timeout_ms, concurrency)
+
+
+# Split rows into named groups, either by contiguous user-id range or by region
+def assign_shards(user_ids: Sequence[int], locations: Sequence[str], strategy: str = "id_range",
+                  num_shards: int = 4) -> Dict[str, np.ndarray]:
+    if strategy == "region":
+        groups: Dict[str, List[int]] = {}
+        for row, location in enumerate(locations):
+            groups.setdefault(location_region(location), []).append(row)
+        return {name: np.array(rows, dtype=np.int64) for name, rows in sorted(groups.items())}
+
+    if strategy != "id_range":
+        raise ValueError(f"Unknown sharding strategy: {strategy}")
+
+    order = np.argsort(np.asarray(user_ids))
+    return {
+        f"range_{i}": np.sort(rows)
+        for i, rows in enumerate(np.array_split(order, num_shards))
+        if len(rows)
+    }
+
+
+def build_sharded_index(normalized_embeddings: np.ndarray, user_ids: Sequence[int], locations: Sequence[str],
+                        directory: str, strategy: str = "id_range", num_shards: int = 4) -> Dict[str, Any]:
+    os.makedirs(directory, exist_ok=True)
+    groups = assign_shards(user_ids, locations, strategy, num_shards)
+
+    entries = []
+    for name, rows in groups.items():
+        index = faiss.IndexFlatIP(normalized_embeddings.shape[1])
+        index.add(normalized_embeddings[rows])
+
+        index_file = f"shard_{name}.bin"
+        rows_file = f"shard_{name}_rows.npy"
+        faiss.write_index(index, os.path.join(directory, index_file))
+        np.save(os.path.join(directory, rows_file), rows)
+
+        entries.append({
+            "name": name,
+            "index_file": index_file,
+            "rows_file": rows_file,
+            "ntotal": int(len(rows)),
+            "min_user_id": int(min(user_ids[row] for row in rows)),
+            "max_user_id": int(max(user_ids[row] for row in rows))
+        })
+
+    fingerprint = normalized_embeddings[fingerprint_rows(len(normalized_embeddings))]
+    np.save(os.path.join(directory, FINGERPRINT_FILE), fingerprint.astype(np.float16))
+
+    manifest = {
+        "strategy": strategy,
+        "dimension": int(normalized_embeddings.shape[1]),
+        "total_rows": int(len(normalized_embeddings)),
+        "fingerprint_file": FINGERPRINT_FILE,
+        "shards": entries
+    }
+    with open(os.path.join(directory, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    return manifest
@@ -0,0 +1,235 @@
+import os
+import json
+import mmap
+import time
+import struct
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE = "snapshot.figbox"
+MAGIC = b"FIGSNAP\x00"
+FORMAT_VERSION = 2
+ALIGNMENT = 64
+
+# magic, format version, header length, file size, header digest
+_PREFIX = struct.Struct("<8sIIQ16s")
+
+# Sections smaller than this are always checksummed at load; larger ones only with verify="full"
+_ALWAYS_VERIFY_BYTES = 4 * 1024 * 1024
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _digest(buffer: Any) -> bytes:
+    return hashlib.blake2b(buffer, digest_size=16).digest()
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _encode_blobs(blobs: Sequence[bytes]) -> Tuple[np.ndarray, np.ndarray]:
+    offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(blob) for blob in blobs])
+    return offsets, np.frombuffer(b"".join(blobs), dtype=np.uint8)
+
+
+# One file: fixed prefix, JSON header, then 64-byte aligned arrays that map straight into numpy
+def write_snapshot(path: str, users: Sequence[Dict[str, Any]], vectors: np.ndarray,
+                   model_name: str) -> Dict[str, Any]:
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if vectors.ndim != 2 or len(vectors) != len(users):
+        raise SnapshotError(f"{len(users)} profiles but vectors have shape {vectors.shape}")
+
+    user_ids = np.array([user["id"] for user in users], dtype=np.int64)
+    if len(np.unique(user_ids)) != len(user_ids):
+        raise SnapshotError("Duplicate user ids")
+
+    # Stored normalized, so search is a plain inner product
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.maximum(norms, 1e-12)
+
+    sections: Dict[str, np.ndarray] = {
+        "user_ids": user_ids,
+        "vectors": vectors,
+    }
+
+    profile_offsets, profile_data = _encode_blobs([
+        json.dumps(user, ensure_ascii=False, separators=(",", ":")).encode("utf-8") for user in users
+    ])
+    sections["profiles/offsets"] = profile_offsets
+    sections["profiles/data"] = profile_data
+
+    header: Dict[str, Any] = {
+        "format_version": FORMAT_VERSION,
+        "created_at": time.time(),
+        "model_name": model_name,
+        "num_rows": len(users),
+        "dimension": int(vectors.shape[1]),
+        "sections": {}
+    }
+
+    # Offsets depend on the header size and the header holds the offsets: grow the space
+    # reserved for the header until the laid-out header fits in it
+    data_start = 0
+    while True:
+        offset = data_start
+        layout = {}
+        for name, array in sections.items():
+            layout[name] = {
+                "offset": offset,
+                "nbytes": int(array.nbytes),
+                "dtype": array.dtype.str,
+                "shape": list(array.shape),
+                "checksum": _digest(np.ascontiguousarray(array).data).hex()
+            }
+            offset = _align(offset + array.nbytes)
+        header["sections"] = layout
+
+        header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        needed = _align(_PREFIX.size + len(header_bytes))
+        if needed <= data_start:
+            break
+        data_start = needed
+
+    file_size = offset
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    # Written next to the target and renamed, so readers never see a half-written snapshot
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(header_bytes), file_size, _digest(header_bytes)))
+        f.write(header_bytes)
+        for name, array in sections.items():
+            f.seek(header["sections"][name]["offset"])
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.truncate(file_size)
+    os.replace(temp_path, path)
+
+    logger.info(f"Wrote snapshot {path}: {len(users)} rows, {file_size / 1024:.1f} KB")
+    return header
+
+
+class Snapshot:
+    """Memory-mapped snapshot. Arrays are views into the mapping, so opening costs a header
+    parse plus checksums of the small sections; vector pages load on first touch."""
+
+    def __init__(self, path: str, verify: str = "header", writable: bool = False):
+        self.path = path
+        self._file = open(path, "rb")
+        # Copy-on-write lets a process patch vector rows without touching the file or other readers
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_COPY if writable else mmap.ACCESS_READ)
+        self.writable = writable
+
+        try:
+            self.header = self._read_header()
+            self._validate(verify)
+        except Exception:
+            self.close()
+            raise
+
+        self.user_ids = self.array("user_ids")
+        self.vectors = self.array("vectors")
+
+    @classmethod
+    def open(cls, path: str, verify: Optional[str] = None, writable: bool = False) -> 'Snapshot':
+        start = time.time()
+        snapshot = cls(path, verify or os.getenv("FIGBOX_SNAPSHOT_VERIFY", "header"), writable)
+        logger.info(f"Opened snapshot {path} ({snapshot.num_rows} rows) in {(time.time() - start) * 1000:.1f}ms")
+        return snapshot
+
+    def _read_header(self) -> Dict[str, Any]:
+        if len(self._mmap) < _PREFIX.size:
+            raise SnapshotError("File too small to be a snapshot")
+
+        magic, version, header_length, file_size, header_digest = _PREFIX.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise SnapshotError("Not a snapshot file")
+        if version != FORMAT_VERSION:
+            raise SnapshotError(f"Unsupported snapshot format version {version}")
+        if file_size != len(self._mmap):
+            raise SnapshotError(f"Snapshot is {len(self._mmap)} bytes, header says {file_size}; truncated copy?")
+
+        header_bytes = self._mmap[_PREFIX.size:_PREFIX.size + header_length]
+        if _digest(header_bytes) != header_digest:
+            raise SnapshotError("Header checksum mismatch")
+        return json.loads(header_bytes)
+
+    # Structure is always checked; section checksums for small sections, or all with verify="full"
+    def _validate(self, verify: str) -> None:
+        num_rows = self.header["num_rows"]
+        for name, section in self.header["sections"].items():
+            expected = int(np.prod(section["shape"])) * np.dtype(section["dtype"]).itemsize
+            if expected != section["nbytes"] or section["offset"] + section["nbytes"] > len(self._mmap):
+                raise SnapshotError(f"Section {name} is out of bounds or mis-sized")
+
+            if verify == "full" or (verify != "none" and section["nbytes"] <= _ALWAYS_VERIFY_BYTES):
+                with memoryview(self._mmap) as view:
+                    checksum = _digest(view[section["offset"]:section["offset"] + section["nbytes"]]).hex()
+                if checksum != section["checksum"]:
+                    raise SnapshotError(f"Checksum mismatch in section {name}")
+
+        for name in ["user_ids", "vectors"]:
+            if self.header["sections"][name]["shape"][0] != num_rows:
+                raise SnapshotError(f"Section {name} has {self.header['sections'][name]['shape'][0]} rows, expected {num_rows}")
+
+        if self.header["sections"]["profiles/offsets"]["shape"][0] != num_rows + 1:
+            raise SnapshotError(f"Section profiles/offsets does not cover {num_rows} rows")
+
+        if self.header["sections"]["vectors"]["shape"][1] != self.header["dimension"]:
+            raise SnapshotError("Vector dimension does not match header")
+
+    @property
+    def num_rows(self) -> int:
+        return self.header["num_rows"]
+
+    @property
+    def model_name(self) -> str:
+        return self.header["model_name"]
+
+    def array(self, name: str) -> np.ndarray:
+        section = self.header["sections"].get(name)
+        if section is None:
+            raise KeyError(f"Snapshot has no section {name}")
+
+        dtype = np.dtype(section["dtype"])
+        count = section["nbytes"] // dtype.itemsize
+        return np.frombuffer(self._mmap, dtype=dtype, count=count, offset=section["offset"]).reshape(section["shape"])
+
+    def profile(self, row: int) -> Dict[str, Any]:
+        offsets = self.array("profiles/offsets")
+        data = self.array("profiles/data")
+        return json.loads(data[offsets[row]:offsets[row + 1]].tobytes())
+
+    def profiles(self) -> List[Dict[str, Any]]:
+        offsets = self.array("profiles/offsets")
+        data = self.array("profiles/data").tobytes()
+        return [json.loads(data[offsets[row]:offsets[row + 1]]) for row in range(self.num_rows)]
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "format_version": self.header["format_version"],
+            "model_name": self.model_name,
+            "rows": self.num_rows,
+            "dimension": self.header["dimension"],
+            "created_at": self.header["created_at"],
+            "size_bytes": len(self._mmap)
+        }
+
+    def close(self) -> None:
+        try:
+            self._mmap.close()
+        except BufferError:
+            # numpy views still reference the mapping; it is released with them
+            pass
+        self._file.close()
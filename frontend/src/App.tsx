@@ -27,6 +27,7 @@ interface SearchResult extends User {
   similarity_score: number;
   similarity_percentage: number;
   explanation?: string;
+  explanation_token?: string;
   rank?: number;
 }
 
@@ -80,6 +81,20 @@ const CleanFigboxMatcher: React.FC = () => {
     }
   };
 
+  // Explanations are fetched separately so the search itself stays fast
+  const loadExplanation = async (token: string): Promise<void> => {
+    try {
+      const response = await fetch(`${API_CONFIG.BASE_URL}/explanations/${token}`);
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+      const data: { explanation: string } = await response.json();
+      setTopMatchExplanation(data.explanation || '');
+    } catch (error) {
+      console.error('Failed to fetch explanation:', error);
+    }
+  };
+
   const handleSearch = async (): Promise<void> => {
     if (!query.trim()) return;
 
@@ -121,6 +136,9 @@ const CleanFigboxMatcher: React.FC = () => {
         const topResult = data.results[0];
         setTopMatch(topResult);
         setTopMatchExplanation(data.top_match_explanation || '');
+        if (!data.top_match_explanation && topResult.explanation_token) {
+          loadExplanation(topResult.explanation_token);
+        }
 
         const otherResults = data.results.slice(1);
         setResults(otherResults);